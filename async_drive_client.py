@@ -0,0 +1,237 @@
+import asyncio
+import os
+import threading
+from concurrent_loader import TaskResult, collect_errors
+from google_drive_client import FOLDER_MIME_TYPE, LIST_ORDER, GoogleDriveClient
+from instrumentation import context_for_task, current_caller
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+DRIVE_API_URL = "https://www.googleapis.com/drive/v3/"
+# 同时进行中的请求数上限 (也是连接池大小)
+DEFAULT_CONCURRENCY = 16
+# files.list 每页最多 1000 项, 超过时按 nextPageToken 翻页
+LIST_PAGE_SIZE = 1000
+LIST_FIELDS = "nextPageToken, files(id, name, mimeType, md5Checksum, modifiedTime)"
+
+
+class EventLoopThread:
+    """在后台守护线程中运行的事件循环, 同步代码通过 run() 提交协程并等待结果"""
+
+    def __init__(self, name="drive-async"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def run(self, coro, timeout=None):
+        """在事件循环中执行协程并等待结果 (不能在事件循环线程中调用)"""
+        loop = self._ensure_loop()
+        # 协程继承提交线程的上下文: API 调用记在提交方和当前追踪区间下
+        context = context_for_task(current_caller())
+        return context.run(asyncio.run_coroutine_threadsafe, coro, loop).result(timeout)
+
+    def stop(self):
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+
+class AsyncDriveClient(GoogleDriveClient):
+    """GoogleDriveClient 的 asyncio 变体, 用于大量并发请求 (列出、下载、删除和逐层遍历文件夹)
+
+    这些请求由 httpx 异步客户端发出 (HTTP/2 多路复用, 保持连接), 并发数由信号量限制;
+    单个请求 (上传、查找文件夹等) 仍使用 googleapiclient。
+    对外仍是同步接口: 协程在后台事件循环线程中执行, 现有调用方无需修改
+    """
+
+    def __init__(self, credentials_json, parent_folder_id, concurrency=DEFAULT_CONCURRENCY, transport=None, **kwargs):
+        if httpx is None:
+            raise ImportError("AsyncDriveClient 需要 httpx: pip install 'httpx[http2]'")
+        super().__init__(credentials_json, parent_folder_id, **kwargs)
+        self.concurrency = concurrency
+        # 自定义 httpx 传输 (例如 httpx.MockTransport), 为 None 时连接 Drive API
+        self._transport = transport
+        self._loop_thread = EventLoopThread()
+        # 以下对象属于事件循环, 在第一次请求时创建
+        self._client = None
+        self._semaphore = None
+        self._token_lock = None
+
+    @classmethod
+    def from_env(cls):
+        client = super().from_env()
+        client.concurrency = int(os.getenv('DRIVE_ASYNC_CONCURRENCY', str(DEFAULT_CONCURRENCY)))
+        return client
+
+    def _run(self, coro):
+        return self._loop_thread.run(coro)
+
+    def _session(self):
+        if self._client is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._token_lock = asyncio.Lock()
+            limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            self._client = httpx.AsyncClient(base_url=DRIVE_API_URL, http2=h2 is not None, limits=limits,
+                                             timeout=self.request_timeout, transport=self._transport)
+        return self._client
+
+    async def _auth_headers(self):
+        if self.credentials is None:
+            return {}
+        async with self._token_lock:
+            if not self.credentials.valid:
+                from google.auth.transport.requests import Request
+                await asyncio.to_thread(self.credentials.refresh, Request())
+        return {'Authorization': f"Bearer {self.credentials.token}"}
+
+    async def _request(self, method_id, http_method, url, params=None):
+        client = self._session()
+        async with self._semaphore:
+            headers = await self._auth_headers()
+            with self._timed_call(method_id):
+                response = await client.request(http_method, url, params=params, headers=headers)
+                response.raise_for_status()
+        return response
+
+    async def _gather(self, keys, func):
+        """并发执行 func(key) 协程, 按 keys 原顺序返回 TaskResult, 单项失败不影响其他项"""
+        keys = list(keys)
+        outcomes = await asyncio.gather(*(func(key) for key in keys), return_exceptions=True)
+        return [TaskResult(key, None, outcome) if isinstance(outcome, Exception) else TaskResult(key, outcome, None)
+                for key, outcome in zip(keys, outcomes)]
+
+    async def _list_folder(self, folder_id):
+        """列出文件夹下的全部项目 (自动翻页), 并缓存文件 ID 和版本"""
+        params = {'q': f"'{folder_id}' in parents and trashed=false", 'fields': LIST_FIELDS,
+                  'orderBy': LIST_ORDER, 'pageSize': LIST_PAGE_SIZE}
+        items = []
+        while True:
+            page = (await self._request('drive.files.list', 'GET', 'files', params)).json()
+            items.extend(page.get('files', []))
+            if not page.get('nextPageToken'):
+                break
+            params = dict(params, pageToken=page['nextPageToken'])
+        self._remember_versions(items)
+        self._remember_children(folder_id, items)
+        return items
+
+    async def _download(self, file_id, immutable):
+        version = self._versions.get(file_id)
+        # 本地缓存是同步的 SQLite, 放到线程中读写, 不阻塞事件循环
+        if self.local_cache:
+            content = await asyncio.to_thread(self.local_cache.get_file, file_id, version)
+            if content is not None:
+                return content
+        response = await self._request('drive.files.get_media', 'GET', f"files/{file_id}", {'alt': 'media'})
+        content = response.content.decode('utf-8')
+        if self.local_cache:
+            await asyncio.to_thread(self.local_cache.put_file, file_id, content, version, immutable)
+        return content
+
+    async def _delete(self, key):
+        folder_path, folder_id = key
+        await self._request('drive.files.delete', 'DELETE', f"files/{folder_id}")
+
+    def list_files_many(self, folder_paths):
+        """并发列出多个文件夹, 每项 result 为 [(name, id)]; 未缓存的文件夹 ID 在线程中并发查找"""
+        folder_paths = list(folder_paths)
+
+        async def list_path(folder_path):
+            folder_id = await asyncio.to_thread(self.resolve_folder, folder_path)
+            if not folder_id:
+                return []
+            return [(item['name'], item['id']) for item in await self._list_folder(folder_id)]
+
+        return self._run(self._gather(folder_paths, list_path))
+
+    def walk_folders(self, folder_path, depth, descend=None, errors=None):
+        """逐层遍历: 同一层的全部文件夹按 ID 并发列出, 本层完成后再列出下一层 (只向下展开文件夹)"""
+        root_path = self.cache.normalize_path(folder_path)
+        root_id = self.resolve_folder(root_path)
+        if not root_id:
+            return {}
+
+        async def walk():
+            listings = {}
+            level = {root_path: root_id}
+            for _ in range(depth):
+                if not level:
+                    break
+                results = await self._gather(level, lambda path: self._list_folder(level[path]))
+                next_level = {}
+                for item in collect_errors(results, errors, "列出文件夹失败"):
+                    listings[item.key] = [(child['name'], child['id']) for child in item.result]
+                    for child in item.result:
+                        child_path = f"{item.key}/{child['name']}" if item.key else child['name']
+                        if child.get('mimeType') != FOLDER_MIME_TYPE:
+                            continue
+                        if descend is None or descend(child_path, child['name']):
+                            self.cache.put_folder(self.parent_folder_id, child_path, child['id'])
+                            next_level[child_path] = child['id']
+                level = next_level
+            return listings
+
+        return self._run(walk())
+
+    def download_files(self, file_names, folder_path, immutable=False):
+        """并发下载同一文件夹下的多个文件, 按原顺序返回; ID 未缓存时先列出一次文件夹"""
+        file_names = list(file_names)
+        folder_id = self.resolve_folder(folder_path)
+
+        async def download_all():
+            if folder_id and any(not self.cache.get_file(folder_id, name) for name in file_names):
+                await self._list_folder(folder_id)
+
+            async def download(file_name):
+                file_id = self.cache.get_file(folder_id, file_name) if folder_id else None
+                if not file_id:
+                    raise FileNotFoundError(f"{folder_path}/{file_name}")
+                return await self._download(file_id, immutable)
+
+            return await self._gather(file_names, download)
+
+        return self._run(download_all())
+
+    def download_many(self, file_ids, immutable=False):
+        """按文件 ID 并发下载, 按原顺序返回"""
+        return self._run(self._gather(file_ids, lambda file_id: self._download(file_id, immutable)))
+
+    def delete_folders(self, folders):
+        """并发删除文件夹, folders 为 [(路径, 文件夹 ID)], 成功的项同时清除缓存"""
+        results = self._run(self._gather(folders, self._delete))
+        # 清除缓存可能要查找父文件夹 ID (同步请求), 在事件循环之外进行
+        for item in results:
+            if item.error is None:
+                self._forget_folder(*item.key)
+        return results
+
+    def stop(self):
+        """关闭连接池和事件循环 (之后的请求会重新创建)"""
+        if self._client is not None:
+            self._run(self._close())
+        self._loop_thread.stop()
+
+    async def _close(self):
+        client, self._client = self._client, None
+        await client.aclose()
\ No newline at end of file
@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from concurrent_loader import collect_errors, run_concurrently
+from lottery_data_manager import RESULTS_ROOT
+
+DEFAULT_BASE_URL = "https://4dnow.net/"
+# 往期开奖页面地址, 站点改版或使用本地替身服务时可通过参数覆盖
+DEFAULT_URL_TEMPLATE = "{base_url}past-results/{date}"
+DEFAULT_CHECKPOINT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "malaysia4d", "backfill_checkpoint.json")
+DEFAULT_MAX_WORKERS = 4
+# 对站点的总请求速率 (每秒), 所有线程共用
+DEFAULT_RATE = 1.0
+
+
+class RateLimiter:
+    """多线程共用的请求间隔限制"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            wait_seconds = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+
+
+class Checkpoint:
+    """记录已完成的日期, 中断后重新运行时跳过"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.done = json.load(f).get("done", {})
+
+    def is_done(self, date_str):
+        return date_str in self.done
+
+    def mark_done(self, date_str, operators):
+        with self._lock:
+            self.done[date_str] = operators
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding='utf-8') as f:
+                json.dump({"done": self.done}, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+class Backfill:
+    """并发回填往期开奖结果: 限速抓取, 解析后按 parse_data 的文件布局写入 Drive, 按日期记录进度"""
+
+    def __init__(self, data_manager, base_url=DEFAULT_BASE_URL, url_template=DEFAULT_URL_TEMPLATE,
+                 checkpoint_path=DEFAULT_CHECKPOINT_PATH, max_workers=DEFAULT_MAX_WORKERS, rate=DEFAULT_RATE):
+        self.data_manager = data_manager
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.url_template = url_template
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(rate)
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def url_for(self, date_str):
+        return self.url_template.format(base_url=self.base_url, date=date_str)
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def backfill_date(self, date_str):
+        """抓取并保存单个日期的结果, 返回写入的运营商列表 (当天没有开奖时为空列表, 同样记入检查点)"""
+        self.limiter.wait()
+        response = self.data_manager.session.get(self.url_for(date_str), timeout=10)
+        self._count("requests")
+        response.raise_for_status()
+        results = self.data_manager.parse_page(response.text)
+        # 往期页面可能同时显示其他日期的结果, 只保存目标日期
+        results = {operator: data for operator, data in results.items() if data["date"] == date_str}
+        if not results:
+            # 没有开奖的日期 (往期页面显示的是其他日期) 也算完成, 重新运行时不再请求
+            self.checkpoint.mark_done(date_str, [])
+            print(f"{date_str} 没有开奖结果, 已跳过")
+            return []
+        for operator, result_data in results.items():
+            written = self.data_manager.save_result(operator, result_data)
+            self._count("files_written" if written else "files_unchanged")
+        operators = sorted(results)
+        self.checkpoint.mark_done(date_str, operators)
+        print(f"已回填 {date_str}: {', '.join(operators)}")
+        return operators
+
+    def run(self, start_date, end_date, errors=None):
+        """回填 start_date 至 end_date (datetime.date) 之间未完成的日期, 返回 {日期: 运营商列表}"""
+        date_strs = []
+        current = start_date
+        while current <= end_date:
+            date_str = current.strftime("%Y-%m-%d")
+            if self.checkpoint.is_done(date_str):
+                self._count("skipped")
+            else:
+                date_strs.append(date_str)
+            current += timedelta(days=1)
+        if not date_strs:
+            return {}
+        # 先在主线程创建公共父文件夹, 避免多个线程同时创建出重复文件夹
+        self.data_manager.drive_client.ensure_folder(RESULTS_ROOT)
+        results = run_concurrently(date_strs, self.backfill_date, self.max_workers)
+        done = collect_errors(results, errors, "回填失败")
+        no_draw = sum(1 for item in done if not item.result)
+        self._count("dates_done", len(done) - no_draw)
+        self._count("dates_no_draw", no_draw)
+        self._count("dates_failed", len(results) - len(done))
+        return {item.key: item.result for item in done}
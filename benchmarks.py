@@ -0,0 +1,201 @@
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+import pytz
+from bet_parser import parse_bet_text
+from bet_store import create_bet_store
+from fake_drive import FakeDriveClient
+from local_storage import LocalStorageBackend
+from lottery_data_manager import LotteryDataManager
+from retention import RetentionSweeper
+from settlement import settle
+from statement import build_statement
+from storage_manager import StorageManager
+from synthetic import bet_text, draw_results, purchase_receipts, results_page
+from tiered_storage import TieredStorageBackend
+from winning_index import build_indexes
+
+MYT = pytz.timezone('Asia/Kuala_Lumpur')
+
+DEFAULT_LATENCY = 0.005
+DEFAULT_REPEAT = 3
+# 与上次结果相比, 中位耗时增加超过此比例视为退步
+DEFAULT_THRESHOLD = 0.2
+# fake: 内存 Drive 替身; local: 本地文件系统; tiered: 本地文件系统 + 异步同步到内存 Drive 替身
+BACKENDS = ("fake", "local", "tiered")
+
+
+class BenchFixture:
+    """基准测试数据: 存储后端中最近 days 天的开奖结果和收条, 以及若干天已过期的收条"""
+
+    def __init__(self, latency=DEFAULT_LATENCY, seed=0, days=7, tickets_per_day=20, expired_days=5, store_dir=None,
+                 backend="fake", storage_dir=None):
+        self.rng = random.Random(seed)
+        self.remote = FakeDriveClient() if backend != "local" else None
+        if backend == "fake":
+            self.drive_client = self.remote
+        elif backend == "local":
+            self.drive_client = LocalStorageBackend(storage_dir)
+        else:
+            self.drive_client = TieredStorageBackend(LocalStorageBackend(storage_dir), self.remote)
+        self.bet_store = create_bet_store(store_dir) if store_dir else None
+        self.storage_manager = StorageManager(self.drive_client, self.bet_store)
+        self.data_manager = LotteryDataManager(self.drive_client)
+        today = datetime.now(MYT).date()
+        # 只用已开奖的日期, 结单按最终结算处理
+        self.dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days, 0, -1)]
+        expired = [(today - timedelta(days=40 + i)).strftime("%Y-%m-%d") for i in range(expired_days)]
+        for date_str in self.dates:
+            for operator, result_data in draw_results(self.rng, date_str).items():
+                self.data_manager.save_result(operator, result_data)
+        self.tickets = purchase_receipts(self.storage_manager, self.rng, expired + self.dates, tickets_per_day)
+        if isinstance(self.drive_client, TieredStorageBackend):
+            self.drive_client.flush()
+        # 数据准备完成后才开始模拟网络延迟
+        if self.remote is not None:
+            self.remote.latency = latency
+
+    def date_range(self):
+        start = MYT.localize(datetime.strptime(self.dates[0], "%Y-%m-%d"))
+        end = MYT.localize(datetime.strptime(self.dates[-1], "%Y-%m-%d"))
+        return start, end
+
+
+def _measure(func, repeat, drive_client=None, setup=None):
+    """重复执行 func, 返回耗时统计和最后一次的 API 调用次数"""
+    timings = []
+    calls = 0
+    for _ in range(repeat):
+        if setup:
+            setup()
+        calls_before = drive_client.api_call_count() if drive_client else 0
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+        calls = drive_client.api_call_count() - calls_before if drive_client else 0
+    return {
+        "median_seconds": statistics.median(timings),
+        "min_seconds": min(timings),
+        "runs": len(timings),
+        "api_calls": calls,
+    }
+
+
+def bench_parse_data(fixture, repeat):
+    """parse_data: 新页面 (全部区块解析并写入) 与重复页面 (区块未变, 全部跳过)"""
+    html_content = results_page(fixture.rng, fixture.dates[-1])
+    data_manager = fixture.data_manager
+
+    def reset():
+        data_manager._blocks = {}
+
+    return {
+        "parse_data_new": _measure(lambda: data_manager.parse_data(html_content), repeat,
+                                   fixture.drive_client, setup=reset),
+        "parse_data_unchanged": _measure(lambda: data_manager.parse_data(html_content), repeat, fixture.drive_client),
+    }
+
+
+def bench_parse_bets(fixture, repeat, lines=10000):
+    """购票输入批量解析 (约 lines 行)"""
+    text = bet_text(fixture.rng, groups=max(lines // 200, 1), bets_per_group=200)
+    return {"parse_bets": _measure(lambda: parse_bet_text(text), repeat)}
+
+
+def bench_calculator(fixture, repeat):
+    """中奖计算器: 加载当天开奖结果和收条投注后结算"""
+    date_str = fixture.dates[-1]
+    date_obj = MYT.localize(datetime.strptime(date_str, "%Y-%m-%d"))
+
+    def calculate():
+        draw_indexes = build_indexes(fixture.data_manager.load_results_by_date(date_str))
+        tickets = [ticket for _, ticket in fixture.storage_manager.load_tickets_between(date_obj, date_obj)]
+        return settle([(ticket.filename, ticket.bets) for ticket in tickets], draw_indexes)
+
+    return {"calculator": _measure(calculate, repeat, fixture.drive_client)}
+
+
+def bench_statement(fixture, repeat):
+    """月结单: 首次生成 (同步本地投注存储) 和再次生成"""
+    start, end = fixture.date_range()
+
+    def clear():
+        if fixture.bet_store is not None:
+            fixture.bet_store.clear()
+
+    def build():
+        return build_statement(fixture.storage_manager, fixture.data_manager, start, end)
+
+    return {
+        "statement_first": _measure(build, repeat, fixture.drive_client, setup=clear),
+        "statement_repeat": _measure(build, repeat, fixture.drive_client),
+    }
+
+
+def bench_retention(fixture):
+    """过期收条清理: 首次全量扫描, 之后增量 (只执行一次, 会删除数据)"""
+    sweeper = RetentionSweeper(fixture.storage_manager, initial_delay=0)
+    return {
+        "retention_full": _measure(sweeper.sweep_once, 1, fixture.drive_client),
+        "retention_incremental": _measure(sweeper.sweep_once, 1, fixture.drive_client),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(latency=DEFAULT_LATENCY, repeat=DEFAULT_REPEAT, seed=0, days=7, tickets_per_day=20, backend="fake"):
+    """运行全部基准测试, 返回可写入 JSON 的结果"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fixture = BenchFixture(latency, seed, days, tickets_per_day, store_dir=os.path.join(tmp_dir, "bet_store"),
+                               backend=backend, storage_dir=os.path.join(tmp_dir, "storage"))
+        results.update(bench_parse_data(fixture, repeat))
+        results.update(bench_parse_bets(fixture, repeat))
+        results.update(bench_calculator(fixture, repeat))
+        results.update(bench_statement(fixture, repeat))
+        # 清理会删除过期收条, 放在最后
+        results.update(bench_retention(fixture))
+    return {
+        "created_at": datetime.now(MYT).strftime("%Y-%m-%d %H:%M:%S"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {"backend": backend, "latency": latency, "repeat": repeat, "seed": seed, "days": days,
+                   "tickets_per_day": tickets_per_day, "tickets": fixture.tickets},
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """与基线比较, 返回退步项 [(名称, 基线结果, 当前结果)] (中位耗时增加超过 threshold, 或 API 调用增加)"""
+    regressions = []
+    for name, result in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if old is None:
+            continue
+        slower = result["median_seconds"] > old["median_seconds"] * (1 + threshold)
+        if slower or result["api_calls"] > old["api_calls"]:
+            regressions.append((name, old, result))
+    return regressions
+
+
+def save_results(report, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
\ No newline at end of file
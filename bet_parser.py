@@ -0,0 +1,193 @@
+import csv
+import io
+import re
+
+try:
+    import numpy as np
+except ImportError:  # 没有 numpy 时投注以元组列表保存, 校验逐行进行
+    np = None
+
+OPERATOR_DIGITS = {
+    "1": "Magnum 4D", "2": "Da Ma Cai 1+3D", "3": "SportsToto 4D",
+    "4": "Singapore 4D", "8": "Grand Dragon 4D", "9": "9 Lotto"
+}
+MAX_AMOUNT = 999
+
+# 投注行: 可选 &/&& 前缀, 号码, 可选 #大万#小万#直选
+BET_LINE = re.compile(r"^(&&|&)?([+-]?\d+)((?:#[^#]*)*)$")
+AMOUNT = re.compile(r"^[+-]?(\d+(\.\d*)?|\.\d+)$")
+
+BET_FIELDS = ("group", "number", "big", "small", "straight", "perm", "box")
+if np is not None:
+    BET_DTYPE = np.dtype([("group", np.int32), ("number", np.uint16), ("big", np.float64),
+                          ("small", np.float64), ("straight", np.float64), ("perm", np.bool_), ("box", np.bool_)])
+
+
+class BetBatch:
+    """批量解析结果: 运营商分组、投注数组 (每行一注) 和全部错误 [(行号, 信息)]"""
+
+    def __init__(self, groups, rows, errors, line_numbers):
+        self.groups = groups
+        self.errors = errors
+        self.line_numbers = line_numbers
+        if np is not None:
+            self.bets = np.array(rows, dtype=BET_DTYPE)
+        else:
+            self.bets = rows
+
+    def __len__(self):
+        return len(self.bets)
+
+    @property
+    def total(self):
+        if np is not None:
+            return float((self.bets["big"] + self.bets["small"] + self.bets["straight"]).sum())
+        return sum(row[2] + row[3] + row[4] for row in self.bets)
+
+    def iter_groups(self):
+        """按分组产出 (运营商列表, [(号码, 大万, 小万, 直选, iBox, Box)]), 空分组跳过"""
+        rows = self.bets.tolist() if np is not None else self.bets
+        grouped = [[] for _ in self.groups]
+        for group, number, big, small, straight, perm, box in rows:
+            grouped[group].append((f"{number:04d}", big, small, straight, perm, box))
+        for operators, bets in zip(self.groups, grouped):
+            if bets:
+                yield operators, bets
+
+
+def _amount(text):
+    if not text:
+        return 0.0
+    if not AMOUNT.match(text):
+        return None
+    return float(text)
+
+
+def parse_bet_text(text, line_numbers=None):
+    """一次解析整段投注文本, 收集所有错误 (不在第一个错误处停止)
+
+    line_numbers 可指定每行在原始输入中的行号 (用于 CSV)
+    """
+    groups = []
+    errors = []
+    # 第一遍: 逐行拆分字段
+    pending = []  # (行号, 原文, 分组, 号码, 金额或 None, iBox, Box)
+    current_group = None
+    for index, raw_line in enumerate(text.split("\n")):
+        line_no = line_numbers[index] if line_numbers else index + 1
+        line = raw_line.strip()
+        if not line:
+            continue
+        if line.startswith("@"):
+            operators = [OPERATOR_DIGITS[digit] for digit in line[1:] if digit in OPERATOR_DIGITS]
+            if not operators:
+                errors.append((line_no, f"无效的运营商选择 ({line})"))
+                current_group = None
+                continue
+            groups.append(operators)
+            current_group = len(groups) - 1
+            continue
+        if current_group is None:
+            errors.append((line_no, f"投注前必须先选择有效的运营商 (例如: @123) (投注: {line})"))
+            continue
+        match = BET_LINE.match(line)
+        if not match:
+            errors.append((line_no, f"格式错误: 请输入有效的数字 (例如: 2277#1) (投注: {line})"))
+            continue
+        prefix, number, amount_text = match.groups()
+        amounts = None
+        if amount_text:
+            parts = amount_text[1:].split("#")
+            amounts = [_amount(part) for part in (parts + ["", ""])[:3]]
+            if None in amounts:
+                errors.append((line_no, f"格式错误: 请输入有效的数字 (例如: 2277#1) (投注: {line})"))
+                continue
+        pending.append((line_no, line, current_group, int(number), amounts, prefix == "&", prefix == "&&"))
+    # 第二遍: 向量化校验号码范围和金额
+    invalid = _validate(pending)
+    # 第三遍: 顺序处理沿用上一注金额的行 (依赖前一条有效投注)
+    rows = []
+    line_numbers_out = []
+    last_bet_info = None
+    for (line_no, line, group, number, amounts, perm_bet, box_bet), problem in zip(pending, invalid):
+        if problem:
+            errors.append((line_no, f"{problem} (投注: {line})"))
+            continue
+        if amounts is None:
+            if last_bet_info is None:
+                errors.append((line_no, f"第一组投注必须指定金额 (例如: 2277#1) (投注: {line})"))
+                continue
+            big, small, straight = last_bet_info[:3]
+            perm_bet = perm_bet or last_bet_info[3]
+            box_bet = box_bet or last_bet_info[4]
+        else:
+            big, small, straight = amounts
+        last_bet_info = (big, small, straight, perm_bet, box_bet)
+        rows.append((group, number, big, small, straight, perm_bet, box_bet))
+        line_numbers_out.append(line_no)
+    errors.sort(key=lambda error: error[0])
+    return BetBatch(groups, rows, errors, line_numbers_out)
+
+
+def _validate(pending):
+    """返回每行的错误信息 (无错误为空字符串)"""
+    if np is None:
+        return [_validate_one(number, amounts) for _, _, _, number, amounts, _, _ in pending]
+    if not pending:
+        return []
+    # 先在 Python 中截断到 [-1, 10000], 超长号码不会在转换为 int64 时溢出, 仍按范围报错
+    numbers = np.array([min(max(item[3], -1), 10000) for item in pending], dtype=np.int64)
+    has_amounts = np.array([item[4] is not None for item in pending], dtype=bool)
+    amounts = np.array([item[4] or (0.0, 0.0, 0.0) for item in pending], dtype=np.float64).reshape(-1, 3)
+    problems = np.full(len(pending), "", dtype=object)
+    explicit = has_amounts[:, None]
+    problems[((amounts == 0).all(axis=1)) & has_amounts] = "大万、小万和直选不能同时为 0"
+    problems[((amounts > MAX_AMOUNT) & explicit).any(axis=1)] = f"大万、小万和直选不能超过 {MAX_AMOUNT}"
+    problems[((amounts < 0) & explicit).any(axis=1)] = "大万、小万和直选必须大于等于 0"
+    problems[(numbers < 0) | (numbers > 9999)] = "号码必须在 0000-9999 之间"
+    return problems.tolist()
+
+
+def _validate_one(number, amounts):
+    if number < 0 or number > 9999:
+        return "号码必须在 0000-9999 之间"
+    if amounts is None:
+        return ""
+    if min(amounts) < 0:
+        return "大万、小万和直选必须大于等于 0"
+    if max(amounts) > MAX_AMOUNT:
+        return f"大万、小万和直选不能超过 {MAX_AMOUNT}"
+    if not any(amounts):
+        return "大万、小万和直选不能同时为 0"
+    return ""
+
+
+def parse_bet_csv(content):
+    """解析 CSV 投注文件: 每行 运营商,号码,大万,小万,直选[,类型], 类型为空/ibox/box, 可带表头
+
+    运营商为数字代码 (例如 123), 与文本格式的 @123 相同; 金额全空时沿用上一注; 错误行号为 CSV 中的行号
+    """
+    lines = []
+    line_numbers = []
+    current_ops = None
+    for row_no, row in enumerate(csv.reader(io.StringIO(content)), start=1):
+        cells = [cell.strip() for cell in row]
+        if not any(cells):
+            continue
+        if row_no == 1 and cells[0].lower() in ("operators", "运营商"):
+            continue
+        cells = (cells + [""] * 6)[:6]
+        ops, number, big, small, straight, kind = cells
+        if ops != current_ops:
+            lines.append(f"@{ops}")
+            line_numbers.append(row_no)
+            current_ops = ops
+        prefix = {"ibox": "&", "box": "&&"}.get(kind.lower(), "")
+        if kind and not prefix and kind.lower() != "straight":
+            prefix = "?"  # 让文本解析报告格式错误
+        if big or small or straight:
+            lines.append(f"{prefix}{number}#{big}#{small}#{straight}")
+        else:
+            lines.append(f"{prefix}{number}")  # 金额全空时沿用上一注, 与文本格式一致
+        line_numbers.append(row_no)
+    return parse_bet_text("\n".join(lines), line_numbers)
@@ -0,0 +1,202 @@
+import os
+import threading
+from receipt_ledger import BET_BOX, BET_IBOX, BET_STRAIGHT, operators_for
+from receipt_manifest import OP_CODE_MAP
+from settlement import KIND_BOX, KIND_PERM, KIND_STRAIGHT, BetColumns
+
+try:
+    import numpy as np
+except ImportError:  # 没有 numpy 时不使用列式存储, 结单逐张收条计算
+    np = None
+
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "malaysia4d", "bet_store")
+
+KIND_CODES = {BET_STRAIGHT: KIND_STRAIGHT, BET_IBOX: KIND_PERM, BET_BOX: KIND_BOX}
+OPERATOR_CODES = dict((operator, code) for code, operator in OP_CODE_MAP.items())
+
+_EPOCH_THURSDAY = 3  # 1970-01-01 是星期四
+
+
+def empty_partition():
+    return {
+        "filename": np.zeros(0, dtype="U64"),
+        "ticket": np.zeros(0, dtype="U32"),
+        "stake": np.zeros(0, dtype=np.float64),
+        "winnings": np.zeros(0, dtype=np.float64),
+        "settled": np.zeros(0, dtype=bool),
+        "bet_ticket": np.zeros(0, dtype=np.int32),
+        "number": np.zeros(0, dtype=np.uint16),
+        "big": np.zeros(0, dtype=np.float64),
+        "small": np.zeros(0, dtype=np.float64),
+        "straight": np.zeros(0, dtype=np.float64),
+        "kind": np.zeros(0, dtype=np.uint8),
+        "op_codes": np.zeros(0, dtype="U8"),
+    }
+
+
+def tickets_to_columns(tickets, first_index=0):
+    """LedgerTicket 列表 -> 收条列和投注列
+
+    字符串列按数据中最长的值定宽 (dtype=str), 例如重复选择运营商的代码串可以超过 6 个字符;
+    与已有分区拼接时 numpy 自动取较宽的类型
+    """
+    bets = [(first_index + ticket_index, bet) for ticket_index, ticket in enumerate(tickets) for bet in ticket.bets]
+    return {
+        "filename": np.array([ticket.filename for ticket in tickets], dtype=str),
+        "ticket": np.array([ticket.ticket for ticket in tickets], dtype="U32"),
+        "stake": np.array([ticket.total for ticket in tickets], dtype=np.float64),
+        "winnings": np.zeros(len(tickets), dtype=np.float64),
+        "settled": np.zeros(len(tickets), dtype=bool),
+        "bet_ticket": np.array([ticket_index for ticket_index, _ in bets], dtype=np.int32),
+        "number": np.array([int(bet[0]) for _, bet in bets], dtype=np.uint16),
+        "big": np.array([bet[1] for _, bet in bets], dtype=np.float64),
+        "small": np.array([bet[2] for _, bet in bets], dtype=np.float64),
+        "straight": np.array([bet[3] for _, bet in bets], dtype=np.float64),
+        "kind": np.array([KIND_CODES[BET_IBOX if bet[4] else BET_BOX if bet[5] else BET_STRAIGHT]
+                          for _, bet in bets], dtype=np.uint8),
+        "op_codes": np.array([''.join(OPERATOR_CODES.get(op, '') for op in bet[6]) for _, bet in bets], dtype=str),
+    }
+
+
+def iso_week_keys(days):
+    """datetime64[D] 数组 -> ISO 周 (年, 周数) 两个整数数组"""
+    day_numbers = days.astype(np.int64)
+    weekday = (day_numbers + _EPOCH_THURSDAY) % 7
+    thursday = (day_numbers - weekday + 3).astype("datetime64[D]")
+    iso_year = thursday.astype("datetime64[Y]")
+    week = (thursday - iso_year.astype("datetime64[D]")).astype(np.int64) // 7 + 1
+    return iso_year.astype(np.int64) + 1970, week
+
+
+class BetStore:
+    """本地列式投注存储: 按开奖日期分区 (每天一个 .npz), 保存投注和结算结果, 供结单快速汇总"""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._partitions = {}
+
+    def partition_path(self, date_str):
+        return os.path.join(self.root, f"{date_str}.npz")
+
+    def _load(self, date_str):
+        partition = self._partitions.get(date_str)
+        if partition is None:
+            path = self.partition_path(date_str)
+            if not os.path.exists(path):
+                return None
+            with np.load(path, allow_pickle=False) as data:
+                partition = dict((name, data[name]) for name in data.files)
+            self._partitions[date_str] = partition
+        return partition
+
+    def _save(self, date_str, partition):
+        path = self.partition_path(date_str)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, **partition)
+        os.replace(tmp_path, path)
+        self._partitions[date_str] = partition
+
+    def ticket_count(self, date_str):
+        with self._lock:
+            partition = self._load(date_str)
+            return 0 if partition is None else len(partition["filename"])
+
+    def is_settled(self, date_str):
+        with self._lock:
+            partition = self._load(date_str)
+            return partition is not None and bool(partition["settled"].all())
+
+    def write_tickets(self, date_str, tickets):
+        """用清单中的全部收条重写当日分区 (结算结果清空)"""
+        with self._lock:
+            self._save(date_str, tickets_to_columns(tickets))
+
+    def append_ticket(self, date_str, ticket):
+        """购票后增量追加一张收条"""
+        with self._lock:
+            partition = self._load(date_str) or empty_partition()
+            if ticket.filename in partition["filename"]:
+                return
+            added = tickets_to_columns([ticket], len(partition["filename"]))
+            self._save(date_str, dict((name, np.concatenate([partition[name], added[name]])) for name in partition))
+
+    def merge_tickets(self, date_str, tickets):
+        """把分区中还没有的收条追加进去, 已有的收条 (包括尚未上传的) 保持不变"""
+        with self._lock:
+            partition = self._load(date_str) or empty_partition()
+            known = set(partition["filename"].tolist())
+            missing = [ticket for ticket in tickets if ticket.filename not in known]
+            if not missing:
+                return
+            added = tickets_to_columns(missing, len(partition["filename"]))
+            self._save(date_str, dict((name, np.concatenate([partition[name], added[name]])) for name in partition))
+
+    def columns(self, date_str):
+        """当日分区的列式投注 (settlement.BetColumns), 直接用于向量化结算, 顺序与收条一致"""
+        with self._lock:
+            partition = self._load(date_str)
+        if partition is None:
+            partition = empty_partition()
+        tickets = partition["bet_ticket"].astype(np.int64)
+        # 投注按收条顺序追加, 收条内序号 = 序号 - 该收条第一注的序号
+        bets = np.arange(len(tickets), dtype=np.int64) - np.searchsorted(tickets, tickets)
+        op_codes, group = np.unique(partition["op_codes"], return_inverse=True)
+        return BetColumns(partition["filename"].tolist(), tickets, bets, partition["number"].astype(np.int64),
+                          partition["big"], partition["small"], partition["straight"], partition["kind"].astype(np.int8),
+                          group.reshape(-1), [operators_for(codes) for codes in op_codes.tolist()])
+
+    def record_settlement(self, date_str, winnings, final=True):
+        """保存当日各收条的奖金 (顺序与 tickets() 一致), final=False 时下次仍会重新结算"""
+        with self._lock:
+            partition = dict(self._load(date_str))
+            partition["winnings"] = np.asarray(winnings, dtype=np.float64)
+            partition["settled"] = np.full(len(partition["filename"]), final, dtype=bool)
+            self._save(date_str, partition)
+
+    def aggregate(self, date_strs):
+        """按月和按 ISO 周汇总下注额和奖金, 返回 ({月: (下注, 奖金)}, {周: (下注, 奖金)})"""
+        days = []
+        stakes = []
+        winnings = []
+        with self._lock:
+            for date_str in date_strs:
+                partition = self._load(date_str)
+                if partition is None or not len(partition["filename"]):
+                    continue
+                days.append(np.full(len(partition["filename"]), np.datetime64(date_str, "D")))
+                stakes.append(partition["stake"])
+                winnings.append(partition["winnings"])
+        if not days:
+            return {}, {}
+        days = np.concatenate(days)
+        stakes = np.concatenate(stakes)
+        winnings = np.concatenate(winnings)
+        months = days.astype("datetime64[M]")
+        monthly = self._group(months.astype(np.int64), stakes, winnings,
+                              lambda month: str(np.datetime64(month, "M")))
+        iso_year, week = iso_week_keys(days)
+        weekly = self._group(iso_year * 100 + week, stakes, winnings,
+                             lambda key: f"{key // 100}-W{key % 100:02d}")
+        return monthly, weekly
+
+    @staticmethod
+    def _group(keys, stakes, winnings, label):
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        stake_totals = np.bincount(inverse, weights=stakes, minlength=len(unique_keys))
+        win_totals = np.bincount(inverse, weights=winnings, minlength=len(unique_keys))
+        return dict((label(int(key)), (float(stake), float(win)))
+                    for key, stake, win in zip(unique_keys, stake_totals, win_totals))
+
+    def clear(self):
+        with self._lock:
+            for name in os.listdir(self.root):
+                if name.endswith(".npz"):
+                    os.remove(os.path.join(self.root, name))
+            self._partitions.clear()
+
+
+def create_bet_store(root=DEFAULT_STORE_DIR):
+    """没有 numpy 时返回 None"""
+    return BetStore(root) if np is not None else None
\ No newline at end of file
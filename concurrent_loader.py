@@ -0,0 +1,53 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from instrumentation import context_for_task, current_caller
+
+DEFAULT_MAX_WORKERS = 8
+
+TaskResult = namedtuple('TaskResult', ['key', 'result', 'error'])
+
+
+def run_concurrently(keys, func, max_workers=DEFAULT_MAX_WORKERS, timeout=None):
+    """用有界线程池并发执行 func(key), 按 keys 原顺序返回 TaskResult, 单项失败不影响其他项"""
+    keys = list(keys)
+    if not keys:
+        return []
+    if max_workers <= 1 or len(keys) == 1:
+        results = []
+        for key in keys:
+            try:
+                results.append(TaskResult(key, func(key), None))
+            except Exception as e:
+                results.append(TaskResult(key, None, e))
+        return results
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(keys)))
+    try:
+        # 每个任务在提交线程的上下文副本中运行, 调用方和追踪区间随任务传到线程池
+        caller = current_caller()
+        futures = [executor.submit(context_for_task(caller).run, func, key) for key in keys]
+        results = []
+        for key, future in zip(keys, futures):
+            try:
+                results.append(TaskResult(key, future.result(timeout=timeout), None))
+            except FutureTimeoutError:
+                future.cancel()
+                results.append(TaskResult(key, None, TimeoutError(f"请求超时 ({timeout}s): {key}")))
+            except Exception as e:
+                results.append(TaskResult(key, None, e))
+        return results
+    finally:
+        # 不等待超时仍在运行的线程
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def collect_errors(results, errors=None, message="执行失败"):
+    """打印失败项并追加到 errors 列表 (若提供), 返回成功项"""
+    succeeded = []
+    for item in results:
+        if item.error is not None:
+            print(f"{message}: {item.key}: {item.error}")
+            if errors is not None:
+                errors.append((item.key, item.error))
+        else:
+            succeeded.append(item)
+    return succeeded
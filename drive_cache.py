@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class DriveIdCache:
+    """Google Drive 路径/文件 ID 缓存 (进程级共享, 有容量上限和 TTL)"""
+
+    def __init__(self, max_entries=4096, ttl_seconds=600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # (起点文件夹 ID, 相对路径) -> (文件夹 ID, 过期时间); 起点可以是根文件夹或父文件夹 (路径为子文件夹名称)
+        self._folders = OrderedDict()
+        # (父文件夹 ID, 名称) -> (文件 ID, 过期时间)
+        self._files = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize_path(path):
+        return '/'.join(part for part in path.strip('/').split('/') if part)
+
+    def _get(self, table, key):
+        with self._lock:
+            entry = table.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del table[key]
+                self.misses += 1
+                return None
+            table.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _put(self, table, key, value):
+        with self._lock:
+            table[key] = (value, time.monotonic() + self.ttl_seconds)
+            table.move_to_end(key)
+            while len(table) > self.max_entries:
+                table.popitem(last=False)
+                self.evictions += 1
+
+    def get_folder(self, root_id, path):
+        return self._get(self._folders, (root_id, self.normalize_path(path)))
+
+    def put_folder(self, root_id, path, folder_id):
+        self._put(self._folders, (root_id, self.normalize_path(path)), folder_id)
+
+    def get_file(self, folder_id, name):
+        return self._get(self._files, (folder_id, name))
+
+    def put_file(self, folder_id, name, file_id):
+        self._put(self._files, (folder_id, name), file_id)
+
+    def invalidate_file(self, folder_id, name):
+        with self._lock:
+            if self._files.pop((folder_id, name), None) is not None:
+                self.invalidations += 1
+
+    def invalidate_path(self, root_id, path, folder_id=None):
+        """删除路径及其所有子路径的缓存, 以及这些文件夹下的文件 ID"""
+        path = self.normalize_path(path)
+        prefix = path + '/'
+        with self._lock:
+            removed_ids = {folder_id} if folder_id else set()
+            for key in list(self._folders):
+                key_root, key_path = key
+                if key_root == root_id and (key_path == path or key_path.startswith(prefix)):
+                    removed_ids.add(self._folders.pop(key)[0])
+            # 以父文件夹为起点缓存的子文件夹 (逐层向下, 直到没有新的已删除文件夹)
+            changed = True
+            while changed:
+                changed = False
+                for key in list(self._folders):
+                    if key[0] in removed_ids or self._folders[key][0] in removed_ids:
+                        folder_id = self._folders.pop(key)[0]
+                        changed = changed or folder_id not in removed_ids
+                        removed_ids.add(folder_id)
+            for key in list(self._files):
+                if key[0] in removed_ids or self._files[key][0] in removed_ids:
+                    del self._files[key]
+            self.invalidations += len(removed_ids)
+
+    def clear(self):
+        with self._lock:
+            self._folders.clear()
+            self._files.clear()
+
+    def stats(self):
+        """返回命中/未命中统计 (每次命中即省下一次 files().list 调用)"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "folders": len(self._folders),
+                "files": len(self._files),
+            }
+
+
+class VersionCache:
+    """文件 ID -> 最近一次列出时看到的版本 (md5Checksum/modifiedTime), 有容量上限, 按 LRU 淘汰"""
+
+    def __init__(self, max_entries=16384):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._versions = OrderedDict()
+        self.evictions = 0
+
+    def get(self, file_id):
+        with self._lock:
+            version = self._versions.get(file_id)
+            if version is not None:
+                self._versions.move_to_end(file_id)
+            return version
+
+    def put(self, file_id, version):
+        with self._lock:
+            self._versions[file_id] = version
+            self._versions.move_to_end(file_id)
+            while len(self._versions) > self.max_entries:
+                self._versions.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, file_id, default=None):
+        with self._lock:
+            return self._versions.pop(file_id, default)
+
+    def __len__(self):
+        return len(self._versions)
+
+
+# 进程级共享缓存
+id_cache = DriveIdCache()
@@ -0,0 +1,172 @@
+import itertools
+import threading
+import time
+from collections import defaultdict
+from google_drive_client import BATCH_LIMIT, BatchResult, DEFAULT_MAX_WORKERS
+from instrumentation import metrics
+from storage_backend import StorageBackend
+
+
+class FakeDriveClient(StorageBackend):
+    """内存中的 Drive 替身, 与 GoogleDriveClient 的公开方法一致, 用于离线基准测试
+
+    每次 API 调用休眠 latency 秒模拟网络往返 (批量请求每批一次), 调用次数按 Drive 方法名统计;
+    不模拟 ID 缓存, 同一路径每次都按逐级查找计费
+    """
+
+    def __init__(self, latency=0.0, max_workers=DEFAULT_MAX_WORKERS):
+        super().__init__(max_workers)
+        self.latency = latency
+        self.parent_folder_id = "root"
+        self.local_cache = None
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self._clock = itertools.count(1)
+        # 文件 ID -> {name, parent, folder, content, modified}
+        self._items = {"root": {"name": "", "parent": None, "folder": True, "content": None, "modified": 0}}
+        self._by_parent = defaultdict(list)
+
+    def _call(self, method_id, count=1, timed_as=None):
+        for _ in range(count):
+            self._count_call(method_id)
+        with metrics.timed(timed_as or method_id):
+            if self.latency:
+                time.sleep(self.latency)
+
+    def _children(self, parent_id, name=None, folder=None):
+        """按修改时间升序, 与真实客户端的列表顺序一致"""
+        children = [(file_id, self._items[file_id]) for file_id in self._by_parent.get(parent_id, ())]
+        children = [(file_id, item) for file_id, item in children
+                    if (name is None or item["name"] == name) and (folder is None or item["folder"] == folder)]
+        return sorted(children, key=lambda child: child[1]["modified"])
+
+    def _new_item(self, name, parent_id, folder, content=None):
+        file_id = f"fake{next(self._ids)}"
+        self._items[file_id] = {"name": name, "parent": parent_id, "folder": folder, "content": content,
+                                "modified": next(self._clock)}
+        self._by_parent[parent_id].append(file_id)
+        return file_id
+
+    def get_folder_id(self, folder_name, parent_id=None):
+        self._call('drive.files.list')
+        with self._lock:
+            folders = self._children(parent_id or self.parent_folder_id, folder_name, folder=True)
+            return folders[0][0] if folders else None
+
+    def get_file_id(self, file_name, folder_id):
+        self._call('drive.files.list')
+        with self._lock:
+            files = self._children(folder_id, file_name)
+            return files[-1][0] if files else None
+
+    def resolve_folder(self, folder_path, create=False):
+        current_folder_id = self.parent_folder_id
+        for part in [part for part in folder_path.strip('/').split('/') if part]:
+            folder_id = self.get_folder_id(part, current_folder_id)
+            if not folder_id:
+                if not create:
+                    return None
+                self._call('drive.files.create')
+                with self._lock:
+                    folder_id = self._new_item(part, current_folder_id, True)
+            current_folder_id = folder_id
+        return current_folder_id
+
+    @staticmethod
+    def _bytes(file_content):
+        return file_content.encode('utf-8') if isinstance(file_content, str) else file_content
+
+    def upload_file(self, file_name, file_content, folder_path):
+        folder_id = self.ensure_folder(folder_path)
+        self._call('drive.files.create')
+        with self._lock:
+            return self._new_item(file_name, folder_id, False, self._bytes(file_content))
+
+    def update_file(self, file_id, file_content):
+        self._call('drive.files.update')
+        with self._lock:
+            item = self._items[file_id]
+            item["content"] = self._bytes(file_content)
+            item["modified"] = next(self._clock)
+        return file_id
+
+    def _same_content(self, file_id, data):
+        with self._lock:
+            return self._items[file_id]["content"] == data
+
+    def download_by_id(self, file_id, immutable=False):
+        self._call('drive.files.get_media')
+        with self._lock:
+            item = self._items.get(file_id)
+            if item is None or item["folder"]:
+                raise FileNotFoundError(file_id)
+            return item["content"].decode('utf-8')
+
+    def _list(self, folder_id):
+        with self._lock:
+            return [(item["name"], file_id) for file_id, item in self._children(folder_id)]
+
+    def list_files(self, folder_path, immutable=False):
+        folder_id = self.resolve_folder(folder_path)
+        if not folder_id:
+            return []
+        self._call('drive.files.list')
+        return self._list(folder_id)
+
+    def _batch_call(self, method_id, count):
+        """批量请求: 每 BATCH_LIMIT 项一次往返"""
+        for start in range(0, count, BATCH_LIMIT):
+            self._call(method_id, min(BATCH_LIMIT, count - start), 'drive.batch')
+
+    def list_files_many(self, folder_paths):
+        folder_ids = dict((folder_path, self.resolve_folder(folder_path)) for folder_path in folder_paths)
+        self._batch_call('drive.files.list', sum(1 for folder_id in folder_ids.values() if folder_id))
+        return [BatchResult(folder_path, self._list(folder_ids[folder_path]) if folder_ids[folder_path] else [], None)
+                for folder_path in folder_paths]
+
+    def _delete(self, file_id):
+        with self._lock:
+            if file_id not in self._items:
+                raise FileNotFoundError(file_id)
+            self._by_parent[self._items[file_id]["parent"]].remove(file_id)
+            pending = [file_id]
+            while pending:
+                current = pending.pop()
+                pending.extend(self._by_parent.pop(current, ()))
+                del self._items[current]
+
+    def delete_folder(self, folder_path):
+        folder_id = self.resolve_folder(folder_path)
+        if not folder_id:
+            return False
+        self._call('drive.files.delete')
+        self._delete(folder_id)
+        return True
+
+    def delete_folders(self, folders):
+        self._batch_call('drive.files.delete', len(folders))
+        results = []
+        for folder_path, folder_id in folders:
+            try:
+                self._delete(folder_id)
+                results.append(BatchResult((folder_path, folder_id), None, None))
+            except Exception as e:
+                results.append(BatchResult((folder_path, folder_id), None, e))
+        return results
+
+    def compact_duplicates(self, folder_paths):
+        results = []
+        stale = []
+        for item in self.list_files_many(folder_paths):
+            newest = {name: file_id for name, file_id in item.result}
+            stale.extend((item.key, name, file_id) for name, file_id in item.result if newest[name] != file_id)
+        self._batch_call('drive.files.delete', len(stale))
+        for key in stale:
+            self._delete(key[2])
+            results.append(BatchResult(key, None, None))
+        return results
+
+    def file_count(self):
+        """存储中的文件数 (不含文件夹)"""
+        with self._lock:
+            return sum(1 for item in self._items.values() if not item["folder"])
\ No newline at end of file
@@ -1,96 +1,378 @@
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
+from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload
+from drive_cache import VersionCache, id_cache
+from instrumentation import metrics
+from concurrent_loader import DEFAULT_MAX_WORKERS, TaskResult
+import hashlib
+from local_cache import DEFAULT_CACHE_PATH, DEFAULT_LISTING_TTL, LocalDriveCache
+from storage_backend import StorageBackend
+import google_auth_httplib2
+import httplib2
 import io
 import os
 import json
 
-class GoogleDriveClient:
-    def __init__(self, credentials_json, parent_folder_id):
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+# 列出文件时一并取回类型和版本信息: 子文件夹与文件的 ID 分开缓存, 版本供本地缓存校验
+FILE_FIELDS = "files(id, name, mimeType, md5Checksum, modifiedTime)"
+# 列表按修改时间升序, 同名重复文件中最新的一个最后写入 ID 缓存
+LIST_ORDER = "modifiedTime"
+# 超过此大小的内容使用可续传分块上传
+RESUMABLE_THRESHOLD = 5 * 1024 * 1024
+# 分块大小必须是 256KB 的整数倍
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# 单个 HTTP 请求的超时时间 (秒)
+DEFAULT_REQUEST_TIMEOUT = 30
+# Drive batch 接口每批最多 100 个请求
+BATCH_LIMIT = 100
+
+BatchResult = TaskResult
+
+
+class DriveBatch:
+    """收集多个 Drive 请求, 按批合并为 batch HTTP 请求执行"""
+
+    def __init__(self, client, batch_size=BATCH_LIMIT):
+        self.client = client
+        self.batch_size = min(batch_size, BATCH_LIMIT)
+        self._requests = []
+
+    def add(self, key, request):
+        self._requests.append((key, request))
+        return self
+
+    def __len__(self):
+        return len(self._requests)
+
+    def execute(self):
+        """执行所有请求, 按添加顺序返回每项的结果或错误"""
+        results = [None] * len(self._requests)
+        for start in range(0, len(self._requests), self.batch_size):
+            chunk = self._requests[start:start + self.batch_size]
+
+            def callback(request_id, response, exception):
+                index = int(request_id)
+                results[index] = BatchResult(self._requests[index][0], response, exception)
+
+            batch = self.client.service.new_batch_http_request(callback=callback)
+            for offset, (key, request) in enumerate(chunk):
+                self.client._count_call(request.methodId)
+                batch.add(request, request_id=str(start + offset))
+            try:
+                # 子请求已按方法计数, 延迟按整批往返记录
+                with metrics.timed('drive.batch'):
+                    batch.execute(http=self.client._http())
+            except Exception as e:
+                # 整批失败时, 每项都记为同一错误
+                for offset, (key, _) in enumerate(chunk):
+                    if results[start + offset] is None:
+                        results[start + offset] = BatchResult(key, None, e)
+        return results
+
+
+class GoogleDriveClient(StorageBackend):
+    def __init__(self, credentials_json, parent_folder_id, cache=None, http=None,
+                 max_workers=DEFAULT_MAX_WORKERS, request_timeout=DEFAULT_REQUEST_TIMEOUT, local_cache=None):
+        super().__init__(max_workers, request_timeout)
         scopes = ['https://www.googleapis.com/auth/drive']
         # 从环境变量加载凭证
-        if isinstance(credentials_json, str):
-            with open('/tmp/credentials.json', 'w') as f:
-                f.write(credentials_json)
-            credentials = service_account.Credentials.from_service_account_file(
-                '/tmp/credentials.json', scopes=scopes)
+        if http is not None:
+            # 使用自定义 HTTP 传输 (例如本地 HttpMockSequence), 不需要凭证
+            credentials = None
         else:
+            # 直接在内存中解析凭证, 不再写入 /tmp/credentials.json
+            if isinstance(credentials_json, str):
+                credentials_json = json.loads(credentials_json)
             credentials = service_account.Credentials.from_service_account_info(
                 credentials_json, scopes=scopes)
-        self.service = build('drive', 'v3', credentials=credentials)
+        if http is not None:
+            self.service = build('drive', 'v3', http=http)
+        else:
+            self.service = build('drive', 'v3', credentials=credentials)
+        self.credentials = credentials
         self.parent_folder_id = parent_folder_id
+        self.cache = cache or id_cache
+        self.local_cache = local_cache
+        # 文件 ID -> 最近一次列出时看到的版本 (md5Checksum/modifiedTime)
+        self._versions = VersionCache()
+        self._custom_http = http
+
+    @classmethod
+    def from_env(cls):
+        """按环境变量创建客户端"""
+        return cls(
+            credentials_json=os.getenv('GOOGLE_CREDENTIALS'),
+            parent_folder_id=os.getenv('GOOGLE_DRIVE_FOLDER_ID'),
+            max_workers=int(os.getenv('DRIVE_MAX_WORKERS', '8')),
+            request_timeout=float(os.getenv('DRIVE_REQUEST_TIMEOUT', '30')),
+            local_cache=LocalDriveCache(
+                os.getenv('LOCAL_CACHE_PATH', DEFAULT_CACHE_PATH),
+                int(os.getenv('LOCAL_CACHE_MAX_MB', '200')) * 1024 * 1024,
+                float(os.getenv('LOCAL_CACHE_LISTING_TTL', str(DEFAULT_LISTING_TTL)))
+            )
+        )
+
+    def _http(self):
+        """每个线程使用独立的 HTTP 连接 (httplib2 不是线程安全的)"""
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            if self._custom_http is not None:
+                http = self._custom_http
+            else:
+                http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=self.request_timeout))
+            self._local.http = http
+        return http
+
+    def _execute(self, request):
+        with self._timed_call(request.methodId):
+            return request.execute(http=self._http())
+
+    def _remember_versions(self, items):
+        for item in items:
+            version = f"{item.get('md5Checksum', '')}:{item.get('modifiedTime', '')}"
+            if version != ":":
+                self._versions.put(item['id'], version)
+
+    def _remember_children(self, folder_id, items):
+        """缓存列出的子项 ID: 子文件夹和文件分开缓存, 同名的文件和文件夹不会互相覆盖"""
+        for item in items:
+            if item.get('mimeType') == FOLDER_MIME_TYPE:
+                self.cache.put_folder(folder_id, item['name'], item['id'])
+            else:
+                self.cache.put_file(folder_id, item['name'], item['id'])
 
     def upload_file(self, file_name, file_content, folder_path):
-        """上传文件到指定文件夹"""
+        """上传文件到指定文件夹, 返回文件 ID"""
         folder_id = self.ensure_folder(folder_path)
         file_metadata = {
             'name': file_name,
             'parents': [folder_id],
             'mimeType': 'text/plain'
         }
-        # 创建临时文件
-        temp_path = '/tmp/temp_file'
-        with open(temp_path, 'w', encoding='utf-8') as f:
-            f.write(file_content)
-        media = MediaFileUpload(temp_path, mimetype='text/plain')
-        self.service.files().create(body=file_metadata, media_body=media).execute()
-        os.remove(temp_path)
-
-    def download_file(self, file_name, folder_path):
-        """下载文件内容"""
-        folder_id = self.get_folder_id(folder_path)
-        if not folder_id:
-            return None
-        file_id = self.get_file_id(file_name, folder_id)
-        if not file_id:
-            return None
-        request = self.service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
+        media = self._media_body(file_content)
+        file = self._execute(self.service.files().create(body=file_metadata, media_body=media,
+                                                         fields='id, md5Checksum, modifiedTime'))
+        file_id = file.get('id')
+        self._remember_versions([file])
+        self.cache.put_file(folder_id, file_name, file_id)
+        if self.local_cache:
+            self.local_cache.invalidate_listing(folder_id)
+        return file_id
+
+    def update_file(self, file_id, file_content):
+        """覆盖已有文件的内容"""
+        media = self._media_body(file_content)
+        self._versions.pop(file_id, None)
+        file = self._execute(self.service.files().update(fileId=file_id, media_body=media,
+                                                         fields='id, md5Checksum, modifiedTime'))
+        self._remember_versions([file])
+        if self.local_cache:
+            self.local_cache.invalidate_file(file_id)
+        return file_id
+
+    def _same_content(self, file_id, data):
+        """按最近一次列出时看到的 md5 判断内容是否未变 (有同名重复文件时 get_file_id 返回最新的一个)"""
+        version = self._versions.get(file_id)
+        return bool(version) and version.split(':', 1)[0] == hashlib.md5(data).hexdigest()
+
+    def _media_body(self, file_content, mimetype='text/plain'):
+        """直接从内存缓冲区上传, 大内容使用可续传分块上传"""
+        data = file_content.encode('utf-8') if isinstance(file_content, str) else file_content
+        return MediaIoBaseUpload(io.BytesIO(data), mimetype=mimetype, chunksize=UPLOAD_CHUNK_SIZE,
+                                 resumable=len(data) > RESUMABLE_THRESHOLD)
+
+    def download_by_id(self, file_id, immutable=False):
+        """按文件 ID 下载文件内容, 优先读取本地缓存"""
+        version = self._versions.get(file_id)
+        if self.local_cache:
+            content = self.local_cache.get_file(file_id, version)
+            if content is not None:
+                return content
+        with self._timed_call('drive.files.get_media'):
+            request = self.service.files().get_media(fileId=file_id)
+            request.http = self._http()
+            fh = io.BytesIO()
+            downloader = MediaIoBaseDownload(fh, request)
+            done = False
+            while not done:
+                status, done = downloader.next_chunk()
         fh.seek(0)
-        return fh.read().decode('utf-8')
+        content = fh.read().decode('utf-8')
+        if self.local_cache:
+            self.local_cache.put_file(file_id, content, version, immutable)
+        return content
 
-    def list_files(self, folder_path):
-        """列出文件夹中的文件"""
-        folder_id = self.get_folder_id(folder_path)
+    def list_files(self, folder_path, immutable=False):
+        """列出文件夹中的文件, immutable=True 时非空列表缓存在本地 (local_cache.listing_ttl 秒后重新列出)"""
+        folder_id = self.resolve_folder(folder_path)
         if not folder_id:
             return []
+        files = self.local_cache.get_listing(folder_id) if immutable and self.local_cache else None
+        if files is not None:
+            # 永久文件夹 (往期开奖结果) 中只有文件
+            for name, file_id in files:
+                self.cache.put_file(folder_id, name, file_id)
+            return files
         query = f"'{folder_id}' in parents and trashed=false"
-        results = self.service.files().list(q=query, fields="files(id, name)").execute()
-        return [(item['name'], item['id']) for item in results.get('files', [])]
+        items = self._execute(self.service.files().list(q=query, fields=FILE_FIELDS, orderBy=LIST_ORDER)).get('files', [])
+        self._remember_versions(items)
+        # 顺便缓存列出的 ID, 后续 download_file 和 resolve_folder 无需再查
+        self._remember_children(folder_id, items)
+        files = [(item['name'], item['id']) for item in items]
+        if immutable and files and self.local_cache:
+            self.local_cache.put_listing(folder_id, files)
+        return files
 
-    def ensure_folder(self, folder_path):
-        """确保文件夹存在，返回文件夹 ID"""
-        parts = folder_path.strip('/').split('/')
+    def resolve_folder(self, folder_path, create=False):
+        """按路径逐级查找文件夹 ID (优先读缓存), create=True 时自动创建缺失的文件夹"""
+        path = self.cache.normalize_path(folder_path)
+        if not path:
+            return self.parent_folder_id
+        folder_id = self.cache.get_folder(self.parent_folder_id, path)
+        if folder_id:
+            return folder_id
+        parts = path.split('/')
         current_folder_id = self.parent_folder_id
-        for part in parts:
-            folder_id = self.get_folder_id(part, current_folder_id)
+        for i, part in enumerate(parts):
+            sub_path = '/'.join(parts[:i + 1])
+            folder_id = self.cache.get_folder(self.parent_folder_id, sub_path) if i < len(parts) - 1 else None
+            if not folder_id:
+                folder_id = self.get_folder_id(part, current_folder_id)
             if not folder_id:
+                if not create:
+                    return None
                 file_metadata = {
                     'name': part,
-                    'mimeType': 'application/vnd.google-apps.folder',
+                    'mimeType': FOLDER_MIME_TYPE,
                     'parents': [current_folder_id]
                 }
-                folder = self.service.files().create(body=file_metadata, fields='id').execute()
+                folder = self._execute(self.service.files().create(body=file_metadata, fields='id'))
                 folder_id = folder.get('id')
+            self.cache.put_folder(self.parent_folder_id, sub_path, folder_id)
             current_folder_id = folder_id
         return current_folder_id
 
     def get_folder_id(self, folder_name, parent_id=None):
         """获取文件夹 ID"""
-        query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
+        if parent_id:
+            cached = self.cache.get_folder(parent_id, folder_name)
+            if cached:
+                return cached
+        query = f"name='{folder_name}' and mimeType='{FOLDER_MIME_TYPE}' and trashed=false"
         if parent_id:
             query += f" and '{parent_id}' in parents"
-        results = self.service.files().list(q=query, fields="files(id)").execute()
+        results = self._execute(self.service.files().list(q=query, fields="files(id)"))
         folders = results.get('files', [])
-        return folders[0]['id'] if folders else None
+        folder_id = folders[0]['id'] if folders else None
+        if folder_id and parent_id:
+            self.cache.put_folder(parent_id, folder_name, folder_id)
+        return folder_id
 
     def get_file_id(self, file_name, folder_id):
         """获取文件 ID"""
+        cached = self.cache.get_file(folder_id, file_name)
+        if cached:
+            return cached
         query = f"name='{file_name}' and '{folder_id}' in parents and trashed=false"
-        results = self.service.files().list(q=query, fields="files(id)").execute()
+        # 有同名重复文件时取最新的一个
+        results = self._execute(self.service.files().list(q=query, fields="files(id, md5Checksum, modifiedTime)",
+                                                          orderBy="modifiedTime desc"))
         files = results.get('files', [])
-        return files[0]['id'] if files else None
\ No newline at end of file
+        self._remember_versions(files)
+        file_id = files[0]['id'] if files else None
+        if file_id:
+            self.cache.put_file(folder_id, file_name, file_id)
+        return file_id
+
+    def delete_folder(self, folder_path):
+        """删除文件夹并清除相关缓存, 返回是否删除"""
+        folder_id = self.resolve_folder(folder_path)
+        if not folder_id:
+            return False
+        self._execute(self.service.files().delete(fileId=folder_id))
+        self._forget_folder(folder_path, folder_id)
+        return True
+
+    def _forget_folder(self, folder_path, folder_id):
+        """文件夹删除后清除 ID 缓存, 以及本地缓存中该文件夹和父文件夹的列表"""
+        self.cache.invalidate_path(self.parent_folder_id, folder_path, folder_id)
+        if self.local_cache:
+            self.local_cache.invalidate_listing(folder_id)
+            parent_id = self.resolve_folder(self.cache.normalize_path(folder_path).rpartition('/')[0])
+            if parent_id:
+                self.local_cache.invalidate_listing(parent_id)
+
+    def batch(self, batch_size=BATCH_LIMIT):
+        """创建批量请求"""
+        return DriveBatch(self, batch_size)
+
+    def list_files_many(self, folder_paths):
+        """批量列出多个文件夹, 每项 result 为 [(name, id)]"""
+        batch = self.batch()
+        folder_ids = {}
+        for folder_path in folder_paths:
+            folder_id = self.resolve_folder(folder_path)
+            if folder_id:
+                folder_ids[folder_path] = folder_id
+                query = f"'{folder_id}' in parents and trashed=false"
+                batch.add(folder_path, self.service.files().list(q=query, fields=FILE_FIELDS, orderBy=LIST_ORDER))
+        listed = {item.key: item for item in batch.execute()}
+        results = []
+        for folder_path in folder_paths:
+            item = listed.get(folder_path)
+            if item is None:
+                results.append(BatchResult(folder_path, [], None))
+            elif item.error is not None:
+                results.append(item)
+            else:
+                self._remember_versions(item.result.get('files', []))
+                self._remember_children(folder_ids[folder_path], item.result.get('files', []))
+                files = [(f['name'], f['id']) for f in item.result.get('files', [])]
+                results.append(BatchResult(folder_path, files, None))
+        return results
+
+    def delete_folders(self, folders):
+        """批量删除文件夹, folders 为 [(路径, 文件夹 ID)], 成功的项同时清除缓存"""
+        batch = self.batch()
+        for folder_path, folder_id in folders:
+            batch.add((folder_path, folder_id), self.service.files().delete(fileId=folder_id))
+        results = batch.execute()
+        for item in results:
+            if item.error is None:
+                folder_path, folder_id = item.key
+                self._forget_folder(folder_path, folder_id)
+        return results
+
+    def compact_duplicates(self, folder_paths):
+        """删除各文件夹中的同名重复文件, 每个名称只保留最新的一个
+
+        返回 [BatchResult((文件夹路径, 文件名, 文件 ID), None, 错误)], 列出失败的文件夹以 (路径, None, None) 为键
+        """
+        results = []
+        stale = []
+        for item in self.list_files_many(folder_paths):
+            if item.error is not None:
+                results.append(BatchResult((item.key, None, None), None, item.error))
+                continue
+            # 列表按修改时间升序, 同名文件中最后一个最新
+            newest = {name: file_id for name, file_id in item.result}
+            stale.extend((item.key, name, file_id) for name, file_id in item.result if newest[name] != file_id)
+        if not stale:
+            return results
+        batch = self.batch()
+        for key in stale:
+            batch.add(key, self.service.files().delete(fileId=key[2]))
+        for item in batch.execute():
+            folder_path, _, file_id = item.key
+            if item.error is None:
+                self._versions.pop(file_id, None)
+                if self.local_cache:
+                    self.local_cache.invalidate_file(file_id)
+                    self.local_cache.invalidate_listing(self.resolve_folder(folder_path))
+            results.append(item)
+        return results
+
+    def cache_stats(self):
+        """ID 缓存命中统计"""
+        return self.cache.stats()
\ No newline at end of file
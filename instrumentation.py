@@ -0,0 +1,259 @@
+import bisect
+import contextvars
+import http.server
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# 延迟直方图的桶上限 (秒), 与 Prometheus 默认桶一致
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_TRACES = 50
+
+# 查找调用方时跳过的模块: 存储后端内部、线程池和标准库的上下文管理
+SKIPPED_MODULES = {
+    "instrumentation", "storage_backend", "google_drive_client", "async_drive_client", "fake_drive", "local_storage",
+    "tiered_storage", "drive_cache", "local_cache", "concurrent_loader", "contextlib", "threading",
+}
+SKIPPED_PREFIXES = ("concurrent.", "asyncio", "googleapiclient", "httplib2", "google_auth_httplib2", "httpx", "httpcore")
+
+_caller = contextvars.ContextVar("drive_caller", default=None)
+_span = contextvars.ContextVar("trace_span", default=None)
+
+
+def _skipped(module):
+    return module in SKIPPED_MODULES or module.startswith(SKIPPED_PREFIXES)
+
+
+def current_caller():
+    """发起 API 调用的业务函数 ("模块.函数"), 跳过存储后端内部的栈帧;
+
+    线程池任务中使用提交任务时记录的调用方, 找不到业务栈帧时使用线程名
+    """
+    caller = _caller.get()
+    if caller is not None:
+        return caller
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not _skipped(module):
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return threading.current_thread().name
+
+
+def context_for_task(caller):
+    """线程池任务的上下文: 复制当前上下文 (包括追踪区间), 并记下提交任务的调用方"""
+    context = contextvars.copy_context()
+    context.run(_caller.set, caller)
+    return context
+
+
+class LatencyHistogram:
+    """累计延迟直方图 (Prometheus 格式的桶), 可估算分位数"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        """按桶内线性插值估算分位数, 落在最后一个桶时返回最大的桶上限"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class Span:
+    """一次操作 (例如一次 Streamlit 按钮操作) 的追踪区间, 汇总其中发出的 API 调用"""
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.children = []
+        # 方法 -> [次数, 总耗时]
+        self.calls = {}
+
+    def add_call(self, method_id, seconds):
+        entry = self.calls.setdefault(method_id, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def call_count(self):
+        return sum(count for count, _ in self.calls.values()) + sum(child.call_count() for child in self.children)
+
+    def summary(self, indent=0):
+        """多行文本: 区间耗时和其中各方法的调用次数/耗时, 子区间缩进显示"""
+        lines = [f"{'  ' * indent}{self.name}: {(self.seconds or 0.0) * 1000:.0f} ms, API 调用 {self.call_count()} 次"]
+        for method_id, (count, seconds) in sorted(self.calls.items()):
+            lines.append(f"{'  ' * (indent + 1)}{method_id}: {count} 次, {seconds * 1000:.0f} ms")
+        for child in self.children:
+            lines.append(child.summary(indent + 1))
+        return "\n".join(lines)
+
+
+class Metrics:
+    """进程级 API 调用指标: 按方法和调用方计数, 按方法记录延迟直方图和错误数, 保留最近的追踪"""
+
+    def __init__(self, max_traces=MAX_TRACES):
+        self._lock = threading.Lock()
+        self.calls = Counter()
+        self.errors = Counter()
+        self.histograms = {}
+        self.traces = deque(maxlen=max_traces)
+
+    def count_call(self, method_id, caller=None, count=1):
+        caller = caller or current_caller()
+        with self._lock:
+            self.calls[(method_id, caller)] += count
+
+    def observe(self, method_id, seconds, error=False):
+        with self._lock:
+            histogram = self.histograms.get(method_id)
+            if histogram is None:
+                histogram = self.histograms[method_id] = LatencyHistogram()
+            histogram.observe(seconds)
+            if error:
+                self.errors[method_id] += 1
+            span = _span.get()
+            if span is not None:
+                span.add_call(method_id, seconds)
+
+    @contextmanager
+    def timed(self, method_id):
+        """计时一次远程调用, 异常时记为错误"""
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.observe(method_id, time.perf_counter() - start, error)
+
+    @contextmanager
+    def trace(self, name):
+        """追踪区间: 区间内 (包括线程池任务中) 的 API 调用计入该区间; 最外层区间结束后保存在最近的追踪中"""
+        parent = _span.get()
+        span = Span(name, parent)
+        token = _span.set(span)
+        try:
+            yield span
+        finally:
+            _span.reset(token)
+            span.seconds = time.perf_counter() - span.start
+            with self._lock:
+                if parent is not None:
+                    parent.children.append(span)
+                else:
+                    self.traces.append(span)
+
+    def method_totals(self):
+        """{方法: 调用次数}"""
+        totals = Counter()
+        with self._lock:
+            for (method_id, _), count in self.calls.items():
+                totals[method_id] += count
+        return totals
+
+    def caller_totals(self):
+        """{调用方: Counter(方法: 次数)}"""
+        callers = {}
+        with self._lock:
+            for (method_id, caller), count in self.calls.items():
+                callers.setdefault(caller, Counter())[method_id] += count
+        return callers
+
+    def latency_summary(self):
+        """{方法: (次数, 平均秒数, p50, p95, 错误数)}"""
+        with self._lock:
+            return dict((method_id, (histogram.count, histogram.total / histogram.count, histogram.quantile(0.5),
+                                     histogram.quantile(0.95), self.errors[method_id]))
+                        for method_id, histogram in sorted(self.histograms.items()) if histogram.count)
+
+    def recent_traces(self):
+        with self._lock:
+            return list(self.traces)
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.errors.clear()
+            self.histograms.clear()
+            self.traces.clear()
+
+    def prometheus_text(self):
+        """Prometheus 文本格式的指标"""
+        def label(value):
+            return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+        lines = ["# HELP drive_api_calls_total Remote storage API calls by method and caller.",
+                 "# TYPE drive_api_calls_total counter"]
+        with self._lock:
+            for (method_id, caller), count in sorted(self.calls.items()):
+                lines.append(f'drive_api_calls_total{{method="{label(method_id)}",caller="{label(caller)}"}} {count}')
+            lines.extend(["# HELP drive_api_errors_total Remote storage API calls that raised an error.",
+                          "# TYPE drive_api_errors_total counter"])
+            for method_id, count in sorted(self.errors.items()):
+                lines.append(f'drive_api_errors_total{{method="{label(method_id)}"}} {count}')
+            lines.extend(["# HELP drive_api_call_seconds Remote storage API call latency.",
+                          "# TYPE drive_api_call_seconds histogram"])
+            for method_id, histogram in sorted(self.histograms.items()):
+                method = label(method_id)
+                cumulative = 0
+                for bucket, bucket_count in zip(histogram.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'drive_api_call_seconds_bucket{{method="{method}",le="{bucket}"}} {cumulative}')
+                lines.append(f'drive_api_call_seconds_bucket{{method="{method}",le="+Inf"}} {histogram.count}')
+                lines.append(f'drive_api_call_seconds_sum{{method="{method}"}} {histogram.total}')
+                lines.append(f'drive_api_call_seconds_count{{method="{method}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """/metrics 返回 Prometheus 文本格式的指标"""
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.prometheus_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """在后台线程中提供 http://host:port/metrics, 返回服务器 (调用 shutdown() 停止)"""
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    return server
\ No newline at end of file
@@ -0,0 +1,178 @@
+import os
+import threading
+from datetime import datetime
+import pytz
+from permutation_table import CANONICAL_KEYS, permutations
+from receipt_manifest import OP_CODE_MAP
+from settlement import BIG_PAYOUTS, SMALL_PAYOUTS
+from winning_index import PRIZE_TIERS
+
+try:
+    import numpy as np
+except ImportError:  # 没有 numpy 时不维护赔付风险索引
+    np = None
+
+MYT = pytz.timezone('Asia/Kuala_Lumpur')
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "malaysia4d", "liability.npz")
+DEFAULT_SNAPSHOT_INTERVAL = 30
+
+OPERATORS = list(OP_CODE_MAP.values())
+STAKE_TYPES = ("big", "small", "straight")
+
+
+class LiabilityIndex:
+    """当期赔付风险索引: 运营商 x 奖项 x 下注类型 x 10000 个号码 -> 该号码中该奖项时的应付奖金
+
+    购票时增量累加 (iBox 按全部排列全额计入, Box 只计入排序后的号码), 与结算使用相同的赔率;
+    新的一天第一次购票时清零, 定期写快照到本地, 重启后载入当天的快照
+    """
+
+    def __init__(self, snapshot_path=DEFAULT_SNAPSHOT_PATH, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._op_positions = {op: i for i, op in enumerate(OPERATORS)}
+        self._unit = np.zeros((len(PRIZE_TIERS), len(STAKE_TYPES)))
+        self._unit[:, 0] = BIG_PAYOUTS
+        self._unit[:, 1] = SMALL_PAYOUTS
+        self._unit[0, 2] = BIG_PAYOUTS[0]
+        self._worst = None
+        self.date_str = None
+        self.tickets = 0
+        self.dirty = False
+        self.last_snapshot_at = None
+        self._reset(datetime.now(MYT).strftime("%Y-%m-%d"))
+        self.load_snapshot()
+
+    def _reset(self, date_str):
+        self.date_str = date_str
+        self.exposure = np.zeros((len(OPERATORS), len(PRIZE_TIERS), len(STAKE_TYPES), 10000))
+        self.tickets = 0
+        self._worst = None
+
+    def add_bets(self, bets, date_str=None):
+        """累加一张收条的投注 [(号码, 大万, 小万, 直选, iBox, Box, 运营商)]"""
+        date_str = date_str or datetime.now(MYT).strftime("%Y-%m-%d")
+        with self._lock:
+            if date_str != self.date_str:
+                self._reset(date_str)
+            for number, big, small, straight, perm_bet, box_bet, operators in bets:
+                positions = [self._op_positions[op] for op in operators if op in self._op_positions]
+                if not positions:
+                    continue
+                number = int(number)
+                if perm_bet:
+                    numbers = list(permutations(number))
+                    stakes = (big, small, 0.0)
+                elif box_bet:
+                    numbers = [CANONICAL_KEYS[number]]
+                    stakes = (big, 0.0, 0.0)
+                else:
+                    numbers = [number]
+                    stakes = (big, small, straight)
+                payout = self._unit * np.asarray(stakes)
+                # 同一运营商重复选择时重复计入, 与结算一致
+                for position in positions:
+                    self.exposure[position][:, :, numbers] += payout[:, :, None]
+            self.tickets += 1
+            self.dirty = True
+            self._worst = None
+
+    def _worst_by_number(self):
+        """各号码的最坏赔付: 每个运营商取赔付最高的奖项, 再按运营商求和"""
+        if self._worst is None:
+            self._worst = self.exposure.sum(axis=2).max(axis=1).sum(axis=0)
+        return self._worst
+
+    def payout_if(self, number, prize=PRIZE_TIERS[0], operator=None):
+        """号码 number 中 prize 时的应付奖金 (operator 为 None 时为所有运营商合计)"""
+        tier = PRIZE_TIERS.index(prize)
+        with self._lock:
+            if operator is None:
+                return float(self.exposure[:, tier, :, int(number)].sum())
+            position = self._op_positions.get(operator)
+            return 0.0 if position is None else float(self.exposure[position, tier, :, int(number)].sum())
+
+    def worst_case(self, number):
+        """号码 number 开出时的最坏赔付 (各运营商都开在赔付最高的奖项)"""
+        with self._lock:
+            return float(self.exposure[:, :, :, int(number)].sum(axis=2).max(axis=1).sum())
+
+    def top_numbers(self, k=10):
+        """最坏赔付最高的 k 个号码 [(号码, 金额)], 按金额降序"""
+        if k <= 0:
+            return []
+        with self._lock:
+            worst = self._worst_by_number()
+            k = min(k, len(worst))
+            top = np.argpartition(worst, -k)[-k:]
+            top = top[np.argsort(-worst[top], kind="stable")]
+            return [(f"{number:04d}", float(worst[number])) for number in top.tolist() if worst[number] > 0]
+
+    def save_snapshot(self):
+        with self._lock:
+            if not self.dirty:
+                return False
+            exposure = self.exposure.copy()
+            meta = np.array([self.date_str, str(self.tickets)])
+            self.dirty = False
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+        tmp_path = self.snapshot_path + ".tmp.npz"
+        np.savez(tmp_path, exposure=exposure, meta=meta)
+        os.replace(tmp_path, self.snapshot_path)
+        self.last_snapshot_at = datetime.now(MYT)
+        return True
+
+    def load_snapshot(self):
+        """载入当天的快照, 快照不存在、日期不同或格式不符时保持为空"""
+        if not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with np.load(self.snapshot_path, allow_pickle=False) as data:
+                date_str, tickets = data["meta"].tolist()
+                exposure = data["exposure"]
+        except Exception as e:
+            print(f"读取赔付风险快照失败: {e}")
+            return False
+        with self._lock:
+            if date_str != self.date_str or exposure.shape != self.exposure.shape:
+                return False
+            self.exposure = exposure
+            self.tickets = int(tickets)
+            self._worst = None
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.snapshot_interval):
+            try:
+                self.save_snapshot()
+            except Exception as e:
+                print(f"保存赔付风险快照失败: {e}")
+
+    def start(self):
+        """启动定期快照线程 (守护线程, 重复调用无效)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="liability-snapshot", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self.save_snapshot()
+        except Exception as e:
+            print(f"保存赔付风险快照失败: {e}")
+
+    def stats(self):
+        return {
+            "date": self.date_str,
+            "tickets": self.tickets,
+            "last_snapshot_at": self.last_snapshot_at.strftime("%Y-%m-%d %H:%M:%S") if self.last_snapshot_at else None,
+        }
+
+
+def create_liability_index(snapshot_path=DEFAULT_SNAPSHOT_PATH):
+    """没有 numpy 时返回 None"""
+    return LiabilityIndex(snapshot_path) if np is not None else None
\ No newline at end of file
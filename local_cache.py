@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import threading
+import time
+import json
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "malaysia4d", "drive_cache.sqlite3")
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+# 永久文件夹列表的有效期 (秒): 过期后重新列出, 往期文件夹事后补写或更正的文件也能看到
+DEFAULT_LISTING_TTL = 24 * 3600
+
+
+class LocalDriveCache:
+    """本地持久化的 Drive 内容缓存 (SQLite), 按文件 ID 和 md5/modifiedTime 校验, 超出容量按 LRU 淘汰
+
+    文件夹列表缓存 listing_ttl 秒后过期
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, listing_ttl=DEFAULT_LISTING_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.listing_ttl = listing_ttl
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                file_id TEXT PRIMARY KEY,
+                content BLOB NOT NULL,
+                version TEXT,
+                immutable INTEGER NOT NULL DEFAULT 0,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS listings (
+                folder_id TEXT PRIMARY KEY,
+                files TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                cached_at REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS files_last_access ON files (last_access);
+        """)
+        try:
+            # 旧版本的缓存没有列出时间, 已有的列表视为过期
+            self._conn.execute("ALTER TABLE listings ADD COLUMN cached_at REAL NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_file(self, file_id, version=None):
+        """读取缓存内容; 非永久内容需要版本 (md5Checksum/modifiedTime) 一致才算命中,
+        永久内容在已知版本 (最近列出过文件夹) 且版本不同时也不算命中 (例如事后更正的往期结果)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, version, immutable FROM files WHERE file_id = ?", (file_id,)).fetchone()
+            if row is None or ((not row[2] or version is not None) and row[1] != version):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE files SET last_access = ? WHERE file_id = ?", (time.time(), file_id))
+            self._conn.commit()
+            self.hits += 1
+            return row[0].decode('utf-8')
+
+    def put_file(self, file_id, content, version=None, immutable=False):
+        data = content.encode('utf-8')
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (file_id, content, version, immutable, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (file_id, data, version, int(immutable), len(data), time.time()))
+            self._evict()
+            self._conn.commit()
+
+    def get_listing(self, folder_id):
+        """读取永久文件夹的缓存列表 [(name, id)], 超过 listing_ttl 秒的列表不算命中"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT files, cached_at FROM listings WHERE folder_id = ?", (folder_id,)).fetchone()
+            if row is None or time.time() - row[1] > self.listing_ttl:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE listings SET last_access = ? WHERE folder_id = ?", (time.time(), folder_id))
+            self._conn.commit()
+            self.hits += 1
+            return [tuple(item) for item in json.loads(row[0])]
+
+    def put_listing(self, folder_id, files):
+        data = json.dumps(files, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO listings (folder_id, files, size, last_access, cached_at) VALUES (?, ?, ?, ?, ?)",
+                (folder_id, data, len(data), now, now))
+            self._evict()
+            self._conn.commit()
+
+    def invalidate_listing(self, folder_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM listings WHERE folder_id = ?", (folder_id,))
+            self._conn.commit()
+
+    def invalidate_file(self, file_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+            self._conn.commit()
+
+    def _total_bytes(self):
+        files_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+        listings_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM listings").fetchone()[0]
+        return files_size + listings_size
+
+    def _evict(self):
+        """超出容量时按最近访问时间淘汰最旧的文件内容或文件夹列表"""
+        total = self._total_bytes()
+        while total > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT 'files', file_id, size, last_access FROM files "
+                "UNION ALL SELECT 'listings', folder_id, size, last_access FROM listings "
+                "ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            table, key, size, _ = row
+            key_column = "file_id" if table == "files" else "folder_id"
+            self._conn.execute(f"DELETE FROM {table} WHERE {key_column} = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute("DELETE FROM listings")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "bytes": self._total_bytes(),
+                "files": self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0],
+                "listings": self._conn.execute("SELECT COUNT(*) FROM listings").fetchone()[0],
+            }
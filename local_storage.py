@@ -0,0 +1,124 @@
+import os
+import shutil
+import uuid
+from concurrent_loader import DEFAULT_MAX_WORKERS
+from storage_backend import StorageBackend
+
+DEFAULT_STORAGE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "malaysia4d", "storage")
+# 文件和文件夹 ID 为带前缀的相对路径, 与 Drive 的 ID 区分
+ID_PREFIX = "local:"
+TMP_SUFFIX = ".tmp"
+
+
+def local_id(path):
+    return ID_PREFIX + path
+
+
+def is_local_id(file_id):
+    return file_id.startswith(ID_PREFIX)
+
+
+class LocalStorageBackend(StorageBackend):
+    """本地文件系统存储: 文件夹路径直接对应 root 下的目录, 写入先写临时文件再原子替换"""
+
+    def __init__(self, root=DEFAULT_STORAGE_DIR, max_workers=DEFAULT_MAX_WORKERS):
+        super().__init__(max_workers)
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def normalize_path(folder_path):
+        parts = [part for part in folder_path.replace('\\', '/').split('/') if part and part != '.']
+        if '..' in parts:
+            raise ValueError(f"路径不能包含 '..': {folder_path}")
+        return '/'.join(parts)
+
+    def _abs(self, file_id):
+        path = file_id[len(ID_PREFIX):] if is_local_id(file_id) else file_id
+        return os.path.join(self.root, *path.split('/')) if path else self.root
+
+    def resolve_folder(self, folder_path, create=False):
+        path = self.normalize_path(folder_path)
+        abs_path = self._abs(path)
+        if create:
+            os.makedirs(abs_path, exist_ok=True)
+        elif not os.path.isdir(abs_path):
+            return None
+        return local_id(path)
+
+    def get_folder_id(self, folder_name, parent_id=None):
+        parent = parent_id[len(ID_PREFIX):] if parent_id else ""
+        path = f"{parent}/{folder_name}" if parent else folder_name
+        return local_id(path) if os.path.isdir(self._abs(path)) else None
+
+    def get_file_id(self, file_name, folder_id):
+        folder = folder_id[len(ID_PREFIX):]
+        path = f"{folder}/{file_name}" if folder else file_name
+        return local_id(path) if os.path.isfile(self._abs(path)) else None
+
+    def list_files(self, folder_path, immutable=False):
+        """列出文件夹中的文件和子文件夹, 按修改时间升序 (与 Drive 列表顺序一致)"""
+        path = self.normalize_path(folder_path)
+        try:
+            with os.scandir(self._abs(path)) as entries:
+                items = [(entry.stat().st_mtime_ns, entry.name) for entry in entries
+                         if not entry.name.endswith(TMP_SUFFIX)]
+        except FileNotFoundError:
+            return []
+        items.sort()
+        prefix = f"{path}/" if path else ""
+        return [(name, local_id(prefix + name)) for _, name in items]
+
+    def _write(self, abs_path, data):
+        """写入同目录下的临时文件后原子替换, 读者不会看到写了一半的文件"""
+        tmp_path = f"{abs_path}.{uuid.uuid4().hex}{TMP_SUFFIX}"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, abs_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _bytes(file_content):
+        return file_content.encode('utf-8') if isinstance(file_content, str) else file_content
+
+    def upload_file(self, file_name, file_content, folder_path):
+        """写入文件 (同名文件直接覆盖, 本地不会产生重复文件), 返回文件 ID"""
+        folder_id = self.ensure_folder(folder_path)
+        file_id = local_id(f"{folder_id[len(ID_PREFIX):]}/{file_name}".lstrip('/'))
+        self._write(self._abs(file_id), self._bytes(file_content))
+        return file_id
+
+    def update_file(self, file_id, file_content):
+        self._write(self._abs(file_id), self._bytes(file_content))
+        return file_id
+
+    def _same_content(self, file_id, data):
+        abs_path = self._abs(file_id)
+        try:
+            if os.path.getsize(abs_path) != len(data):
+                return False
+            return self._read(abs_path) == data
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _read(abs_path):
+        with open(abs_path, "rb") as f:
+            return f.read()
+
+    def download_by_id(self, file_id, immutable=False):
+        if not is_local_id(file_id):
+            raise FileNotFoundError(file_id)
+        return self._read(self._abs(file_id)).decode('utf-8')
+
+    def delete_folder(self, folder_path):
+        abs_path = self._abs(self.normalize_path(folder_path))
+        if not os.path.isdir(abs_path):
+            return False
+        shutil.rmtree(abs_path)
+        return True
\ No newline at end of file
@@ -1,15 +1,34 @@
 import json
-from bs4 import BeautifulSoup
+import threading
 import requests
+from collections import Counter
 from datetime import datetime
 import pytz
-import time
-import random
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from concurrent_loader import collect_errors, run_concurrently
+from results_parser import SoupParser, block_date, block_operator, block_results, default_parser
 
 MYT = pytz.timezone('Asia/Kuala_Lumpur')
 
+RESULTS_URL = "https://4dnow.net/"
+# 开奖结果在 Drive 上的存放位置: RESULTS_ROOT/<日期>/<运营商>.json
+RESULTS_ROOT = "lottery_result/4dnow.net/draw_date"
+USER_AGENT = "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1"
+# fetch_and_save_data 在页面未变化 (HTTP 304) 时返回此标记
+NOT_MODIFIED = object()
+
+
+def create_session():
+    """创建带连接池和重试的会话, 整个进程复用"""
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(max_retries=retries, pool_connections=4, pool_maxsize=8)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
 class LotteryDataManager:
     def __init__(self, drive_client):
         self.drive_client = drive_client
@@ -21,6 +40,15 @@ class LotteryDataManager:
         self.excluded_operators = [
             "9 lotto 6d", "9 lotto 6+1d", "9 lotto super jackpot pool"
         ]
+        self.url = RESULTS_URL
+        self.session = create_session()
+        self.parser = default_parser()
+        # 上次响应的 ETag / Last-Modified, 用于条件请求
+        self._validators = {}
+        # 运营商区块 HTML 哈希 -> (运营商, 结果), 内容未变的区块不再解析和上传
+        self._blocks = {}
+        self._lock = threading.Lock()
+        self.fetch_stats = Counter()
 
     def normalize_operator_name(self, name):
         name = name.lower().strip()
@@ -30,137 +58,167 @@ class LotteryDataManager:
         return name
 
     def fetch_and_save_data(self):
-        """从 4dnow.net 抓取数据"""
-        url = "https://4dnow.net/"
+        """从 4dnow.net 抓取数据 (条件请求), 页面未变化时返回 NOT_MODIFIED, 失败返回 None"""
         try:
             print("正在抓取数据...")
-            headers = {
-                "User-Agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1"
-            }
-            session = requests.Session()
-            retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
-            session.mount('https://', HTTPAdapter(max_retries=retries))
-            time.sleep(random.uniform(1, 3))  # 随机延迟
-            response = session.get(url, headers=headers, timeout=10)
+            headers = {}
+            if self._validators.get("etag"):
+                headers["If-None-Match"] = self._validators["etag"]
+            if self._validators.get("last_modified"):
+                headers["If-Modified-Since"] = self._validators["last_modified"]
+            response = self.session.get(self.url, headers=headers, timeout=10)
+            self.fetch_stats["requests"] += 1
+            if response.status_code == 304:
+                self.fetch_stats["not_modified"] += 1
+                print("页面未变化, 跳过解析")
+                return NOT_MODIFIED
             response.raise_for_status()
+            self.fetch_stats["bytes"] += len(response.content)
+            self._validators = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified")
+            }
             return response.text
         except Exception as e:
             print(f"抓取数据失败: {str(e)}")
             return None
 
+    def refresh(self):
+        """抓取并解析最新结果, 页面未变化时沿用当前结果; 返回是否成功"""
+        with self._lock:
+            html_content = self.fetch_and_save_data()
+            if html_content is None:
+                return False
+            if html_content is NOT_MODIFIED:
+                if self.all_results:
+                    return True
+                # 进程内还没有结果 (例如上次解析失败), 重新完整抓取
+                self._validators = {}
+                html_content = self.fetch_and_save_data()
+                if html_content is None or html_content is NOT_MODIFIED:
+                    return False
+            if not self.parse_data(html_content):
+                # 解析失败时下次不能再收到 304
+                self._validators = {}
+                return False
+            return True
+
+    def parse_block(self, box, parser=None):
+        """解析单个运营商区块, 返回 (规范化运营商名, 结果数据), 不需要的运营商或没有结果时结果数据为 None"""
+        parser = parser or self.parser
+        normalized_name = self.normalize_operator_name(block_operator(parser, box))
+        if normalized_name in self.excluded_operators or normalized_name not in self.allowed_operators:
+            return normalized_name, None
+        draw_date = block_date(parser, box) or "N/A"
+        if draw_date != "N/A":
+            try:
+                parsed_date = datetime.strptime(draw_date, "%d/%m/%y").replace(tzinfo=MYT)
+                draw_date = parsed_date.strftime("%Y-%m-%d")
+            except ValueError:
+                try:
+                    parsed_date = datetime.strptime(draw_date, "%d/%m/%y %I:%M%p").replace(tzinfo=MYT)
+                    draw_date = parsed_date.strftime("%Y-%m-%d")
+                except ValueError:
+                    print(f"日期格式不标准: {draw_date}")
+                    draw_date = datetime.now(MYT).strftime("%Y-%m-%d")
+        date_yyyymmdd = datetime.strptime(draw_date, "%Y-%m-%d").strftime("%Y%m%d")
+        results = block_results(parser, box, skip_unknown=normalized_name == "sports toto 4d")
+        if not results:
+            return normalized_name, None
+        return normalized_name, {
+            "date": draw_date,
+            "date_yyyymmdd": date_yyyymmdd,
+            "results": results
+        }
+
+    def parse_page(self, html_content, parser=None):
+        """解析整个页面 (不使用区块缓存, 也不写 Drive), 返回 {运营商: 结果数据}"""
+        parser = parser or self.parser
+        results = {}
+        for box in parser.boxes(html_content):
+            normalized_name, result_data = self.parse_block(box, parser)
+            if result_data is not None:
+                results[normalized_name] = result_data
+        return results
+
+    def save_result(self, normalized_name, result_data):
+        """写入 RESULTS_ROOT/<开奖日期>/<运营商>.json, 内容未变时不写入, 返回是否写入"""
+        _, written = self.drive_client.upsert_file(
+            f"{normalized_name}.json", json.dumps(result_data, ensure_ascii=False, indent=4),
+            f"{RESULTS_ROOT}/{result_data['date']}")
+        return written
+
     def parse_data(self, html_content):
         """解析抓取的 HTML 并存储到 Google Drive"""
-        self.all_results.clear()
+        # 换成新字典而不是原地清空, 其他会话仍持有的旧结果不受影响
+        self.all_results = all_results = {}
         try:
             print("\n开始分析数据...")
             if not html_content:
                 raise ValueError("HTML 内容为空")
-            soup = BeautifulSoup(html_content, 'html.parser')
-            lottery_boxes = soup.find_all('div', class_=['lottery-box', 'result-box'])
+            parser = self.parser
+            try:
+                lottery_boxes = parser.boxes(html_content)
+            except Exception as e:
+                print(f"{parser.name} 解析失败, 改用 BeautifulSoup: {e}")
+                parser = SoupParser()
+                lottery_boxes = parser.boxes(html_content)
+            # 只保留当前页面出现的区块, 旧开奖的哈希自然淘汰
+            blocks = {}
             for box in lottery_boxes:
-                operator_name = "Unknown Operator"
-                operator_info = box.find('div', class_=['info', 'text-info', 'operator-info'])
-                if operator_info:
-                    operator_b = operator_info.find('b')
-                    operator_span = operator_info.find('span')
-                    if operator_b and operator_b.text.strip():
-                        operator_name = operator_b.text.strip()
-                    elif operator_span and operator_span.text.strip():
-                        operator_name = operator_span.text.strip()
-                normalized_name = self.normalize_operator_name(operator_name)
-                if normalized_name in self.excluded_operators or normalized_name not in self.allowed_operators:
+                block_hash = parser.block_hash(box)
+                cached = self._blocks.get(block_hash)
+                if cached is not None:
+                    self.fetch_stats["blocks_unchanged"] += 1
+                    blocks[block_hash] = cached
+                    if cached[1] is not None:
+                        all_results[cached[0]] = cached[1]
                     continue
-                draw_date = "N/A"
-                date_elem = box.find('div', class_=['date', 'draw-date']) or box.find('span', class_=['date', 'draw-date'])
-                if date_elem and date_elem.text.strip():
-                    draw_date = date_elem.text.strip()
-                    try:
-                        parsed_date = datetime.strptime(draw_date, "%d/%m/%y").replace(tzinfo=MYT)
-                        draw_date = parsed_date.strftime("%Y-%m-%d")
-                    except ValueError:
-                        try:
-                            parsed_date = datetime.strptime(draw_date, "%d/%m/%y %I:%M%p").replace(tzinfo=MYT)
-                            draw_date = parsed_date.strftime("%Y-%m-%d")
-                        except ValueError:
-                            print(f"日期格式不标准: {draw_date}")
-                            draw_date = datetime.now(MYT).strftime("%Y-%m-%d")
-                date_yyyymmdd = datetime.strptime(draw_date, "%Y-%m-%d").strftime("%Y%m%d")
-                results = {}
-                main_row = box.find('div', class_=['main', 'el-row'])
-                if main_row:
-                    prize_cols = main_row.find_all('div', class_=['el-col', 'el-col-8', 'el-col-12'])
-                    for col in prize_cols:
-                        prize_span = col.find('span', class_=['prize', 'prize-type'])
-                        if prize_span:
-                            prize_type_elem = prize_span.find('span', class_=['first', 'second', 'third'])
-                            prize_type = (prize_type_elem.text.strip() + " Prize") if prize_type_elem else prize_span.text.strip()
-                            number_elem = col.find('b', class_=['number']) or col.find('span', class_=['number'])
-                            number = number_elem.text.strip() if number_elem else "N/A"
-                            if "1st" in prize_type.lower() or prize_type == "1 Prize":
-                                prize_type = "首奖"
-                            elif "2nd" in prize_type.lower() or prize_type == "2 Prize":
-                                prize_type = "二奖"
-                            elif "3rd" in prize_type.lower() or prize_type == "3 Prize":
-                                prize_type = "三奖"
-                            results[prize_type] = number
-                sub_rows = box.find_all('div', class_=['sub-result', 'el-row'])
-                for sub_row in sub_rows:
-                    result_info = sub_row.find('div', class_=['result-info', 'el-col-24'])
-                    if result_info:
-                        prize_type_elem = result_info.find('span', class_=['text-info', 'prize-type'])
-                        prize_type = prize_type_elem.text.strip() if prize_type_elem else "Unknown Prize"
-                        if normalized_name == "sports toto 4d" and prize_type == "Unknown Prize":
-                            continue
-                        if "Special" in prize_type:
-                            prize_type = "特别奖"
-                        elif "Consolation" in prize_type:
-                            prize_type = "安慰奖"
-                        numbers = []
-                        number_elems = sub_row.find_all('b', class_=['number']) or sub_row.find_all('span', class_=['number'])
-                        for num_elem in number_elems:
-                            num_text = num_elem.text.strip()
-                            if num_text and num_text != '-':
-                                numbers.append(num_text)
-                        if numbers:
-                            results[prize_type] = numbers
-                results = {k: v for k, v in results.items() if "Jackpot" not in k}
-                if results:
-                    base_path = f"lottery_result/4dnow.net/draw_date/{draw_date}"
-                    filename = f"{normalized_name}.json"
-                    result_data = {
-                        "date": draw_date,
-                        "date_yyyymmdd": date_yyyymmdd,
-                        "results": results
-                    }
-                    self.drive_client.upload_file(filename, json.dumps(result_data, ensure_ascii=False, indent=4), base_path)
-                    self.all_results[normalized_name] = result_data
+                self.fetch_stats["blocks_parsed"] += 1
+                normalized_name, result_data = self.parse_block(box, parser)
+                if result_data is not None:
+                    written = self.save_result(normalized_name, result_data)
+                    self.fetch_stats["uploads" if written else "unchanged_files"] += 1
+                    all_results[normalized_name] = result_data
+                blocks[block_hash] = (normalized_name, result_data)
+            self._blocks = blocks
             return True
         except Exception as e:
             print(f"解析数据错误: {str(e)}")
             return False
 
-    def load_results_by_date(self, date_str):
-        """加载指定日期的结果"""
+    def load_results_by_date(self, date_str, errors=None):
+        """加载指定日期的结果, 下载失败项追加到 errors (若提供)"""
         results = {}
         date_yyyymmdd = datetime.strptime(date_str, "%Y-%m-%d").strftime("%Y%m%d")
-        base_path = f"lottery_result/4dnow.net/draw_date/{date_str}"
+        base_path = f"{RESULTS_ROOT}/{date_str}"
+        # 往期开奖结果不会再改变, 可以长期保存在本地缓存
+        immutable = date_str < datetime.now(MYT).strftime("%Y-%m-%d")
         try:
-            files = self.drive_client.list_files(base_path)
-            for filename, _ in files:
-                if filename.endswith(".json"):
-                    operator = filename.replace(".json", "")
-                    content = self.drive_client.download_file(filename, base_path)
-                    if content:
-                        data = json.loads(content)
-                        if data.get("date_yyyymmdd") == date_yyyymmdd:
-                            results[operator] = data
-                        else:
-                            print(f"存档日期不匹配: 存档 {data.get('date_yyyymmdd')} != 目标 {date_yyyymmdd}")
+            files = self.drive_client.list_files(base_path, immutable=immutable)
+            # 旧版本每次刷新都会新建同名文件, 同名只下载一次 (ID 缓存中是最新的一个)
+            filenames = list(dict.fromkeys(filename for filename, _ in files if filename.endswith(".json")))
+            results_list = self.drive_client.download_files(filenames, base_path, immutable=immutable)
+            for item in collect_errors(results_list, errors, "下载存档失败"):
+                operator = item.key.replace(".json", "")
+                if item.result:
+                    data = json.loads(item.result)
+                    if data.get("date_yyyymmdd") == date_yyyymmdd:
+                        results[operator] = data
+                    else:
+                        print(f"存档日期不匹配: 存档 {data.get('date_yyyymmdd')} != 目标 {date_yyyymmdd}")
         except Exception as e:
             print(f"加载 Google Drive 存档失败: {e}")
         print(f"加载存档完成: {results.keys()}")
         return results
 
+    def load_results_for_dates(self, date_strs, errors=None):
+        """并发加载多个日期的结果, 每个日期只加载一次, 返回 {日期: 结果}"""
+        results = run_concurrently(sorted(set(date_strs)),
+                                   lambda date_str: self.load_results_by_date(date_str, errors),
+                                   self.drive_client.max_workers)
+        return {item.key: item.result for item in collect_errors(results, errors, "加载开奖结果失败")}
+
     def get_results(self):
         """获取当前缓存的结果"""
         return self.all_results
\ No newline at end of file
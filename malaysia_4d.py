@@ -1,15 +1,21 @@
 import re
-import itertools
 from datetime import datetime
 import pytz
 import random
 import string
+from bet_parser import BetBatch
+from receipt_ledger import decode_bets, encode_bets
+from receipt_manifest import OP_CODE_MAP
 
 MYT = pytz.timezone('Asia/Kuala_Lumpur')
 
 class Malaysia4D:
-    def __init__(self, storage_manager):
+    def __init__(self, storage_manager, spool=None, liability=None):
         self.storage_manager = storage_manager
+        # 有写后队列时收条先写入本地日志, 由后台线程上传到 Drive
+        self.spool = spool
+        # 赔付风险索引 (可选), 购票时增量累加
+        self.liability = liability
         self.ticket_count = 0
         self.latest_receipt = ""
 
@@ -69,13 +75,15 @@ class Malaysia4D:
         except ValueError as e:
             return False, f"格式错误: 请输入有效的数字 (例如: 2277#1) (投注: {bet}, 错误: {str(e)})", None, None, None, None, None, None
 
-    def calculate_box_combinations(self, number):
-        """计算 Box 投注的组合数"""
-        digits = list(number)
-        return len(set(''.join(sorted(p)) for p in itertools.permutations(digits)))
+    def _add_liability(self, details):
+        """收条已记录后才累加赔付风险, 保存失败的投注不计入"""
+        if self.liability is not None:
+            self.liability.add_bets(decode_bets(details["bets"]))
 
     def buy_lottery(self, bets_with_operators, ui):
-        """处理购票逻辑"""
+        """处理购票逻辑, bets_with_operators 可以是 [(运营商, 投注)] 或 bet_parser 的 BetBatch"""
+        if isinstance(bets_with_operators, BetBatch):
+            bets_with_operators = list(bets_with_operators.iter_groups())
         receipt_lines = []
         total_bet = 0.0
         op_code_map = {
@@ -114,8 +122,25 @@ class Malaysia4D:
         receipt_lines.append(f"P: {total_bet:.2f}")
         receipt_lines.append(f"T: {datetime.now(MYT).strftime('%Y-%m-%d %H:%M:%S')}")
         self.latest_receipt = "\n".join(receipt_lines)
+        operators = []
+        for ops, _ in bets_with_operators:
+            for op in ops:
+                name = OP_CODE_MAP[op_code_map[op]]
+                if name not in operators:
+                    operators.append(name)
+        # 结构化投注写入当日清单, 结算时无需再解析收条文本
+        bet_groups = [(''.join(op_code_map[op] for op in ops), bets) for ops, bets in bets_with_operators]
+        details = {"ticket_id": ticket_id, "total": round(total_bet, 2), "operators": operators,
+                   "bets": encode_bets(bet_groups)}
         try:
-            self.storage_manager.save_receipt(self.latest_receipt, self.ticket_count)
+            if self.spool is not None:
+                self.spool.submit(self.latest_receipt, self.ticket_count, details)
+                self._add_liability(details)
+                if ui:
+                    ui.success("购票成功！收条已记录, 正在后台上传。")
+                return
+            self.storage_manager.save_receipt(self.latest_receipt, self.ticket_count, details)
+            self._add_liability(details)
             if ui:
                 ui.success("购票成功！收条已保存。")
         except Exception as e:
@@ -0,0 +1,282 @@
+import argparse
+import functools
+import http.server
+import os
+import tempfile
+import time
+from datetime import datetime
+from unittest import mock
+import benchmarks
+from backfill import DEFAULT_BASE_URL, DEFAULT_CHECKPOINT_PATH, DEFAULT_URL_TEMPLATE, Backfill
+from drive_cache import DriveIdCache
+from google_drive_client import GoogleDriveClient
+from local_cache import LocalDriveCache
+from malaysia_4d import Malaysia4D
+from lottery_data_manager import RESULTS_ROOT, LotteryDataManager
+from resources import AppResources
+from results_parser import LxmlParser, SoupParser
+from retention import RetentionSweeper
+from settlement import check_parity, parse_receipt
+from storage_manager import StorageManager
+from winning_index import build_indexes
+
+
+def rebuild_manifest(args):
+    """按实际文件夹重建收条清单"""
+    storage_manager = StorageManager(GoogleDriveClient.from_env())
+    rebuilt = storage_manager.rebuild_manifests(args.date)
+    print(f"共重建 {len(rebuilt)} 天, {sum(rebuilt.values())} 张收条")
+
+
+def bench_cache(args):
+    """冷/热缓存对比: 重复加载同一日期的开奖结果和收条, 统计 Drive API 调用次数和耗时"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        drive_client = GoogleDriveClient.from_env()
+        drive_client.cache = DriveIdCache()
+        drive_client.local_cache = LocalDriveCache(os.path.join(tmp_dir, "bench.sqlite3"))
+        storage_manager = StorageManager(drive_client)
+        data_manager = LotteryDataManager(drive_client)
+        passes = [("冷缓存", None), ("热缓存", None), ("重启后 (仅本地缓存)", drive_client.cache.clear)]
+        for label, before in passes:
+            if before:
+                before()
+            calls_before = drive_client.api_call_count()
+            start = time.perf_counter()
+            results = data_manager.load_results_by_date(args.date)
+            receipts = storage_manager.load_receipts(args.date)
+            elapsed = time.perf_counter() - start
+            calls = drive_client.api_call_count() - calls_before
+            print(f"{label}: {len(results)} 个开奖结果, {len(receipts)} 张收条, "
+                  f"API 调用 {calls} 次, 耗时 {elapsed * 1000:.0f} ms")
+        print(f"ID 缓存: {drive_client.cache_stats()}")
+        print(f"本地缓存: {drive_client.local_cache.stats()}")
+
+
+def check_settlement(args):
+    """用指定日期的真实收条核对向量化结算与逐注结算是否一致"""
+    drive_client = GoogleDriveClient.from_env()
+    draw_indexes = build_indexes(LotteryDataManager(drive_client).load_results_by_date(args.date))
+    receipts = [(filename, parse_receipt(receipt)[1])
+                for filename, receipt in StorageManager(drive_client).load_receipts(args.date)]
+    mismatches = check_parity(receipts, draw_indexes)
+    if mismatches:
+        print(f"结算不一致: {mismatches}")
+    else:
+        print(f"结算一致: {len(receipts)} 张收条, {sum(len(bets) for _, bets in receipts)} 注")
+
+
+def sweep_retention(args):
+    """立即执行一次过期收条清理 (首次全量, 之后增量)"""
+    sweeper = RetentionSweeper(StorageManager(GoogleDriveClient.from_env()), retention_days=args.days)
+    sweeper.sweep_once()
+    print(f"清理结果: {sweeper.stats()}")
+
+
+def compact_results(args):
+    """删除开奖结果文件夹中历次刷新留下的同名重复文件, 每个运营商只保留最新的一份"""
+    drive_client = GoogleDriveClient.from_env()
+    dates = sorted(name for name, _ in drive_client.list_files(RESULTS_ROOT)
+                   if (not args.start or name >= args.start) and (not args.end or name <= args.end))
+    deleted = 0
+    failed = 0
+    for item in drive_client.compact_duplicates([f"{RESULTS_ROOT}/{date_str}" for date_str in dates]):
+        folder_path, file_name, _ = item.key
+        if item.error is not None:
+            failed += 1
+            print(f"清理失败: {folder_path}/{file_name or ''}: {item.error}")
+        else:
+            deleted += 1
+            print(f"已删除重复文件: {folder_path}/{file_name}")
+    print(f"共检查 {len(dates)} 个日期, 删除 {deleted} 个重复文件, 失败 {failed} 个, "
+          f"API 调用 {drive_client.api_call_count()} 次")
+
+
+def backfill_results(args):
+    """回填日期范围内的往期开奖结果, 已完成的日期按检查点跳过"""
+    data_manager = LotteryDataManager(GoogleDriveClient.from_env())
+    backfill = Backfill(data_manager, base_url=args.base_url, url_template=args.url_template,
+                        checkpoint_path=args.checkpoint, max_workers=args.workers, rate=args.rate)
+    start = time.perf_counter()
+    errors = []
+    backfill.run(datetime.strptime(args.start, "%Y-%m-%d").date(),
+                 datetime.strptime(args.end, "%Y-%m-%d").date(), errors)
+    print(f"回填完成: {dict(backfill.stats)}, 耗时 {time.perf_counter() - start:.1f} s")
+    if errors:
+        print(f"失败日期: {', '.join(date_str for date_str, _ in errors)} (重新运行即可重试)")
+
+
+class RecordedPageHandler(http.server.SimpleHTTPRequestHandler):
+    """本地替身站点: /past-results/<日期> 返回 <目录>/<日期>.html"""
+
+    def translate_path(self, path):
+        name = path.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1]
+        return os.path.join(self.directory, f"{name}.html")
+
+
+def serve_recorded(args):
+    """启动本地 HTTP 替身, 离线测试回填 (--base-url http://127.0.0.1:<端口>/)"""
+    handler = functools.partial(RecordedPageHandler, directory=args.dir)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", args.port), handler)
+    print(f"正在提供 {args.dir} 中的页面: http://127.0.0.1:{args.port}/")
+    server.serve_forever()
+
+
+def bench_html_parser(args):
+    """对比 lxml 与 BeautifulSoup 解析同一页面的结果和耗时"""
+    with open(args.html, encoding='utf-8') as f:
+        html_content = f.read()
+    data_manager = LotteryDataManager(None)
+    outputs = {}
+    timings = {}
+    for parser in (SoupParser(), LxmlParser()):
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            output = [data_manager.parse_block(box, parser) for box in parser.boxes(html_content)]
+        timings[parser.name] = (time.perf_counter() - start) / args.runs
+        outputs[parser.name] = output
+        print(f"{parser.name}: 每页 {timings[parser.name] * 1000:.2f} ms, "
+              f"{sum(1 for _, data in output if data)} 个运营商结果")
+    if outputs["bs4"] != outputs["lxml"]:
+        print("解析结果不一致!")
+        for soup_item, lxml_item in zip(outputs["bs4"], outputs["lxml"]):
+            if soup_item != lxml_item:
+                print(f"  bs4: {soup_item}\n  lxml: {lxml_item}")
+    else:
+        print(f"解析结果一致, 加速 {timings['bs4'] / timings['lxml']:.1f} 倍")
+
+
+def _rerun(resources):
+    """app.py 每次脚本重跑时对共享资源做的工作: 新会话的 Malaysia4D 和侧边栏的统计"""
+    Malaysia4D(resources.storage_manager, resources.spool, resources.liability)
+    resources.sweeper.stats()
+    resources.spool.stats()
+    if resources.liability is not None:
+        resources.liability.stats()
+        resources.liability.top_numbers(10)
+
+
+def bench_startup(args):
+    """对比每次重跑都新建资源 (旧做法) 与复用进程级共享资源的重跑耗时和 API 调用次数
+
+    收条日志、投注存储、赔付快照和本地缓存都放在临时目录, 不会重放或改写正在使用的收条日志
+    """
+    # 环境变量只在基准期间指向临时目录, 结束后恢复
+    with tempfile.TemporaryDirectory() as tmp_dir, mock.patch.dict(os.environ, {
+        'PURCHASE_SPOOL_PATH': os.path.join(tmp_dir, "spool.jsonl"),
+        'BET_STORE_DIR': os.path.join(tmp_dir, "bet_store"),
+        'LIABILITY_SNAPSHOT_PATH': os.path.join(tmp_dir, "liability.npz"),
+        'LOCAL_STORAGE_DIR': os.path.join(tmp_dir, "storage"),
+        'LOCAL_CACHE_PATH': os.path.join(tmp_dir, "cache.sqlite3"),
+    }):
+        timings = []
+        calls = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            resources = AppResources()
+            _rerun(resources)
+            timings.append(time.perf_counter() - start)
+            calls.append(resources.drive_client.api_call_count())
+            resources.close()
+        print(f"每次新建: 平均 {sum(timings) / len(timings) * 1000:.1f} ms, 平均 API 调用 {sum(calls) / len(calls):.1f} 次")
+        shared = AppResources()
+        calls_before = shared.drive_client.api_call_count()
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            _rerun(shared)
+        elapsed = time.perf_counter() - start
+        calls = shared.drive_client.api_call_count() - calls_before
+        shared.close()
+        print(f"复用共享资源: 平均 {elapsed / args.runs * 1000:.3f} ms, 平均 API 调用 {calls / args.runs:.1f} 次")
+
+
+def run_benchmarks(args):
+    """离线基准测试 (内存 Drive 替身 + 合成数据), 结果写入 JSON, 可与上次结果比较"""
+    report = benchmarks.run_benchmarks(latency=args.latency / 1000, repeat=args.repeat, seed=args.seed,
+                                       days=args.days, tickets_per_day=args.tickets, backend=args.backend)
+    for name, result in report["results"].items():
+        print(f"{name}: 中位 {result['median_seconds'] * 1000:.1f} ms (最快 {result['min_seconds'] * 1000:.1f} ms), "
+              f"API 调用 {result['api_calls']} 次")
+    if args.output:
+        benchmarks.save_results(report, args.output)
+        print(f"结果已写入 {args.output}")
+    if args.baseline:
+        regressions = benchmarks.compare(benchmarks.load_results(args.baseline), report, args.threshold)
+        for name, old, new in regressions:
+            print(f"退步: {name}: {old['median_seconds'] * 1000:.1f} ms -> {new['median_seconds'] * 1000:.1f} ms, "
+                  f"API 调用 {old['api_calls']} -> {new['api_calls']}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"与 {args.baseline} 相比没有退步")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="马来西亚 4D 彩票应用维护工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rebuild_parser = subparsers.add_parser("rebuild-manifest", help="按实际文件夹重建收条清单")
+    rebuild_parser.add_argument("--date", help="只重建指定日期 (YYYY-MM-DD), 默认全部")
+    rebuild_parser.set_defaults(func=rebuild_manifest)
+
+    bench_parser = subparsers.add_parser("bench-cache", help="对比冷/热缓存下的 Drive API 调用次数")
+    bench_parser.add_argument("--date", required=True, help="加载的日期 (YYYY-MM-DD)")
+    bench_parser.set_defaults(func=bench_cache)
+
+    check_parser = subparsers.add_parser("check-settlement", help="核对向量化结算与逐注结算")
+    check_parser.add_argument("--date", required=True, help="核对的日期 (YYYY-MM-DD)")
+    check_parser.set_defaults(func=check_settlement)
+
+    sweep_parser = subparsers.add_parser("sweep-retention", help="立即清理过期收条")
+    sweep_parser.add_argument("--days", type=int, default=30, help="收条保留天数")
+    sweep_parser.set_defaults(func=sweep_retention)
+
+    compact_parser = subparsers.add_parser("compact-results", help="删除开奖结果中的同名重复文件")
+    compact_parser.add_argument("--start", help="起始日期 (YYYY-MM-DD), 默认不限")
+    compact_parser.add_argument("--end", help="结束日期 (YYYY-MM-DD), 默认不限")
+    compact_parser.set_defaults(func=compact_results)
+
+    backfill_parser = subparsers.add_parser("backfill", help="回填往期开奖结果")
+    backfill_parser.add_argument("--start", required=True, help="起始日期 (YYYY-MM-DD)")
+    backfill_parser.add_argument("--end", required=True, help="结束日期 (YYYY-MM-DD)")
+    backfill_parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="站点地址, 离线测试时指向本地替身")
+    backfill_parser.add_argument("--url-template", default=DEFAULT_URL_TEMPLATE, help="往期页面地址模板")
+    backfill_parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH, help="检查点文件")
+    backfill_parser.add_argument("--workers", type=int, default=4, help="并发线程数")
+    backfill_parser.add_argument("--rate", type=float, default=1.0, help="每秒最多请求数")
+    backfill_parser.set_defaults(func=backfill_results)
+
+    serve_parser = subparsers.add_parser("serve-recorded", help="启动本地替身站点, 提供录制的往期页面")
+    serve_parser.add_argument("--dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "recorded"),
+                              help="录制页面目录 (<日期>.html)")
+    serve_parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    serve_parser.set_defaults(func=serve_recorded)
+
+    parser_bench = subparsers.add_parser("bench-parser", help="对比 lxml 与 BeautifulSoup 解析开奖页面")
+    parser_bench.add_argument("--html", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "4dnow_results.html"),
+                              help="保存的开奖页面 HTML")
+    parser_bench.add_argument("--runs", type=int, default=20, help="每种解析器重复次数")
+    parser_bench.set_defaults(func=bench_html_parser)
+
+    startup_parser = subparsers.add_parser("bench-startup", help="对比新建与复用共享资源的重跑开销")
+    startup_parser.add_argument("--runs", type=int, default=3, help="新建资源的次数")
+    startup_parser.set_defaults(func=bench_startup)
+
+    run_bench = subparsers.add_parser("bench", help="离线基准测试 (不需要 Drive 凭证)")
+    run_bench.add_argument("--latency", type=float, default=benchmarks.DEFAULT_LATENCY * 1000,
+                           help="每次模拟 API 调用的延迟 (毫秒)")
+    run_bench.add_argument("--repeat", type=int, default=benchmarks.DEFAULT_REPEAT, help="每项重复次数")
+    run_bench.add_argument("--backend", choices=benchmarks.BACKENDS, default="fake",
+                           help="存储后端: fake (内存 Drive), local (本地文件系统), tiered (本地 + 异步同步)")
+    run_bench.add_argument("--seed", type=int, default=0, help="合成数据的随机种子")
+    run_bench.add_argument("--days", type=int, default=7, help="合成收条的天数")
+    run_bench.add_argument("--tickets", type=int, default=20, help="每天的收条数")
+    run_bench.add_argument("--output", help="结果 JSON 文件")
+    run_bench.add_argument("--baseline", help="比较的基线结果 JSON, 有退步时以状态 1 退出")
+    run_bench.add_argument("--threshold", type=float, default=benchmarks.DEFAULT_THRESHOLD, help="耗时退步阈值 (比例)")
+    run_bench.set_defaults(func=run_benchmarks)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
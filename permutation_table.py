@@ -0,0 +1,16 @@
+from array import array
+
+# 预先计算全部 10000 个号码的规范键 (各位数字排序后的号码), 对奖时不再做排列组合
+CANONICAL_KEYS = array('H', [int(''.join(sorted(f"{number:04d}"))) for number in range(10000)])
+
+# 规范键 -> 该组数字的所有不同排列 (升序整数)
+PERMUTATIONS = {}
+for _number, _key in enumerate(CANONICAL_KEYS):
+    PERMUTATIONS.setdefault(_key, []).append(_number)
+PERMUTATIONS = {key: tuple(numbers) for key, numbers in PERMUTATIONS.items()}
+del _number, _key
+
+
+def permutations(number):
+    """号码的所有不同排列 (整数)"""
+    return PERMUTATIONS[CANONICAL_KEYS[int(number)]]
@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+import pytz
+
+MYT = pytz.timezone('Asia/Kuala_Lumpur')
+
+DEFAULT_SPOOL_PATH = os.path.join(os.path.expanduser("~"), ".cache", "malaysia4d", "purchase_spool.jsonl")
+# 上传失败后的重试间隔 (秒), 每次失败翻倍, 不超过上限
+RETRY_BASE_SECONDS = 2.0
+RETRY_MAX_SECONDS = 300.0
+
+
+class PurchaseSpool:
+    """购票收条先写入本地追加日志, 再由后台线程上传到 Google Drive (失败时退避重试)
+
+    日志每行一条记录: {"op": "queued", ...} 为待上传的收条, {"op": "sent", "id": ...} 为已上传;
+    进程重启时重放日志, 没有 sent 记录的收条重新排队
+    """
+
+    def __init__(self, storage_manager, path=DEFAULT_SPOOL_PATH):
+        self.storage_manager = storage_manager
+        self.path = path
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stop = False
+        self._thread = None
+        self._pending = OrderedDict()
+        self.uploaded = 0
+        self.failures = 0
+        self.replayed = 0
+        self.retry_at = None
+        self.last_error = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._replay()
+
+    def _replay(self):
+        """读取日志中未上传的收条, 并把日志压缩为只含这些收条"""
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # 写入中断留下的不完整行
+                    if record.get("op") == "queued":
+                        record["attempts"] = 1  # 上次可能已上传一半, 重放时按文件名覆盖写入
+                        self._pending[record["id"]] = record
+                    elif record.get("op") == "sent":
+                        self._pending.pop(record.get("id"), None)
+        self.replayed = len(self._pending)
+        self._rewrite()
+
+    def _rewrite(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            for record in self._pending.values():
+                f.write(json.dumps(self._journal_record(record), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _journal_record(record):
+        return dict((key, value) for key, value in record.items() if key != "attempts")
+
+    def _append(self, record):
+        with open(self.path, "a", encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def submit(self, receipt, ticket_count, details=None, now=None):
+        """收条写入本地日志后立即返回, 上传在后台进行; 返回收条在 Drive 中的路径"""
+        now = now or datetime.now(MYT)
+        # 收条唯一 ID 在排队时确定, 重试和重放都写入同一个文件
+        receipt_id = self.storage_manager.new_receipt_id(details)
+        record = {"op": "queued", "id": uuid.uuid4().hex, "receipt_id": receipt_id, "receipt": receipt,
+                  "ticket_count": ticket_count, "details": details or {},
+                  "queued_at": now.strftime("%Y-%m-%d %H:%M:%S")}
+        with self._lock:
+            self._append(record)
+            record["attempts"] = 0
+            self._pending[record["id"]] = record
+            self._wakeup.notify()
+        return self.storage_manager.receipt_path(now, ticket_count, receipt_id)
+
+    def _queued_time(self, record):
+        return MYT.localize(datetime.strptime(record["queued_at"], "%Y-%m-%d %H:%M:%S"))
+
+    def upload_next(self):
+        """上传最早的一条待上传收条, 队列为空时返回 None, 否则返回是否成功"""
+        with self._lock:
+            if not self._pending:
+                return None
+            record = next(iter(self._pending.values()))
+        try:
+            # 重试时收条可能已经上传过, 按收条唯一 ID 覆盖写入, 不产生重复文件
+            self.storage_manager.save_receipt(record["receipt"], record["ticket_count"], record["details"],
+                                              now=self._queued_time(record), overwrite=record["attempts"] > 0,
+                                              receipt_id=record.get("receipt_id") or record["id"])
+        except Exception as e:
+            with self._lock:
+                record["attempts"] += 1
+                self.failures += 1
+                self.last_error = str(e)
+            print(f"后台上传收条失败 (第 {record['attempts']} 次): {e}")
+            return False
+        with self._lock:
+            self._append({"op": "sent", "id": record["id"]})
+            self._pending.pop(record["id"], None)
+            self.uploaded += 1
+            self.last_error = None
+            if not self._pending:
+                self._rewrite()  # 队列清空时截断日志
+        return True
+
+    def _run(self):
+        delay = RETRY_BASE_SECONDS
+        while True:
+            with self._lock:
+                while not self._pending and not self._stop:
+                    self._wakeup.wait()
+                if self._stop:
+                    return
+            uploaded = self.upload_next()
+            if uploaded is False:
+                with self._lock:
+                    self.retry_at = time.time() + delay
+                    self._wakeup.wait(delay)
+                    self.retry_at = None
+                    if self._stop:
+                        return
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+            else:
+                delay = RETRY_BASE_SECONDS
+
+    def start(self):
+        """启动后台上传线程 (守护线程, 重复调用无效)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="purchase-spool", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """停止后台线程, 正在进行的上传完成后退出; 未上传的收条保留在日志中"""
+        with self._lock:
+            self._stop = True
+            self._wakeup.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def flush(self, timeout=30.0):
+        """等待队列清空 (用于测试和命令行工具), 返回是否已清空"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._thread is None:
+                if not self.upload_next():
+                    break
+            elif not self.depth():
+                return True
+            else:
+                time.sleep(0.05)
+        return not self.depth()
+
+    def depth(self):
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self):
+        with self._lock:
+            oldest = next(iter(self._pending.values()), None)
+            lag = (datetime.now(MYT) - self._queued_time(oldest)).total_seconds() if oldest else 0.0
+            return {
+                "depth": len(self._pending),
+                "lag_seconds": max(lag, 0.0),
+                "uploaded": self.uploaded,
+                "failures": self.failures,
+                "replayed": self.replayed,
+                "retry_in": max(self.retry_at - time.time(), 0.0) if self.retry_at else None,
+                "last_error": self.last_error,
+            }
\ No newline at end of file
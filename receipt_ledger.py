@@ -0,0 +1,59 @@
+from collections import namedtuple
+from receipt_manifest import OP_CODE_MAP, summarize_receipt
+from settlement import parse_receipt
+
+BET_STRAIGHT = "straight"
+BET_IBOX = "ibox"
+BET_BOX = "box"
+
+# 清单记录 "bets" 中每注的字段顺序 (紧凑的数组, 不重复写字段名)
+BET_FIELDS = ("number", "big", "small", "straight", "type", "op_codes")
+
+# 一张收条的结算输入: 文件名, 票号行, 下注总额, 投注 [(号码, 大万, 小万, 直选, iBox, Box, 运营商)]
+LedgerTicket = namedtuple('LedgerTicket', ['filename', 'ticket', 'total', 'bets'])
+
+_operators_by_codes = {}
+
+
+def bet_type(perm_bet, box_bet):
+    if perm_bet:
+        return BET_IBOX
+    if box_bet:
+        return BET_BOX
+    return BET_STRAIGHT
+
+
+def encode_bets(bet_groups):
+    """[(运营商代码串, [(号码, 大万, 小万, 直选, iBox, Box)])] -> 清单记录中的紧凑投注列表"""
+    return [[bet_num, big_bet, small_bet, straight_bet, bet_type(perm_bet, box_bet), op_codes]
+            for op_codes, bets in bet_groups
+            for bet_num, big_bet, small_bet, straight_bet, perm_bet, box_bet in bets]
+
+
+def operators_for(op_codes):
+    """运营商代码串 -> 运营商名称列表 (与解析收条文本的结果一致)"""
+    operators = _operators_by_codes.get(op_codes)
+    if operators is None:
+        operators = [OP_CODE_MAP[code] for code in op_codes if code in OP_CODE_MAP]
+        _operators_by_codes[op_codes] = operators
+    return operators
+
+
+def decode_bets(encoded):
+    """清单记录中的投注 -> 结算使用的投注元组"""
+    return [(number, big, small, straight, kind == BET_IBOX, kind == BET_BOX, operators_for(op_codes))
+            for number, big, small, straight, kind, op_codes in encoded]
+
+
+def ticket_from_entry(entry):
+    """从清单记录取得结算输入, 旧记录没有结构化投注时返回 None"""
+    if "bets" not in entry:
+        return None
+    return LedgerTicket(entry["filename"], f"Ticket ID: {entry.get('ticket_id')}",
+                        entry.get("total", 0.0), decode_bets(entry["bets"]))
+
+
+def ticket_from_text(filename, receipt):
+    """旧收条只有文本时, 解析文本取得结算输入"""
+    ticket_line, bets = parse_receipt(receipt)
+    return LedgerTicket(filename, ticket_line, summarize_receipt(receipt)["total"], bets)
\ No newline at end of file
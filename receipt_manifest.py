@@ -0,0 +1,312 @@
+from datetime import timedelta
+from concurrent_loader import collect_errors, run_concurrently
+import json
+import re
+import threading
+
+DAY_MANIFEST = "manifest.jsonl"
+# 月份文件夹中的当月汇总 {"year", "month", "days": {日: {"count": 收条数}}}, 数量为 None 表示未知
+MONTH_MANIFEST = "manifest.json"
+# 每张收条的清单记录单独存为 "<收条文件名去掉 .txt>.entry.json", 与收条放在同一文件夹
+ENTRY_SUFFIX = ".entry.json"
+RECEIPT_SUFFIX = ".txt"
+
+OP_CODE_MAP = {
+    "M": "magnum 4d", "P": "da ma cai 1+3d", "T": "sports toto 4d",
+    "S": "singapore 4d", "H": "grand dragon 4d", "E": "9 lotto 4d"
+}
+
+
+def summarize_receipt(receipt):
+    """从收条文本中提取票号、下注总额和运营商, 用于重建清单"""
+    ticket_id = None
+    total = 0.0
+    operators = []
+    for line in receipt.split("\n"):
+        line = line.strip()
+        if line.startswith("Ticket ID:"):
+            ticket_id = line.split(":", 1)[1].strip()
+        elif line.startswith("*"):
+            for code in line[1:]:
+                operator = OP_CODE_MAP.get(code)
+                if operator and operator not in operators:
+                    operators.append(operator)
+        elif re.match(r"P\s*:", line):
+            try:
+                total = float(line.split(":", 1)[1].strip())
+            except ValueError:
+                pass
+    return {"ticket_id": ticket_id, "total": total, "operators": operators}
+
+
+def entry_name(receipt_filename):
+    """收条文件名对应的清单记录文件名"""
+    return receipt_filename[:-len(RECEIPT_SUFFIX)] + ENTRY_SUFFIX
+
+
+class ReceiptManifest:
+    """收条清单索引: 每张收条写一个小记录文件, 并在当月汇总中登记当日收条数
+
+    读取只下载当月汇总、快照和记录文件, 从不写入 Drive; 当日的 manifest.jsonl 是记录的合并快照,
+    由后台整理 (compact) 为已结束的日期写入, 同时按文件夹中的实际收条校正当月汇总。
+    快照和汇总都只是缓存, 以收条和记录文件为准
+    """
+
+    def __init__(self, drive_client, base_dir):
+        self.drive_client = drive_client
+        self.base_dir = base_dir
+        # 同一进程内串行改写当月汇总; 多个进程同时改写时可能少计, 由后台整理校正
+        self._lock = threading.Lock()
+
+    def day_path(self, date_str):
+        year, month, day = date_str.split('-')
+        return f"{self.base_dir}/{year}/{month}/{day}"
+
+    def month_path(self, year, month):
+        return f"{self.base_dir}/{year}/{month}"
+
+    def record(self, date_str, entry, overwrite=False):
+        """写入一张收条的清单记录 (entry 必须有 filename) 并在当月汇总中计数
+
+        overwrite=True 时按名称覆盖 (重试时使用), 记录已存在时不重复计数
+        """
+        name = entry_name(entry["filename"])
+        folder_path = self.day_path(date_str)
+        content = json.dumps(entry, ensure_ascii=False)
+        if overwrite:
+            folder_id = self.drive_client.resolve_folder(folder_path)
+            existed = bool(folder_id and self.drive_client.get_file_id(name, folder_id))
+            self.drive_client.upsert_file(name, content, folder_path)
+            if existed:
+                return
+        else:
+            self.drive_client.upload_file(name, content, folder_path)
+        year, month, day = date_str.split('-')
+
+        def count_receipt(days):
+            count = days.get(day, {"count": 0}).get("count")
+            if count is None:
+                # 数量未知 (汇总建立前已有收条) 时按文件夹中的收条计数, 已包括刚写入的收条
+                days[day] = {"count": self.receipt_count(self.drive_client.list_files(folder_path))}
+            else:
+                days[day] = {"count": count + 1}
+
+        self._update_month(year, month, count_receipt)
+
+    def load_month(self, year, month):
+        """读取当月汇总, 不存在时返回 None"""
+        content = self.drive_client.download_file(MONTH_MANIFEST, self.month_path(year, month))
+        return json.loads(content) if content else None
+
+    def _new_month(self, year, month):
+        """新建当月汇总, 已存在的日期文件夹先登记为数量未知, 由后台整理补上"""
+        days = dict((name.zfill(2), {"count": None})
+                    for name, _ in self.drive_client.list_files(self.month_path(year, month)) if name.isdigit())
+        return {"year": year, "month": month, "days": days}
+
+    def _update_month(self, year, month, update):
+        """读取并改写当月汇总, update(days) 原地修改 {日: {"count": 数量}}"""
+        with self._lock:
+            summary = self.load_month(year, month) or self._new_month(year, month)
+            update(summary["days"])
+            self._write_month(year, month, summary)
+
+    def _write_month(self, year, month, summary):
+        summary["days"] = dict(sorted(summary["days"].items()))
+        self.drive_client.upsert_file(MONTH_MANIFEST, json.dumps(summary, ensure_ascii=False),
+                                      self.month_path(year, month))
+
+    def forget_days(self, year, month, days):
+        """从当月汇总中移除已删除的日期 (没有汇总时不做任何事)"""
+        with self._lock:
+            summary = self.load_month(year, month)
+            if not summary or not any(day in summary["days"] for day in days):
+                return
+            for day in days:
+                summary["days"].pop(day, None)
+            self._write_month(year, month, summary)
+
+    def month_day_counts(self, year, month):
+        """当月各日期的收条数 {日: 数量}, 读取当月汇总; 没有汇总时只列出月份文件夹 (数量为 None)"""
+        summary = self.load_month(year, month)
+        if summary is not None:
+            return dict((day, stats.get("count")) for day, stats in sorted(summary["days"].items()))
+        return dict((name.zfill(2), None) for name, _ in sorted(self.drive_client.list_files(self.month_path(year, month)))
+                    if name.isdigit())
+
+    @staticmethod
+    def months_between(start_date, end_date):
+        """日期范围涉及的月份 [(年, 月)]"""
+        months = []
+        month_start = start_date.replace(day=1)
+        while month_start <= end_date:
+            months.append((month_start.strftime("%Y"), month_start.strftime("%m")))
+            month_start = (month_start + timedelta(days=32)).replace(day=1)
+        return months
+
+    def day_counts_between(self, start_date, end_date):
+        """日期范围内有收条的日期及收条数 {日期字符串: 数量 (未知时为 None)}, 只并发读取相关月份汇总"""
+        start_str, end_str = start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+        months = self.months_between(start_date, end_date)
+        counts = {}
+        for item in run_concurrently(months, lambda month: self.month_day_counts(*month), self.drive_client.max_workers):
+            if item.error is not None:
+                raise item.error
+            year, month = item.key
+            for day, count in item.result.items():
+                date_str = f"{year}-{month}-{day}"
+                if start_str <= date_str <= end_str and count != 0:
+                    counts[date_str] = count
+        return dict(sorted(counts.items()))
+
+    def load_day(self, date_str):
+        """读取当日全部收条的清单记录 (按收条文件名排序), 没有记录的旧收条只有文件名和 ID"""
+        return self._day_entries(date_str)
+
+    def _load_snapshot(self, file_id):
+        content = self.drive_client.download_by_id(file_id)
+        entries = [json.loads(line) for line in content.split("\n") if line.strip()]
+        return dict((entry.get("filename"), entry) for entry in entries)
+
+    def _day_entries(self, date_str, files=None):
+        """当日快照加上快照之后新写入的记录 (只读), files 为已列出的当日文件夹内容 (未提供时列出)"""
+        entries, _ = self._read_day(date_str, files)
+        return entries
+
+    def _read_day(self, date_str, files=None):
+        """返回 (当日清单记录, 是否有快照以外的新记录)"""
+        folder_path = self.day_path(date_str)
+        if files is None:
+            files = self.drive_client.list_files(folder_path)
+        ids = dict(files)
+        receipts = sorted((name, file_id) for name, file_id in files if name.endswith(RECEIPT_SUFFIX))
+        snapshot = self._load_snapshot(ids[DAY_MANIFEST]) if DAY_MANIFEST in ids else {}
+        # 快照之后新写入的记录
+        new_records = [(name, ids[entry_name(name)]) for name, _ in receipts
+                       if name not in snapshot and entry_name(name) in ids]
+        loaded = {}
+        results = self.drive_client.download_many([file_id for _, file_id in new_records])
+        for (name, _), item in zip(new_records, results):
+            if item.error is not None:
+                print(f"读取收条清单记录失败: {folder_path}/{name}: {item.error}")
+            elif item.result:
+                loaded[name] = json.loads(item.result)
+        entries = []
+        for name, file_id in receipts:
+            entry = snapshot.get(name) or loaded.get(name)
+            # 还没有记录 (或记录读取失败) 的收条按旧收条处理, 结算时解析文本
+            entries.append(dict(entry, file_id=file_id) if entry else {"filename": name, "file_id": file_id})
+        return entries, bool(loaded)
+
+    def _write_snapshot(self, folder_path, entries):
+        content = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+        self.drive_client.upsert_file(DAY_MANIFEST, content, folder_path)
+
+    def day_listings_between(self, start_date, end_date):
+        """日期范围内各日期文件夹的内容 {日期字符串: [(name, id)]} (逐层列出, 供后台整理使用)"""
+        start_str, end_str = start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+        month_paths = [self.month_path(year, month) for year, month in self.months_between(start_date, end_date)]
+        day_paths = {}
+        for item in self.drive_client.list_files_many(month_paths):
+            if item.error is not None:
+                raise item.error
+            year, month = item.key.split('/')[-2:]
+            for name, _ in item.result:
+                date_str = f"{year}-{month}-{name.zfill(2)}"
+                if name.isdigit() and start_str <= date_str <= end_str:
+                    day_paths[f"{item.key}/{name}"] = date_str
+        listings = {}
+        for item in self.drive_client.list_files_many(list(day_paths)):
+            if item.error is not None:
+                raise item.error
+            listings[day_paths[item.key]] = item.result
+        return dict(sorted(listings.items()))
+
+    @staticmethod
+    def receipt_count(files):
+        return sum(1 for name, _ in files if name.endswith(RECEIPT_SUFFIX))
+
+    def entries_between(self, start_date, end_date, errors=None):
+        """返回日期范围内的清单记录 [(日期字符串, 记录)], 只读取相关月份汇总和当日清单"""
+        return self.entries_for_dates(list(self.day_counts_between(start_date, end_date)), errors)
+
+    def entries_for_dates(self, date_strs, errors=None, listings=None):
+        """并发读取多个日期的清单记录 [(日期字符串, 记录)], listings 为已列出的日期文件夹内容 (可选)"""
+        listings = listings or {}
+        results = run_concurrently(date_strs, lambda date_str: self._day_entries(date_str, listings.get(date_str)),
+                                   self.drive_client.max_workers)
+        entries = []
+        for item in collect_errors(results, errors, "读取收条清单失败"):
+            entries.extend((item.key, entry) for entry in item.result)
+        return entries
+
+    def compact(self, start_date, end_date, today):
+        """后台整理日期范围内的清单, 返回写入的文件数
+
+        为 today (日期字符串) 之前、有新记录的日期重写当日快照; 按文件夹中的实际收条重写不一致的当月汇总
+        (修正多进程同时计数时少计的数量); 并删除并发创建的同名重复清单文件
+        """
+        listings = self.day_listings_between(start_date, end_date)
+        written = 0
+        duplicated = []
+        for date_str, files in listings.items():
+            names = [name for name, _ in files]
+            if names.count(DAY_MANIFEST) > 1:
+                duplicated.append(self.day_path(date_str))
+            if date_str >= today:
+                continue
+            entries, changed = self._read_day(date_str, files)
+            if changed:
+                self._write_snapshot(self.day_path(date_str), entries)
+                written += 1
+        start_str, end_str = start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+        for year, month in self.months_between(start_date, end_date):
+            prefix = f"{year}-{month}-"
+            counts = dict((date_str[-2:], self.receipt_count(files))
+                          for date_str, files in listings.items() if date_str.startswith(prefix))
+            with self._lock:
+                summary = self.load_month(year, month)
+                if summary is not None or counts:
+                    summary = summary or {"year": year, "month": month, "days": {}}
+                    # 范围之外的日期保留原有数量
+                    days = dict((day, stats) for day, stats in summary["days"].items()
+                                if not start_str <= prefix + day <= end_str)
+                    days.update((day, {"count": count}) for day, count in counts.items())
+                    if days != summary["days"]:
+                        summary["days"] = days
+                        self._write_month(year, month, summary)
+                        written += 1
+            duplicated.append(self.month_path(year, month))
+        for item in self.drive_client.compact_duplicates(duplicated):
+            if item.error is not None:
+                print(f"删除重复的收条清单失败: {item.key[0]}: {item.error}")
+        return written
+
+    def rebuild(self, date_strs):
+        """补写缺失的清单记录并重写当日快照和当月汇总, 已有记录 (包括结构化投注) 保留不变, 返回 {日期: 收条数}"""
+        rebuilt = {}
+        for date_str in sorted(date_strs):
+            folder_path = self.day_path(date_str)
+            entries = self._day_entries(date_str)
+            names = set(name for name, _ in self.drive_client.list_files(folder_path))
+            # 只在快照中有记录的收条也补写记录文件, 之后快照可以随时重建
+            unrecorded = [entry for entry in entries if entry_name(entry["filename"]) not in names]
+            legacy = [entry for entry in unrecorded if "ticket_id" not in entry]
+            results = self.drive_client.download_many([entry["file_id"] for entry in legacy])
+            for entry, item in zip(legacy, results):
+                if item.error is not None:
+                    raise Exception(f"无法读取收条 {folder_path}/{entry['filename']}: {item.error}")
+                entry.update(summarize_receipt(item.result or ""))
+            for entry in unrecorded:
+                name = entry_name(entry["filename"])
+                self.drive_client.upsert_file(name, json.dumps(entry, ensure_ascii=False), folder_path)
+            self._write_snapshot(folder_path, entries)
+            rebuilt[date_str] = len(entries)
+            print(f"已重建收条清单: {date_str} ({len(entries)} 张)")
+        months = {}
+        for date_str, count in rebuilt.items():
+            year, month, day = date_str.split('-')
+            months.setdefault((year, month), {})[day] = {"count": count}
+        for (year, month), days in months.items():
+            self._update_month(year, month, lambda summary_days: summary_days.update(days))
+        return rebuilt
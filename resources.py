@@ -0,0 +1,79 @@
+import os
+import time
+from bet_store import DEFAULT_STORE_DIR, create_bet_store
+from async_drive_client import AsyncDriveClient, httpx
+from google_drive_client import GoogleDriveClient
+from instrumentation import start_metrics_server
+from liability import DEFAULT_SNAPSHOT_PATH, create_liability_index
+from local_storage import DEFAULT_STORAGE_DIR, LocalStorageBackend
+from lottery_data_manager import LotteryDataManager
+from purchase_spool import DEFAULT_SPOOL_PATH, PurchaseSpool
+from retention import RetentionSweeper
+from storage_manager import StorageManager
+from tiered_storage import DEFAULT_REMOTE_LISTING_TTL, TieredStorageBackend
+
+
+def create_drive_client():
+    """按环境变量 DRIVE_CLIENT 创建 Drive 客户端: sync (默认) 或 async (大量请求并发发出, 需要 httpx)"""
+    if os.getenv('DRIVE_CLIENT', 'sync') == 'async':
+        if httpx is not None:
+            return AsyncDriveClient.from_env()
+        print("未安装 httpx, 使用同步 Drive 客户端")
+    return GoogleDriveClient.from_env()
+
+
+def create_storage_backend():
+    """按环境变量 STORAGE_BACKEND 创建存储后端: drive (默认), local (只用本地磁盘), tiered (本地优先, 异步同步到 Drive)"""
+    kind = os.getenv('STORAGE_BACKEND', 'drive')
+    if kind == 'drive':
+        return create_drive_client()
+    local = LocalStorageBackend(os.getenv('LOCAL_STORAGE_DIR', DEFAULT_STORAGE_DIR))
+    if kind == 'local':
+        return local
+    if kind == 'tiered':
+        return TieredStorageBackend(local, create_drive_client(),
+                                    float(os.getenv('TIERED_REMOTE_LISTING_TTL', str(DEFAULT_REMOTE_LISTING_TTL))))
+    raise ValueError(f"未知的存储后端: {kind}")
+
+
+class AppResources:
+    """进程级共享资源: 存储后端、收条存储和开奖数据, 每个服务进程只创建一次, 所有会话共用"""
+
+    def __init__(self, drive_client=None):
+        start = time.perf_counter()
+        self.drive_client = drive_client or create_storage_backend()
+        self.bet_store = create_bet_store(os.getenv('BET_STORE_DIR', DEFAULT_STORE_DIR))
+        self.storage_manager = StorageManager(self.drive_client, self.bet_store)
+        self.data_manager = LotteryDataManager(self.drive_client)
+        # 过期收条在后台线程中增量清理, 启动时不做任何清理
+        self.sweeper = RetentionSweeper(self.storage_manager)
+        # 购票收条的写后队列, 创建时重放上次未上传的收条
+        self.spool = PurchaseSpool(self.storage_manager, os.getenv('PURCHASE_SPOOL_PATH', DEFAULT_SPOOL_PATH))
+        # 当期赔付风险索引, 载入当天的快照
+        self.liability = create_liability_index(os.getenv('LIABILITY_SNAPSHOT_PATH', DEFAULT_SNAPSHOT_PATH))
+        self.metrics_server = None
+        self.created_at = time.time()
+        self.build_seconds = time.perf_counter() - start
+
+    def start_background(self):
+        self.drive_client.start()
+        self.sweeper.start()
+        self.spool.start()
+        if self.liability is not None:
+            self.liability.start()
+        # 设置 METRICS_PORT 时在该端口提供 Prometheus 格式的 /metrics
+        port = os.getenv('METRICS_PORT')
+        if port and self.metrics_server is None:
+            self.metrics_server = start_metrics_server(int(port), os.getenv('METRICS_HOST', '127.0.0.1'))
+
+    def close(self):
+        """停止后台线程, 重新加载资源前调用 (未上传的收条留在日志中, 新资源会重放)"""
+        self.sweeper.stop()
+        self.spool.stop()
+        self.drive_client.stop()
+        if self.liability is not None:
+            self.liability.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+            self.metrics_server = None
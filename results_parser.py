@@ -0,0 +1,150 @@
+import hashlib
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # 没有 lxml 时只能使用 BeautifulSoup
+    lxml = None
+
+BOX_CLASSES = ['lottery-box', 'result-box']
+
+
+class SoupParser:
+    """BeautifulSoup (html.parser) 解析, 纯 Python, 作为后备"""
+
+    name = "bs4"
+
+    def boxes(self, html_content):
+        return BeautifulSoup(html_content, 'html.parser').find_all('div', class_=BOX_CLASSES)
+
+    def block_hash(self, box):
+        return hashlib.md5(str(box).encode('utf-8')).hexdigest()
+
+    def find(self, node, tag, classes):
+        return node.find(tag, class_=classes)
+
+    def find_all(self, node, tag, classes):
+        return node.find_all(tag, class_=classes)
+
+    def text(self, node):
+        return node.text
+
+
+class LxmlParser:
+    """lxml 解析, 查找用预编译的 XPath, 匹配规则与 BeautifulSoup 的 class_ 列表一致"""
+
+    name = "lxml"
+
+    def __init__(self):
+        self._xpaths = {}
+
+    def _xpath(self, tag, classes):
+        key = (tag, tuple(classes) if classes else None)
+        xpath = self._xpaths.get(key)
+        if xpath is None:
+            if classes:
+                condition = " or ".join(
+                    f"contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')" for cls in classes)
+                xpath = etree.XPath(f"descendant::{tag}[{condition}]")
+            else:
+                xpath = etree.XPath(f"descendant::{tag}")
+            self._xpaths[key] = xpath
+        return xpath
+
+    def boxes(self, html_content):
+        try:
+            root = lxml.html.document_fromstring(html_content)
+        except ValueError:
+            # 带 XML 编码声明的字符串需要按字节解析
+            root = lxml.html.document_fromstring(html_content.encode('utf-8'))
+        return self.find_all(root, 'div', BOX_CLASSES)
+
+    def block_hash(self, box):
+        return hashlib.md5(etree.tostring(box, encoding='utf-8', with_tail=False)).hexdigest()
+
+    def find(self, node, tag, classes):
+        found = self._xpath(tag, classes)(node)
+        return found[0] if found else None
+
+    def find_all(self, node, tag, classes):
+        return self._xpath(tag, classes)(node)
+
+    def text(self, node):
+        return node.text_content()
+
+
+def default_parser():
+    """优先使用 lxml, 未安装时退回 BeautifulSoup"""
+    return LxmlParser() if lxml is not None else SoupParser()
+
+
+def block_operator(parser, box):
+    """区块中的运营商名称 (未规范化)"""
+    operator_info = parser.find(box, 'div', ['info', 'text-info', 'operator-info'])
+    if operator_info is not None:
+        operator_b = parser.find(operator_info, 'b', None)
+        operator_span = parser.find(operator_info, 'span', None)
+        if operator_b is not None and parser.text(operator_b).strip():
+            return parser.text(operator_b).strip()
+        if operator_span is not None and parser.text(operator_span).strip():
+            return parser.text(operator_span).strip()
+    return "Unknown Operator"
+
+
+def block_date(parser, box):
+    """区块中的开奖日期原文, 没有时返回 None"""
+    date_elem = parser.find(box, 'div', ['date', 'draw-date'])
+    if date_elem is None:
+        date_elem = parser.find(box, 'span', ['date', 'draw-date'])
+    if date_elem is not None and parser.text(date_elem).strip():
+        return parser.text(date_elem).strip()
+    return None
+
+
+def block_results(parser, box, skip_unknown=False):
+    """区块中的各奖项号码 {奖项: 号码或号码列表}, skip_unknown 时忽略没有奖项名称的行"""
+    results = {}
+    main_row = parser.find(box, 'div', ['main', 'el-row'])
+    if main_row is not None:
+        for col in parser.find_all(main_row, 'div', ['el-col', 'el-col-8', 'el-col-12']):
+            prize_span = parser.find(col, 'span', ['prize', 'prize-type'])
+            if prize_span is None:
+                continue
+            prize_type_elem = parser.find(prize_span, 'span', ['first', 'second', 'third'])
+            if prize_type_elem is not None:
+                prize_type = parser.text(prize_type_elem).strip() + " Prize"
+            else:
+                prize_type = parser.text(prize_span).strip()
+            number_elem = parser.find(col, 'b', ['number'])
+            if number_elem is None:
+                number_elem = parser.find(col, 'span', ['number'])
+            number = parser.text(number_elem).strip() if number_elem is not None else "N/A"
+            if "1st" in prize_type.lower() or prize_type == "1 Prize":
+                prize_type = "首奖"
+            elif "2nd" in prize_type.lower() or prize_type == "2 Prize":
+                prize_type = "二奖"
+            elif "3rd" in prize_type.lower() or prize_type == "3 Prize":
+                prize_type = "三奖"
+            results[prize_type] = number
+    for sub_row in parser.find_all(box, 'div', ['sub-result', 'el-row']):
+        result_info = parser.find(sub_row, 'div', ['result-info', 'el-col-24'])
+        if result_info is None:
+            continue
+        prize_type_elem = parser.find(result_info, 'span', ['text-info', 'prize-type'])
+        prize_type = parser.text(prize_type_elem).strip() if prize_type_elem is not None else "Unknown Prize"
+        if skip_unknown and prize_type == "Unknown Prize":
+            continue
+        if "Special" in prize_type:
+            prize_type = "特别奖"
+        elif "Consolation" in prize_type:
+            prize_type = "安慰奖"
+        number_elems = parser.find_all(sub_row, 'b', ['number']) or parser.find_all(sub_row, 'span', ['number'])
+        numbers = []
+        for num_elem in number_elems:
+            num_text = parser.text(num_elem).strip()
+            if num_text and num_text != '-':
+                numbers.append(num_text)
+        if numbers:
+            results[prize_type] = numbers
+    return {k: v for k, v in results.items() if "Jackpot" not in k}
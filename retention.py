@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+import pytz
+
+MYT = pytz.timezone('Asia/Kuala_Lumpur')
+
+RETENTION_DAYS = 30
+# 清理进度保存在收条根目录, 服务重启或多实例部署时共用
+STATE_FILE = "retention.json"
+DEFAULT_INTERVAL_SECONDS = 6 * 3600
+# 启动后延迟首次清理, 不占用启动时间
+DEFAULT_INITIAL_DELAY = 60
+
+
+class RetentionSweeper:
+    """后台增量清理过期收条: 记住已清理到的日期, 每次只处理新过期的日期; 之后整理保留期内的收条清单"""
+
+    def __init__(self, storage_manager, retention_days=RETENTION_DAYS,
+                 interval_seconds=DEFAULT_INTERVAL_SECONDS, initial_delay=DEFAULT_INITIAL_DELAY):
+        self.storage_manager = storage_manager
+        self.drive_client = storage_manager.drive_client
+        self.retention_days = retention_days
+        self.interval_seconds = interval_seconds
+        self.initial_delay = initial_delay
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.swept_through = None
+        self.sweeps = 0
+        self.folders_deleted = 0
+        self.delete_failures = 0
+        self.manifests_written = 0
+        self.api_calls = Counter()
+        self.last_sweep_at = None
+        self.last_sweep_seconds = None
+        self.last_error = None
+
+    def last_expired_date(self):
+        """最近一个已过期的日期 (当天及以前的收条都应删除)"""
+        return (datetime.now(MYT) - timedelta(days=self.retention_days)).date()
+
+    def load_state(self):
+        """读取已清理到的日期, 从未清理过时返回 None"""
+        content = self.drive_client.download_file(STATE_FILE, self.storage_manager.base_dir)
+        if not content:
+            return None
+        swept_through = json.loads(content).get("swept_through")
+        return datetime.strptime(swept_through, "%Y-%m-%d").date() if swept_through else None
+
+    def save_state(self, swept_through):
+        content = json.dumps({"swept_through": swept_through.strftime("%Y-%m-%d")})
+        self.drive_client.upsert_file(STATE_FILE, content, self.storage_manager.base_dir)
+
+    def sweep_once(self):
+        """执行一次清理: 首次全量扫描, 之后只删除上次清理之后新过期的日期"""
+        with self._lock:
+            start = time.perf_counter()
+            with self.drive_client.track_calls() as calls:
+                try:
+                    last_expired = self.last_expired_date()
+                    swept_through = self.load_state()
+                    if swept_through is None:
+                        deleted, failed = self.storage_manager.cleanup_old_receipts(self.retention_days)
+                    elif swept_through < last_expired:
+                        deleted, failed = self.storage_manager.delete_expired_days(
+                            swept_through + timedelta(days=1), last_expired)
+                    else:
+                        deleted, failed = 0, 0
+                    self.folders_deleted += deleted
+                    self.delete_failures += failed
+                    # 有删除失败时不推进进度, 下次重新处理同一范围
+                    if failed == 0:
+                        if swept_through is None or swept_through < last_expired:
+                            self.save_state(last_expired)
+                        swept_through = last_expired
+                    self.swept_through = swept_through
+                    # 保留期内的清单: 写入已结束日期的快照, 校正当月汇总
+                    self.manifests_written += self.storage_manager.compact_manifests(
+                        last_expired + timedelta(days=1), datetime.now(MYT).date())
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"清理过期收条失败: {e}")
+            self.api_calls.update(calls)
+            self.sweeps += 1
+            self.last_sweep_at = datetime.now(MYT)
+            self.last_sweep_seconds = time.perf_counter() - start
+
+    def _run(self):
+        if self._stop.wait(self.initial_delay):
+            return
+        while True:
+            self.sweep_once()
+            if self._stop.wait(self.interval_seconds):
+                return
+
+    def start(self):
+        """启动后台清理线程 (守护线程, 重复调用无效)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="retention-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "swept_through": self.swept_through.strftime("%Y-%m-%d") if self.swept_through else None,
+            "sweeps": self.sweeps,
+            "folders_deleted": self.folders_deleted,
+            "delete_failures": self.delete_failures,
+            "manifests_written": self.manifests_written,
+            "api_calls": sum(self.api_calls.values()),
+            "last_sweep_at": self.last_sweep_at.strftime("%Y-%m-%d %H:%M:%S") if self.last_sweep_at else None,
+            "last_sweep_seconds": self.last_sweep_seconds,
+            "last_error": self.last_error,
+        }
\ No newline at end of file
@@ -0,0 +1,367 @@
+import re
+from collections import namedtuple
+from operator import itemgetter
+from permutation_table import CANONICAL_KEYS
+from receipt_manifest import OP_CODE_MAP
+from winning_index import PRIZE_TIERS
+
+try:
+    import numpy as np
+except ImportError:  # 没有 numpy 时使用纯 Python 结算
+    np = None
+
+PRIZE_PAYOUTS = {
+    "首奖": {"big": 2500, "small": 3500},
+    "二奖": {"big": 1000, "small": 2000},
+    "三奖": {"big": 500, "small": 1000},
+    "特别奖": {"big": 180, "small": 0},
+    "安慰奖": {"big": 60, "small": 0}
+}
+BIG_PAYOUTS = [PRIZE_PAYOUTS[prize]["big"] for prize in PRIZE_TIERS]
+SMALL_PAYOUTS = [PRIZE_PAYOUTS[prize]["small"] if prize in ("首奖", "二奖", "三奖") else 0 for prize in PRIZE_TIERS]
+
+KIND_STRAIGHT = 0
+KIND_PERM = 1
+KIND_BOX = 2
+
+# 中奖明细: 收条序号, 投注序号, 运营商, 号码, 奖项, 下注类型 (big/small/straight), 下注金额, 奖金
+Hit = namedtuple('Hit', ['receipt', 'bet', 'operator', 'number', 'prize', 'stake_type', 'stake', 'amount'])
+
+STAKE_TYPES = ("big", "small", "straight")
+STAKE_LABELS = {"big": "大万", "small": "小万", "straight": "直选"}
+
+# 可用的结算引擎, 最后一个为默认
+ENGINES = ("python", "numpy") if np is not None else ("python",)
+
+# 列式投注: 收条键列表, 每注的收条序号、收条内序号、号码 (整数)、大万、小万、直选、类型 (KIND_*)、运营商组编号,
+# 以及各运营商组的运营商列表
+BetColumns = namedtuple('BetColumns', ['keys', 'receipt', 'bet', 'number', 'big', 'small', 'straight', 'kind',
+                                       'group', 'groups'])
+
+
+def parse_receipt(receipt):
+    """从收条文本解析出票号行和投注 [(号码, 大万, 小万, 直选, iBox, Box, 运营商)]"""
+    lines = receipt.split("\n")
+    ticket_id = lines[0] if lines else "未知票号"
+    bets = []
+    current_ops = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("*"):
+            op_codes = line[1:]
+            current_ops = [OP_CODE_MAP[code] for code in op_codes if code in OP_CODE_MAP]
+        elif "=" in line and not line.startswith("T :") and not line.startswith("P :") and not line.startswith("=="):
+            perm_bet = line.startswith("iB(")
+            box_bet = line.startswith("Box(")
+            if perm_bet:
+                number_match = re.match(r"iB\((\d{4})\)", line)
+            elif box_bet:
+                number_match = re.match(r"Box\((\d{4})\)", line)
+            else:
+                number_match = re.match(r"(\d{4})=", line)
+            number = number_match.group(1) if number_match else "0000"
+            big = 0.0
+            small = 0.0
+            straight = 0.0
+            for amount in re.findall(r"(\d+\.\d)B|(\d+\.\d)S|(\d+\.\d)A1", line):
+                if amount[0]:
+                    big = float(amount[0])
+                elif amount[1]:
+                    small = float(amount[1])
+                elif amount[2]:
+                    straight = float(amount[2])
+            bets.append((number, big, small, straight, perm_bet, box_bet, current_ops))
+    return ticket_id, bets
+
+
+def format_hit(hit):
+    """中奖明细的文本行 (与原中奖计算器输出一致)"""
+    stake_label = STAKE_LABELS[hit.stake_type]
+    return f"  {hit.operator} - {hit.number} 中 {hit.prize} ({stake_label}: {hit.stake:.2f}) 奖金: {hit.amount:.2f}\n"
+
+
+class SettlementResult:
+    """结算结果: 每注奖金、每张收条奖金、总奖金和中奖明细 (hits=False 结算时没有明细)"""
+
+    def __init__(self, keys, bet_amounts, bet_counts, receipt_totals, hits):
+        self.keys = keys
+        # 每注奖金按收条顺序展开, bet_counts 为每张收条的投注数
+        self.bet_amounts = bet_amounts
+        self.bet_counts = bet_counts
+        self.receipt_totals = receipt_totals
+        self.total = sum(receipt_totals)
+        self.hits = hits
+        self._hits_by_receipt = None
+
+    @property
+    def bet_totals(self):
+        """每张收条各注的奖金 [[金额]]"""
+        amounts = iter(self.bet_amounts.tolist() if np is not None and isinstance(self.bet_amounts, np.ndarray)
+                       else self.bet_amounts)
+        return [[next(amounts) for _ in range(count)] for count in self.bet_counts]
+
+    def receipt_hits(self, receipt_index):
+        if self._hits_by_receipt is None:
+            grouped = {}
+            for hit in self.hits:
+                grouped.setdefault(hit.receipt, []).append(hit)
+            self._hits_by_receipt = grouped
+        return self._hits_by_receipt.get(receipt_index, [])
+
+
+def settle(receipts, draw_indexes, engine=None, hits=True):
+    """结算多张收条, receipts 为 [(key, bets)] 或 BetColumns, draw_indexes 为 {运营商: WinningIndex}
+
+    engine 为 "numpy" 或 "python", 默认有 numpy 时使用向量化结算; hits=False 时只算奖金, 不生成中奖明细
+    """
+    if engine is None:
+        engine = ENGINES[-1]
+    if engine == "numpy":
+        columns = receipts if isinstance(receipts, BetColumns) else bets_to_columns(receipts)
+        return _settle_columns(columns, draw_indexes, hits)
+    if isinstance(receipts, BetColumns):
+        receipts = columns_to_bets(receipts)
+    return _settle_python(receipts, draw_indexes, hits)
+
+
+def _bet_kind(perm_bet, box_bet):
+    if perm_bet:
+        return KIND_PERM
+    if box_bet:
+        return KIND_BOX
+    return KIND_STRAIGHT
+
+
+def _bet_hits(receipt_index, bet_index, bet, draw_indexes):
+    """单注结算 (纯 Python), 返回中奖明细; iBox 按规范键对奖, 不做排列组合
+
+    Box 与原中奖计算器一致: 只对各位数字排序后的号码, 中奖时按大万全额赔付
+    """
+    number, big, small, straight, perm_bet, box_bet, operators = bet
+    kind = _bet_kind(perm_bet, box_bet)
+    hits = []
+    for op in operators:
+        draw_index = draw_indexes.get(op)
+        if draw_index is None:
+            continue
+        if kind == KIND_PERM:
+            matches = draw_index.canonical_matches(number)
+        else:
+            target = number if kind == KIND_STRAIGHT else f"{CANONICAL_KEYS[int(number)]:04d}"
+            matches = [(target, draw_index.prizes(target))]
+        for winning_number, prizes in matches:
+            for prize in prizes:
+                tier = PRIZE_TIERS.index(prize)
+                if big > 0:
+                    hits.append(Hit(receipt_index, bet_index, op, winning_number, prize, "big", big,
+                                    big * BIG_PAYOUTS[tier]))
+                if small > 0 and kind != KIND_BOX and SMALL_PAYOUTS[tier] > 0:
+                    hits.append(Hit(receipt_index, bet_index, op, winning_number, prize, "small", small,
+                                    small * SMALL_PAYOUTS[tier]))
+                if straight > 0 and kind == KIND_STRAIGHT and tier == 0:
+                    hits.append(Hit(receipt_index, bet_index, op, winning_number, prize, "straight", straight,
+                                    straight * BIG_PAYOUTS[0]))
+    return hits
+
+
+def _settle_python(receipts, draw_indexes, hits=True):
+    bet_amounts = []
+    receipt_totals = []
+    all_hits = []
+    for receipt_index, (_, bets) in enumerate(receipts):
+        total = 0.0
+        for bet_index, bet in enumerate(bets):
+            bet_hits = _bet_hits(receipt_index, bet_index, bet, draw_indexes)
+            amount = sum(hit.amount for hit in bet_hits)
+            bet_amounts.append(amount)
+            total += amount
+            if hits:
+                all_hits.extend(bet_hits)
+        receipt_totals.append(total)
+    return SettlementResult([key for key, _ in receipts], bet_amounts, [len(bets) for _, bets in receipts],
+                            receipt_totals, all_hits)
+
+
+def _draw_arrays(draw_index):
+    """每期开奖的 numpy 查询表: (20000 x 奖项数) 的表, 前 10000 行为号码 -> 是否中奖, 后 10000 行为规范键 -> 中奖号码个数;
+    以及每行是否有任何中奖 (用于先筛出候选投注)
+    """
+    arrays = draw_index.derived.get("numpy")
+    if arrays is None:
+        masks = np.frombuffer(bytes(draw_index.masks), dtype=np.uint8)
+        tier_hits = ((masks[:, None] >> np.arange(len(PRIZE_TIERS), dtype=np.uint8)) & 1).astype(np.float64)
+        key_counts = np.zeros_like(tier_hits)
+        np.add.at(key_counts, _canonical_keys_array(), tier_hits)
+        table = np.vstack([tier_hits, key_counts])
+        arrays = draw_index.derived["numpy"] = (table, table.any(axis=1))
+    return arrays
+
+
+_TABLE_ARRAYS = {}
+
+
+def _canonical_keys_array():
+    if "keys" not in _TABLE_ARRAYS:
+        _TABLE_ARRAYS["keys"] = np.asarray(CANONICAL_KEYS, dtype=np.int64)
+    return _TABLE_ARRAYS["keys"]
+
+
+def bets_to_columns(receipts):
+    """[(key, bets)] -> BetColumns; 每注只经过一次转置, 其余都是数组运算
+
+    同一组投注共用同一个运营商列表 (parse_receipt 和 decode_bets 都是如此), 按列表对象分组
+    """
+    keys = [key for key, _ in receipts]
+    counts = np.fromiter((len(bets) for _, bets in receipts), dtype=np.int64, count=len(receipts))
+    flat = [bet for _, bets in receipts for bet in bets]
+    receipt = np.repeat(np.arange(len(receipts), dtype=np.int64), counts)
+    bet = np.arange(len(flat), dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+    if not flat:
+        empty = np.zeros(0)
+        return BetColumns(keys, receipt, bet, np.zeros(0, dtype=np.int64), empty, empty, empty,
+                          np.zeros(0, dtype=np.int8), np.zeros(0, dtype=np.int64), [])
+    n_bets = len(flat)
+
+    def column(field, dtype):
+        return np.fromiter(map(itemgetter(field), flat), dtype=dtype, count=n_bets)
+
+    perm = column(4, bool)
+    kind = np.where(perm, KIND_PERM, np.where(column(5, bool), KIND_BOX, KIND_STRAIGHT)).astype(np.int8)
+    ops = list(map(itemgetter(6), flat))
+    _, first, group = np.unique(np.fromiter(map(id, ops), dtype=np.int64, count=n_bets),
+                                return_index=True, return_inverse=True)
+    return BetColumns(keys, receipt, bet, _numbers_array(list(map(itemgetter(0), flat))), column(1, np.float64),
+                      column(2, np.float64), column(3, np.float64), kind, group.reshape(-1),
+                      [ops[index] for index in first.tolist()])
+
+
+def _numbers_array(numbers):
+    """号码字符串列表 -> 整数数组; 全部为 4 位数字时一次按字节换算"""
+    joined = "".join(numbers)
+    if len(joined) == 4 * len(numbers) and joined.isdigit():
+        digits = np.frombuffer(joined.encode("ascii"), dtype=np.uint8).reshape(-1, 4).astype(np.int64) - ord("0")
+        return digits @ np.array([1000, 100, 10, 1], dtype=np.int64)
+    return np.fromiter(map(int, numbers), dtype=np.int64, count=len(numbers))
+
+
+def columns_to_bets(columns):
+    """BetColumns -> [(key, bets)], 供逐注结算使用"""
+    receipts = [(key, []) for key in columns.keys]
+    for receipt_index, number, big, small, straight, kind, group in zip(
+            columns.receipt.tolist(), columns.number.tolist(), columns.big.tolist(), columns.small.tolist(),
+            columns.straight.tolist(), columns.kind.tolist(), columns.group.tolist()):
+        receipts[receipt_index][1].append((f"{number:04d}", big, small, straight, kind == KIND_PERM,
+                                           kind == KIND_BOX, columns.groups[group]))
+    return receipts
+
+
+def _settle_columns(columns, draw_indexes, hits=True):
+    """向量化结算: 按运营商对选择了该运营商的投注查表, 先筛出查到中奖号码的投注, 只为这些投注计算奖金和明细"""
+    operators = list(draw_indexes)
+    n_bets = len(columns.number)
+    bet_amounts = np.zeros(n_bets)
+    all_hits = []
+    if n_bets and operators:
+        keys = _canonical_keys_array()[columns.number]
+        box = columns.kind == KIND_BOX
+        # 直选查号码表, Box 查排序后的号码 (即规范键), iBox 查规范键表 (偏移 10000)
+        matched = np.where(box, keys, columns.number)
+        lookup = np.where(columns.kind == KIND_PERM, keys + 10000, matched)
+        # 各运营商在每组运营商中出现的次数 (同一运营商重复选择时重复计奖)
+        op_positions = {op: i for i, op in enumerate(operators)}
+        group_counts = np.zeros((len(operators), len(columns.groups)))
+        for group_id, ops in enumerate(columns.groups):
+            for op in ops:
+                if op in op_positions:
+                    group_counts[op_positions[op], group_id] += 1
+        candidates = []
+        for op, position in op_positions.items():
+            counts = group_counts[position][columns.group]
+            rows = np.flatnonzero(counts)
+            table, any_hit = _draw_arrays(draw_indexes[op])
+            rows = rows[any_hit[lookup[rows]]]
+            if len(rows):
+                candidates.append((op, rows, counts[rows], table))
+        if candidates:
+            rows = np.unique(np.concatenate([op_rows for _, op_rows, _, _ in candidates]))
+            # 候选投注在各奖项中一次的奖金 [大万, 小万, 直选] (与运营商无关, 只算一次)
+            stake_units = np.stack([
+                columns.big[rows, None] * _payouts_array("big"),
+                np.where(box[rows, None], 0.0, columns.small[rows, None] * _payouts_array("small")),
+                np.where((columns.kind[rows] == KIND_STRAIGHT)[:, None],
+                         columns.straight[rows, None] * _payouts_array("straight"), 0.0),
+            ])
+            unit = stake_units.sum(axis=0)
+            winners = []
+            for op, op_rows, counts, table in candidates:
+                local = np.searchsorted(rows, op_rows)
+                wins = table[lookup[op_rows]] * unit[local]
+                bet_amounts[op_rows] += wins.sum(axis=1) * counts
+                if hits:
+                    win_rows, tiers = np.nonzero(wins)
+                    winners.append((op, op_rows[win_rows], local[win_rows], tiers))
+            if winners:
+                all_hits = _column_hits(columns, draw_indexes, winners, stake_units, matched)
+    receipt_totals = np.bincount(columns.receipt, weights=bet_amounts, minlength=len(columns.keys)).tolist()
+    bet_counts = np.bincount(columns.receipt, minlength=len(columns.keys)).tolist()
+    return SettlementResult(columns.keys, bet_amounts, bet_counts, receipt_totals, all_hits)
+
+
+def _payouts_array(stake_type):
+    """各奖项每 1 元下注的奖金 (按 PRIZE_TIERS 顺序)"""
+    if stake_type not in _TABLE_ARRAYS:
+        payouts = {"big": BIG_PAYOUTS, "small": SMALL_PAYOUTS,
+                   "straight": [BIG_PAYOUTS[0]] + [0] * (len(PRIZE_TIERS) - 1)}[stake_type]
+        _TABLE_ARRAYS[stake_type] = np.asarray(payouts, dtype=np.float64)
+    return _TABLE_ARRAYS[stake_type]
+
+
+def _column_hits(columns, draw_indexes, winners, stake_units, matched):
+    """为中奖的 (投注, 运营商, 奖项) 生成明细, 顺序与逐注结算一致 (中奖较少, 逐条生成)
+
+    winners 为 [(运营商, 投注行, 投注在 stake_units 中的行, 奖项)]
+    """
+    stakes = (columns.big, columns.small, columns.straight)
+    # (运营商组, 运营商) -> 该运营商在组中各次出现的位置
+    op_slots = {}
+    entries = []
+    for op, rows, local, tiers in winners:
+        draw_index = draw_indexes[op]
+        for tier, receipt_index, bet_index, number, kind, group, bet_stakes, amounts in zip(
+                tiers.tolist(), columns.receipt[rows].tolist(), columns.bet[rows].tolist(),
+                matched[rows].tolist(), columns.kind[rows].tolist(), columns.group[rows].tolist(),
+                zip(*(stake[rows].tolist() for stake in stakes)),
+                zip(*(units[local, tiers].tolist() for units in stake_units))):
+            slots = op_slots.get((group, op))
+            if slots is None:
+                slots = op_slots[(group, op)] = [i for i, name in enumerate(columns.groups[group]) if name == op]
+            prize = PRIZE_TIERS[tier]
+            if kind == KIND_PERM:
+                winning_numbers = [winning_number for winning_number, prizes in draw_index.canonical_matches(number)
+                                   if prize in prizes]
+            else:
+                winning_numbers = [f"{number:04d}"]
+            for slot in slots:
+                for winning_number in winning_numbers:
+                    for stake_index, (stake_type, stake, amount) in enumerate(zip(STAKE_TYPES, bet_stakes, amounts)):
+                        if stake > 0 and amount > 0:
+                            entries.append(((receipt_index, bet_index, slot, winning_number, tier, stake_index),
+                                            Hit(receipt_index, bet_index, op, winning_number, prize, stake_type,
+                                                stake, amount)))
+    entries.sort(key=lambda entry: entry[0])
+    return [hit for _, hit in entries]
+
+
+def check_parity(receipts, draw_indexes, tolerance=1e-6):
+    """比较向量化结算与逐注结算的结果, 返回不一致的收条序号列表 (明细不一致时包含 None)"""
+    vectorized = settle(receipts, draw_indexes, "numpy")
+    reference = settle(receipts, draw_indexes, "python")
+    mismatches = []
+    for receipt_index, (left, right) in enumerate(zip(vectorized.bet_totals, reference.bet_totals)):
+        if any(abs(a - b) > tolerance for a, b in zip(left, right)):
+            mismatches.append(receipt_index)
+    if [hit[:6] for hit in vectorized.hits] != [hit[:6] for hit in reference.hits]:
+        mismatches.append(None)
+    return mismatches
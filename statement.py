@@ -0,0 +1,161 @@
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+import pytz
+from settlement import settle
+from winning_index import build_indexes
+
+MYT = pytz.timezone('Asia/Kuala_Lumpur')
+
+
+class Statement:
+    """结单结果: 文本、各阶段耗时 (秒) 和规模统计"""
+
+    def __init__(self):
+        self.text = ""
+        self.timings = OrderedDict()
+        self.receipt_count = 0
+        self.date_count = 0
+
+    def timing_summary(self):
+        stages = ", ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in self.timings.items())
+        return f"{self.receipt_count} 张收条 / {self.date_count} 个开奖日期: {stages}"
+
+
+class _Timer:
+    def __init__(self, statement, stage):
+        self.statement = statement
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.statement.timings[self.stage] = time.perf_counter() - self.start
+
+
+def build_statement(storage_manager, data_manager, start_date, end_date, errors=None):
+    """生成月结单/周结单, 没有收条时返回 None
+
+    有列式投注存储时只同步变化的日期并向量化汇总, 否则逐张收条计算
+    """
+    if getattr(storage_manager, "bet_store", None) is not None:
+        return _build_from_store(storage_manager, data_manager, start_date, end_date, errors)
+    return _build_direct(storage_manager, data_manager, start_date, end_date, errors)
+
+
+def _build_from_store(storage_manager, data_manager, start_date, end_date, errors=None):
+    """按清单汇总中的收条数核对本地分区, 只同步和结算有变化的日期, 汇总由列式存储完成"""
+    bet_store = storage_manager.bet_store
+    statement = Statement()
+    with _Timer(statement, "读取清单汇总"):
+        counts = storage_manager.manifest.day_counts_between(start_date, end_date)
+    with _Timer(statement, "同步投注"):
+        stale = [date_str for date_str, count in counts.items()
+                 if count is None or bet_store.ticket_count(date_str) != count]
+        grouped = OrderedDict((date_str, []) for date_str in stale)
+        load_errors = []
+        for date_str, ticket in storage_manager.load_tickets_for_dates(stale, load_errors):
+            grouped[date_str].append(ticket)
+        if errors is not None:
+            errors.extend(load_errors)
+        failed = set(key for key, _ in load_errors)
+        # 无法对应到日期的失败 (例如旧收条下载失败) 只能按数量判断是否读全
+        unattributed = any(key not in grouped for key in failed)
+        for date_str, tickets in grouped.items():
+            remote = counts[date_str]
+            if date_str in failed or (remote is None and unattributed) or (remote is not None and len(tickets) < remote):
+                # 读取不完整, 保留本地分区, 下次结单时再同步
+                continue
+            if bet_store.ticket_count(date_str) > len(tickets):
+                # 本地有尚未上传到 Drive 的收条 (写后队列), 合并而不是覆盖
+                bet_store.merge_tickets(date_str, tickets)
+            else:
+                bet_store.write_tickets(date_str, tickets)
+        ticket_counts = dict((date_str, bet_store.ticket_count(date_str)) for date_str in counts)
+        date_strs = [date_str for date_str, count in ticket_counts.items() if count]
+    statement.receipt_count = sum(ticket_counts.values())
+    statement.date_count = len(date_strs)
+    if not date_strs:
+        return None
+    unsettled = [date_str for date_str in date_strs if not bet_store.is_settled(date_str)]
+    with _Timer(statement, "加载开奖结果"):
+        results_by_date = data_manager.load_results_for_dates(unsettled, errors) if unsettled else {}
+    with _Timer(statement, "结算"):
+        today = datetime.now(MYT).strftime("%Y-%m-%d")
+        for date_str in unsettled:
+            all_results = results_by_date.get(date_str)
+            if all_results:
+                settlement = settle(bet_store.columns(date_str), build_indexes(all_results), hits=False)
+                # 当天的开奖结果可能还不完整, 下次重新结算
+                bet_store.record_settlement(date_str, settlement.receipt_totals, final=date_str < today)
+    with _Timer(statement, "汇总"):
+        monthly, weekly = bet_store.aggregate(date_strs)
+        statement.text = _statement_text(start_date, end_date, monthly, weekly)
+    return statement
+
+
+def _build_direct(storage_manager, data_manager, start_date, end_date, errors=None):
+    """从清单读取结构化投注, 按开奖日期分组, 每个日期只加载一次开奖结果 (各日期并发加载)"""
+    statement = Statement()
+    with _Timer(statement, "加载收条"):
+        tickets = storage_manager.load_tickets_between(start_date, end_date, errors)
+    with _Timer(statement, "分组"):
+        receipts_by_date = OrderedDict()
+        for date_str, ticket in tickets:
+            receipt_date = datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=MYT)
+            receipts_by_date.setdefault(date_str, []).append((ticket.filename, receipt_date, ticket.total, ticket.bets))
+    statement.receipt_count = sum(len(items) for items in receipts_by_date.values())
+    statement.date_count = len(receipts_by_date)
+    if not receipts_by_date:
+        return None
+    with _Timer(statement, "加载开奖结果"):
+        results_by_date = data_manager.load_results_for_dates(list(receipts_by_date), errors)
+    monthly_bets = defaultdict(float)
+    monthly_wins = defaultdict(float)
+    weekly_bets = defaultdict(float)
+    weekly_wins = defaultdict(float)
+    with _Timer(statement, "结算"):
+        for date_str, items in receipts_by_date.items():
+            all_results = results_by_date.get(date_str)
+            settlement = None
+            if all_results:
+                settlement = settle([(filename, bets) for filename, _, _, bets in items], build_indexes(all_results),
+                                    hits=False)
+            for receipt_index, (filename, receipt_date, stake, _) in enumerate(items):
+                month_key = receipt_date.strftime("%Y-%m")
+                year, week_num, _ = receipt_date.isocalendar()
+                week_key = f"{year}-W{week_num:02d}"
+                monthly_bets[month_key] += stake
+                weekly_bets[week_key] += stake
+                if settlement is not None:
+                    monthly_wins[month_key] += settlement.receipt_totals[receipt_index]
+                    weekly_wins[week_key] += settlement.receipt_totals[receipt_index]
+    with _Timer(statement, "汇总"):
+        monthly = dict((period, (monthly_bets[period], monthly_wins[period])) for period in monthly_bets)
+        weekly = dict((period, (weekly_bets[period], weekly_wins[period])) for period in weekly_bets)
+        statement.text = _statement_text(start_date, end_date, monthly, weekly)
+    return statement
+
+
+def _statement_text(start_date, end_date, monthly, weekly):
+    start_str, end_str = start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+    output_text = f"=== 月结单 ({start_str} 至 {end_str}) ===\n\n"
+    output_text += _format_totals(monthly)
+    output_text += f"=== 周结单 ({start_str} 至 {end_str}) ===\n\n"
+    output_text += _format_totals(weekly)
+    return output_text
+
+
+def _format_totals(totals):
+    """totals 为 {期间: (下注总额, 中奖总额)}"""
+    output_text = ""
+    for period in sorted(totals.keys()):
+        bets, wins = totals[period]
+        profit = wins - bets
+        output_text += f"{period}\n"
+        output_text += f"  下注总额: {bets:.2f} MYR\n"
+        output_text += f"  中奖总额: {wins:.2f} MYR\n"
+        output_text += f"  盈利: {profit:.2f} MYR\n\n"
+    return output_text
\ No newline at end of file
@@ -0,0 +1,154 @@
+import contextvars
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from concurrent_loader import DEFAULT_MAX_WORKERS, TaskResult, collect_errors, run_concurrently
+from instrumentation import metrics
+
+# track_calls 的计数器 {后端: Counter}; 与调用方一样放在上下文中, 随线程池任务和事件循环中的协程传递
+_tracked_calls = contextvars.ContextVar("tracked_calls", default={})
+
+
+class StorageBackend:
+    """收条和开奖结果的存储接口, 按 "文件夹路径/文件名" 组织 (与 Google Drive 的文件夹模型一致)
+
+    子类必须实现: resolve_folder, get_file_id, list_files, upload_file, update_file, download_by_id, delete_folder;
+    其余方法有通用实现, 子类可以按后端特点覆盖 (例如 Drive 的批量请求)
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, request_timeout=None):
+        self.max_workers = max_workers
+        self.request_timeout = request_timeout
+        self.api_calls = Counter()
+        self._calls_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _count_call(self, method_id):
+        tracked = _tracked_calls.get().get(self)
+        with self._calls_lock:
+            self.api_calls[method_id] += 1
+            if tracked is not None:
+                tracked[method_id] += 1
+        metrics.count_call(method_id)
+
+    @contextmanager
+    def _timed_call(self, method_id):
+        """计数并计时一次远程调用 (延迟记入 instrumentation.metrics 的直方图)"""
+        self._count_call(method_id)
+        with metrics.timed(method_id):
+            yield
+
+    @contextmanager
+    def track_calls(self):
+        """统计 with 块内发出的 API 调用 (包括其中提交的线程池任务和异步请求), 产出 Counter"""
+        trackers = dict(_tracked_calls.get())
+        previous = trackers.get(self)
+        tracked = trackers[self] = Counter()
+        token = _tracked_calls.set(trackers)
+        try:
+            yield tracked
+        finally:
+            _tracked_calls.reset(token)
+            if previous is not None:
+                previous.update(tracked)
+
+    def api_call_count(self):
+        """累计发出的远程 API 调用次数"""
+        with self._calls_lock:
+            return sum(self.api_calls.values())
+
+    def cache_stats(self):
+        return {}
+
+    def ensure_folder(self, folder_path):
+        """确保文件夹存在，返回文件夹 ID"""
+        return self.resolve_folder(folder_path, create=True)
+
+    def download_file(self, file_name, folder_path, immutable=False):
+        """下载文件内容, immutable=True 表示内容永不改变 (例如往期开奖结果), 本地缓存无需校验"""
+        folder_id = self.resolve_folder(folder_path)
+        if not folder_id:
+            return None
+        file_id = self.get_file_id(file_name, folder_id)
+        if not file_id:
+            return None
+        return self.download_by_id(file_id, immutable)
+
+    def _same_content(self, file_id, data):
+        """已有文件的内容是否与 data 相同 (无法廉价判断时返回 False, 总是写入)"""
+        return False
+
+    def upsert_file(self, file_name, file_content, folder_path):
+        """按名称写入文件: 已存在时原地更新, 内容未变时不写入, 返回 (文件 ID, 是否写入)"""
+        folder_id = self.ensure_folder(folder_path)
+        file_id = self.get_file_id(file_name, folder_id)
+        if not file_id:
+            return self.upload_file(file_name, file_content, folder_path), True
+        data = file_content.encode('utf-8') if isinstance(file_content, str) else file_content
+        if self._same_content(file_id, data):
+            return file_id, False
+        self.update_file(file_id, data)
+        return file_id, True
+
+    def list_files_many(self, folder_paths):
+        """列出多个文件夹, 每项 result 为 [(name, id)]"""
+        return run_concurrently(folder_paths, self.list_files, self.max_workers)
+
+    def walk_folders(self, folder_path, depth, descend=None, errors=None):
+        """逐层列出 folder_path 下 depth 层文件夹, 同一层的全部文件夹一次列出 (list_files_many)
+
+        返回 {文件夹路径: [(name, id)]}; descend(子路径, 名称) 返回 False 的子项不再向下列出;
+        列出失败的文件夹打印后记入 errors (若提供)
+        """
+        listings = {}
+        level = ['/'.join(part for part in folder_path.split('/') if part)]
+        for _ in range(depth):
+            if not level:
+                break
+            next_level = []
+            for item in collect_errors(self.list_files_many(level), errors, "列出文件夹失败"):
+                listings[item.key] = item.result
+                for name, _ in item.result:
+                    child = f"{item.key}/{name}" if item.key else name
+                    if descend is None or descend(child, name):
+                        next_level.append(child)
+            level = next_level
+        return listings
+
+    def download_files(self, file_names, folder_path, immutable=False):
+        """并发下载同一文件夹下的多个文件, 按原顺序返回, 每项 result 为文件内容"""
+        folder_id = self.resolve_folder(folder_path)
+
+        def download(file_name):
+            file_id = self.get_file_id(file_name, folder_id) if folder_id else None
+            if not file_id:
+                raise FileNotFoundError(f"{folder_path}/{file_name}")
+            return self.download_by_id(file_id, immutable)
+
+        return run_concurrently(file_names, download, self.max_workers, self.request_timeout)
+
+    def download_many(self, file_ids, immutable=False):
+        """按文件 ID 并发下载, 按原顺序返回"""
+        return run_concurrently(file_ids, lambda file_id: self.download_by_id(file_id, immutable),
+                                self.max_workers, self.request_timeout)
+
+    def delete_folders(self, folders):
+        """删除多个文件夹, folders 为 [(路径, 文件夹 ID)], 每项返回 TaskResult((路径, ID), None, 错误)"""
+        results = []
+        for folder_path, folder_id in folders:
+            try:
+                self.delete_folder(folder_path)
+                results.append(TaskResult((folder_path, folder_id), None, None))
+            except Exception as e:
+                results.append(TaskResult((folder_path, folder_id), None, e))
+        return results
+
+    def compact_duplicates(self, folder_paths):
+        """删除同名重复文件; 同一路径只能有一个文件的后端没有需要清理的内容"""
+        return []
+
+    def start(self):
+        """启动后台线程 (如有)"""
+
+    def stop(self):
+        """停止后台线程 (如有)"""
\ No newline at end of file
@@ -1,97 +1,297 @@
 from datetime import datetime, timedelta
+from concurrent_loader import collect_errors
+from receipt_ledger import ticket_from_entry, ticket_from_text
+from receipt_manifest import ReceiptManifest
 import pytz
 import os
+import uuid
 
 MYT = pytz.timezone('Asia/Kuala_Lumpur')
 
 class StorageManager:
-    def __init__(self, drive_client):
+    def __init__(self, drive_client, bet_store=None):
         self.drive_client = drive_client
         self.base_dir = "4D_purchase_history"
-        self.cleanup_old_receipts()
+        self.manifest = ReceiptManifest(drive_client, self.base_dir)
+        # 本地列式投注存储 (可选), 购票时增量追加, 结单时汇总
+        self.bet_store = bet_store
 
     def get_myt_now(self):
         return datetime.now(MYT)
 
-    def save_receipt(self, receipt, ticket_count):
-        """保存收条到 Google Drive"""
-        now = self.get_myt_now()
-        timestamp = now.strftime("%Y%m%d_%H%M%S")
-        year, month, day = now.strftime("%Y"), now.strftime("%m"), now.strftime("%d")
-        folder_path = f"{self.base_dir}/{year}/{month}/{day}"
-        filename = f"{timestamp}_C23GO3F3_{ticket_count}.txt"
+    def receipt_folder(self, now):
+        return f"{self.base_dir}/{now.strftime('%Y')}/{now.strftime('%m')}/{now.strftime('%d')}"
+
+    def receipt_filename(self, now, ticket_count, receipt_id):
+        """收条文件名: 购票时间、会话内票号和收条唯一 ID (不同会话在同一秒购票也不会重名)"""
+        return f"{now.strftime('%Y%m%d_%H%M%S')}_C23GO3F3_{ticket_count}_{receipt_id}.txt"
+
+    def receipt_path(self, now, ticket_count, receipt_id):
+        return f"{self.receipt_folder(now)}/{self.receipt_filename(now, ticket_count, receipt_id)}"
+
+    @staticmethod
+    def new_receipt_id(details=None):
+        """收条唯一 ID: 优先使用票号, 没有票号时随机生成"""
+        return (details or {}).get("ticket_id") or uuid.uuid4().hex[:8].upper()
+
+    def save_receipt(self, receipt, ticket_count, details=None, now=None, overwrite=False, receipt_id=None):
+        """保存收条到 Google Drive, details (票号/总额/运营商) 同时写入当日清单
+
+        now 为购票时间 (后台补传时使用原购票时间), receipt_id 为收条唯一 ID (默认取票号);
+        overwrite=True 时按文件名 (含唯一 ID) 覆盖写入, 重试不会产生重复文件
+        """
+        now = now or self.get_myt_now()
+        receipt_id = receipt_id or self.new_receipt_id(details)
+        folder_path = self.receipt_folder(now)
+        filename = self.receipt_filename(now, ticket_count, receipt_id)
         try:
-            self.drive_client.upload_file(filename, receipt, folder_path)
-            return f"{folder_path}/{filename}"
+            if overwrite:
+                file_id, _ = self.drive_client.upsert_file(filename, receipt, folder_path)
+            else:
+                file_id = self.drive_client.upload_file(filename, receipt, folder_path)
         except Exception as e:
             raise Exception(f"无法保存收条到 Google Drive: {e}")
+        entry = {"receipt_id": receipt_id, "filename": filename, "file_id": file_id,
+                 "timestamp": now.strftime("%Y-%m-%d %H:%M:%S")}
+        entry.update(details or {})
+        try:
+            self.manifest.record(now.strftime("%Y-%m-%d"), entry, overwrite)
+        except Exception as e:
+            # 清单可以通过 rebuild_manifests 修复, 不影响收条本身
+            print(f"更新收条清单失败: {e}")
+        if self.bet_store is not None and "bets" in entry:
+            try:
+                self.bet_store.append_ticket(now.strftime("%Y-%m-%d"), ticket_from_entry(entry))
+            except Exception as e:
+                # 本地存储与清单数量不一致时, 结单会重新同步
+                print(f"更新本地投注存储失败: {e}")
+        return f"{folder_path}/{filename}"
 
-    def load_receipts(self, date_str):
-        """加载指定日期的收条"""
-        receipts = []
+    def load_receipts(self, date_str, errors=None):
+        """加载指定日期的收条, 失败项追加到 errors (若提供)"""
         year, month, day = date_str.split('-')
         folder_path = f"{self.base_dir}/{year}/{month}/{day}"
         try:
             files = self.drive_client.list_files(folder_path)
-            for filename, _ in files:
-                if filename.endswith('.txt'):
-                    content = self.drive_client.download_file(filename, folder_path)
-                    if content:
-                        receipts.append((filename, content))
+            filenames = [filename for filename, _ in files if filename.endswith('.txt')]
+            results = self.drive_client.download_files(filenames, folder_path)
+            return [(item.key, item.result) for item in collect_errors(results, errors, "读取 Google Drive 收条失败")
+                    if item.result]
         except Exception as e:
             print(f"读取 Google Drive 收条失败: {e}")
-        return receipts
+            if errors is not None:
+                errors.append((folder_path, e))
+        return []
 
-    def load_all_receipts(self):
-        """加载所有收条"""
-        receipts = []
+    def load_receipts_between(self, start_date, end_date, errors=None):
+        """按清单加载日期范围内的收条, 不遍历整个文件夹树"""
         try:
-            years = self.drive_client.list_files(self.base_dir)
-            for year_name, _ in years:
-                if not year_name.isdigit():
-                    continue
-                months = self.drive_client.list_files(f"{self.base_dir}/{year_name}")
-                for month_name, _ in months:
-                    if not month_name.isdigit():
+            entries = self.manifest.entries_between(start_date, end_date, errors)
+            file_names = dict((entry["file_id"], entry["filename"]) for _, entry in entries)
+            results = self.drive_client.download_many(list(file_names))
+            return [(file_names[item.key], item.result)
+                    for item in collect_errors(results, errors, "读取 Google Drive 收条失败") if item.result]
+        except Exception as e:
+            print(f"按清单加载 Google Drive 收条失败: {e}")
+            if errors is not None:
+                errors.append((self.base_dir, e))
+        return []
+
+    def load_tickets_between(self, start_date, end_date, errors=None):
+        """按清单取得日期范围内各收条的结算输入 [(日期字符串, LedgerTicket)]"""
+        try:
+            date_strs = list(self.manifest.day_counts_between(start_date, end_date))
+        except Exception as e:
+            print(f"读取收条清单失败: {e}")
+            if errors is not None:
+                errors.append((self.base_dir, e))
+            return []
+        return self.load_tickets_for_dates(date_strs, errors)
+
+    def load_tickets_for_dates(self, date_strs, errors=None, listings=None):
+        """按清单取得指定日期各收条的结算输入 [(日期字符串, LedgerTicket)]
+
+        清单中有结构化投注的收条不需要下载和解析文本, 只有旧收条才下载文本解析;
+        listings 为已列出的日期文件夹内容 (可选, 避免重复列出)
+        """
+        try:
+            entries = self.manifest.entries_for_dates(date_strs, errors, listings)
+            tickets = [ticket_from_entry(entry) for _, entry in entries]
+            legacy = dict((entry["file_id"], entry["filename"])
+                          for (_, entry), ticket in zip(entries, tickets) if ticket is None)
+            texts = {}
+            if legacy:
+                results = self.drive_client.download_many(list(legacy))
+                texts = dict((legacy[item.key], item.result)
+                             for item in collect_errors(results, errors, "读取 Google Drive 收条失败") if item.result)
+            loaded = []
+            for (date_str, entry), ticket in zip(entries, tickets):
+                if ticket is None:
+                    receipt = texts.get(entry["filename"])
+                    if receipt is None:
                         continue
-                    days = self.drive_client.list_files(f"{self.base_dir}/{year_name}/{month_name}")
-                    for day_name, _ in days:
-                        if not day_name.isdigit():
-                            continue
-                        date_str = f"{year_name}-{month_name.zfill(2)}-{day_name.zfill(2)}"
-                        receipts.extend(self.load_receipts(date_str))
+                    ticket = ticket_from_text(entry["filename"], receipt)
+                loaded.append((date_str, ticket))
+            return loaded
+        except Exception as e:
+            print(f"按清单加载收条投注失败: {e}")
+            if errors is not None:
+                errors.append((self.base_dir, e))
+        return []
+
+    def rebuild_manifests(self, date_str=None):
+        """按实际文件夹重建收条清单 (清单与文件夹不一致时使用)"""
+        if date_str:
+            return self.manifest.rebuild([date_str])
+        return self.manifest.rebuild([date for date, _, _ in self._list_day_folders()])
+
+    def compact_manifests(self, start_date, end_date):
+        """后台整理日期范围 (datetime.date) 内的收条清单: 写入已结束日期的快照并校正当月汇总, 返回写入的文件数"""
+        today = self.get_myt_now().strftime("%Y-%m-%d")
+        return self.manifest.compact(start_date, end_date, today)
+
+    def _list_day_folders(self, errors=None):
+        """列出所有日期文件夹, 返回 [(日期字符串, 文件夹路径, 文件夹 ID)] (逐层列出, 同一层的文件夹一次并发列出)"""
+        day_folders = []
+        listings = self.drive_client.walk_folders(self.base_dir, 3, lambda path, name: name.isdigit(), errors)
+        for folder_path, items in listings.items():
+            year_name, _, month_name = folder_path[len(self.base_dir) + 1:].partition('/')
+            if not month_name:
+                continue
+            for day_name, day_id in items:
+                if not day_name.isdigit():
+                    continue
+                date_str = f"{year_name}-{month_name.zfill(2)}-{day_name.zfill(2)}"
+                day_folders.append((date_str, f"{folder_path}/{day_name}", day_id))
+        return day_folders
+
+    def load_all_receipts(self, errors=None):
+        """加载所有收条 (列出各日期文件夹后, 通过线程池并发下载全部收条)"""
+        receipts = []
+        try:
+            day_folders = self._list_day_folders(errors)
+            day_paths = [folder_path for _, folder_path, _ in day_folders]
+            files = []
+            listed = self.drive_client.list_files_many(day_paths)
+            for item in collect_errors(listed, errors, "列出 Google Drive 收条失败"):
+                files.extend((filename, file_id) for filename, file_id in item.result if filename.endswith('.txt'))
+            file_names = dict((file_id, filename) for filename, file_id in files)
+            results = self.drive_client.download_many([file_id for _, file_id in files])
+            for item in collect_errors(results, errors, "读取 Google Drive 收条失败"):
+                if item.result:
+                    receipts.append((file_names[item.key], item.result))
         except Exception as e:
             print(f"加载所有 Google Drive 收条失败: {e}")
+            if errors is not None:
+                errors.append((self.base_dir, e))
         return receipts
 
-    def cleanup_old_receipts(self):
-        """清理30天前的收条"""
-        cutoff_date = self.get_myt_now() - timedelta(days=30)
+    def cleanup_old_receipts(self, retention_days=30):
+        """全量清理过期收条 (整月过期时直接删除月份文件夹), 返回 (删除数, 失败数)"""
+        cutoff_date = self.get_myt_now() - timedelta(days=retention_days)
         try:
-            years = self.drive_client.list_files(self.base_dir)
-            for year_name, _ in years:
-                if not year_name.isdigit():
-                    continue
-                months = self.drive_client.list_files(f"{self.base_dir}/{year_name}")
-                for month_name, _ in months:
-                    if not month_name.isdigit():
+            expired = []
+            errors = []
+            months = {}
+
+            def descend(path, name):
+                # 年份文件夹全部列出; 月份文件夹只列出部分过期的 (整月过期的直接删除)
+                if not name.isdigit():
+                    return False
+                year_name, _, month_name = path[len(self.base_dir) + 1:].partition('/')
+                if not month_name:
+                    return True
+                try:
+                    month_start = datetime.strptime(f"{year_name}-{month_name.zfill(2)}", "%Y-%m").replace(tzinfo=MYT)
+                except ValueError:
+                    return False
+                next_month = (month_start + timedelta(days=32)).replace(day=1)
+                months[path] = (month_start, next_month - timedelta(days=1) < cutoff_date)
+                return month_start < cutoff_date and not months[path][1]
+
+            listings = self.drive_client.walk_folders(self.base_dir, 3, descend, errors)
+            for year_name, _ in listings.get(self.base_dir, []):
+                year_path = f"{self.base_dir}/{year_name}"
+                for month_name, month_id in listings.get(year_path, []):
+                    month_path = f"{year_path}/{month_name}"
+                    if month_path not in months:
                         continue
-                    days = self.drive_client.list_files(f"{self.base_dir}/{year_name}/{month_name}")
-                    for day_name, _ in days:
+                    month_start, month_expired = months[month_path]
+                    if month_expired:
+                        expired.append((month_path, month_id))
+                        continue
+                    for day_name, day_id in listings.get(month_path, []):
                         if not day_name.isdigit():
                             continue
-                        date_str = f"{year_name}-{month_name.zfill(2)}-{day_name.zfill(2)}"
                         try:
-                            dir_date = datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=MYT)
-                            if dir_date < cutoff_date:
-                                folder_path = f"{self.base_dir}/{year_name}/{month_name}/{day_name}"
-                                folder_id = self.drive_client.get_folder_id(day_name, 
-                                    self.drive_client.get_folder_id(month_name, 
-                                    self.drive_client.get_folder_id(year_name, self.base_dir)))
-                                if folder_id:
-                                    self.drive_client.service.files().delete(fileId=folder_id).execute()
-                                    print(f"已删除 Google Drive 过期文件夹: {folder_path}")
+                            dir_date = month_start.replace(day=int(day_name))
                         except ValueError:
                             continue
+                        if dir_date < cutoff_date:
+                            expired.append((f"{month_path}/{day_name}", day_id))
+            deleted, failed = self._delete_expired(expired)
+            # 列出失败的文件夹计为失败, 下次全量清理时重试
+            return deleted, failed + len(errors)
         except Exception as e:
-            print(f"清理 Google Drive 存档时出错: {e}")
\ No newline at end of file
+            print(f"清理 Google Drive 存档时出错: {e}")
+            return 0, 1
+
+    def delete_expired_days(self, first_date, last_date):
+        """增量清理: 只删除 first_date 至 last_date (datetime.date) 之间新过期的日期, 返回 (删除数, 失败数)
+
+        整月都已过期的月份直接删除月份文件夹, 其余月份只列出一次后删除范围内的日期文件夹
+        """
+        expired = []
+        partial_months = {}
+        month_start = first_date.replace(day=1)
+        while month_start <= last_date:
+            next_month = (month_start + timedelta(days=32)).replace(day=1)
+            year_name, month_name = month_start.strftime("%Y"), month_start.strftime("%m")
+            month_path = f"{self.base_dir}/{year_name}/{month_name}"
+            if next_month - timedelta(days=1) <= last_date:
+                month_id = self.drive_client.resolve_folder(month_path)
+                if month_id:
+                    expired.append((month_path, month_id))
+            else:
+                partial_months[month_path] = month_start
+            month_start = next_month
+        for item in self.drive_client.list_files_many(list(partial_months)):
+            if item.error is not None:
+                print(f"列出 Google Drive 文件夹失败: {item.key}: {item.error}")
+                return 0, 1
+            month_start = partial_months[item.key]
+            for day_name, day_id in item.result:
+                if not day_name.isdigit():
+                    continue
+                try:
+                    dir_date = month_start.replace(day=int(day_name))
+                except ValueError:
+                    continue
+                if first_date <= dir_date <= last_date:
+                    expired.append((f"{item.key}/{day_name}", day_id))
+        return self._delete_expired(expired)
+
+    def _delete_expired(self, expired):
+        """批量删除过期文件夹, 返回 (删除数, 失败数)"""
+        deleted = 0
+        failed = 0
+        forgotten = {}
+        for item in self.drive_client.delete_folders(expired):
+            folder_path, _ = item.key
+            if item.error is not None:
+                failed += 1
+                print(f"删除 Google Drive 过期文件夹失败: {folder_path}: {item.error}")
+            else:
+                deleted += 1
+                print(f"已删除 Google Drive 过期文件夹: {folder_path}")
+                # 单独删除的日期文件夹要从当月汇总中移除, 整月删除时汇总随月份文件夹一起删除
+                parts = folder_path[len(self.base_dir) + 1:].split('/')
+                if len(parts) == 3:
+                    forgotten.setdefault((parts[0], parts[1]), []).append(parts[2].zfill(2))
+        for (year, month), days in forgotten.items():
+            try:
+                self.manifest.forget_days(year, month, days)
+            except Exception as e:
+                # 汇总中残留的日期在后台整理时校正
+                print(f"更新当月收条汇总失败: {year}-{month}: {e}")
+        return deleted, failed
\ No newline at end of file
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+from html import escape
+import pytz
+from bet_parser import parse_bet_text
+from malaysia_4d import Malaysia4D
+
+MYT = pytz.timezone('Asia/Kuala_Lumpur')
+
+# 开奖页面上的运营商名称 (解析时规范化为 OP_CODE_MAP 中的名称)
+PAGE_OPERATORS = ["Magnum 4D", "Da Ma Cai 1+3D", "SportsToto 4D", "Singapore 4D", "Grand Dragon 4D", "9 Lotto 4D"]
+OPERATOR_DIGITS = "123489"
+
+
+def _numbers(rng, count):
+    return [f"{number:04d}" for number in rng.sample(range(10000), count)]
+
+
+def draw_results(rng, date_str):
+    """生成一天的开奖结果 {运营商: 结果数据}, 格式与 parse_block 的输出一致"""
+    date_yyyymmdd = date_str.replace("-", "")
+    draws = {}
+    for operator in PAGE_OPERATORS:
+        numbers = _numbers(rng, 23)
+        draws[operator.lower().replace("sportstoto", "sports toto")] = {
+            "date": date_str,
+            "date_yyyymmdd": date_yyyymmdd,
+            "results": {"首奖": numbers[0], "二奖": numbers[1], "三奖": numbers[2],
+                        "特别奖": numbers[3:13], "安慰奖": numbers[13:23]}
+        }
+    return draws
+
+
+def results_page(rng, date_str, filler_links=200):
+    """生成与 4dnow.net 结构相同的开奖页面 HTML (含导航等无关内容)"""
+    day = datetime.strptime(date_str, "%Y-%m-%d").strftime("%d/%m/%y")
+    lines = ['<!DOCTYPE html>', '<html lang="en">', '<head><meta charset="utf-8"><title>4D Results</title></head>',
+             '<body>', '  <ul class="nav">']
+    lines.extend(f'    <li class="menu-item"><a href="/results/{i}">Past results {i}</a></li>'
+                 for i in range(filler_links))
+    lines.extend(['  </ul>', '  <div id="app" class="container">'])
+    for operator in PAGE_OPERATORS:
+        numbers = _numbers(rng, 23)
+        lines.append('    <div class="lottery-box">')
+        lines.append(f'      <div class="info operator-info"><b>{escape(operator)}</b></div>')
+        lines.append(f'      <div class="date draw-date">{day}</div>')
+        lines.append('      <div class="main el-row">')
+        for cls, label, number in zip(("first", "second", "third"), ("1st", "2nd", "3rd"), numbers):
+            lines.append(f'        <div class="el-col el-col-8"><span class="prize"><span class="{cls}">{label}</span></span>'
+                         f'<b class="number">{number}</b></div>')
+        lines.append('      </div>')
+        for label, group in (("Special", numbers[3:13]), ("Consolation", numbers[13:23])):
+            cells = "".join(f'<b class="number">{number}</b>' for number in group)
+            lines.append(f'      <div class="sub-result el-row"><div class="result-info el-col-24">'
+                         f'<span class="text-info">{label}</span></div><div class="numbers">{cells}</div></div>')
+        lines.append('    </div>')
+    lines.extend(['  </div>', '</body>', '</html>'])
+    return "\n".join(lines)
+
+
+def bet_text(rng, groups=10, bets_per_group=20):
+    """生成购票输入文本 (与购票页面相同的格式), 混合直选/iBox/Box 和沿用金额的行"""
+    lines = []
+    for _ in range(groups):
+        lines.append("@" + "".join(rng.sample(OPERATOR_DIGITS, rng.randint(1, 3))))
+        for index in range(bets_per_group):
+            prefix = rng.choice(["", "", "", "&", "&&"])
+            number = f"{rng.randint(0, 9999):04d}"
+            if index and rng.random() < 0.3:
+                lines.append(f"{prefix}{number}")
+            else:
+                lines.append(f"{prefix}{number}#{rng.randint(1, 5)}#{rng.choice(['', '1', '2'])}#{rng.choice(['', '', '1'])}")
+    return "\n".join(lines)
+
+
+class _ReceiptCollector:
+    """代替 StorageManager 接收 buy_lottery 生成的收条, 之后按指定时间写入"""
+
+    def __init__(self):
+        self.saved = []
+
+    def save_receipt(self, receipt, ticket_count, details=None, **kwargs):
+        self.saved.append((receipt, ticket_count, details))
+
+
+def buy_tickets(bet_texts):
+    """按真实购票流程处理多段购票输入 (不写入存储), 返回 [(收条文本, 票号计数, 清单记录字段)]"""
+    collector = _ReceiptCollector()
+    malaysia_4d = Malaysia4D(collector)
+    for text in bet_texts:
+        batch = parse_bet_text(text)
+        if batch.errors:
+            raise ValueError(f"购票输入有错误: {batch.errors}")
+        malaysia_4d.buy_lottery(batch, None)
+    return collector.saved
+
+
+def purchase_receipts(storage_manager, rng, dates, tickets_per_day=20, groups=2, bets_per_group=5):
+    """按真实购票流程为每个日期生成收条并写入 storage_manager, 返回收条数"""
+    saved = buy_tickets([bet_text(rng, groups, bets_per_group) for _ in range(len(dates) * tickets_per_day)])
+    tickets = iter(saved)
+    for date_str in dates:
+        day_start = MYT.localize(datetime.strptime(date_str, "%Y-%m-%d"))
+        for index in range(tickets_per_day):
+            receipt, ticket_count, details = next(tickets)
+            now = day_start + timedelta(hours=9, seconds=index * 37)
+            storage_manager.save_receipt(receipt, ticket_count, details, now=now)
+    return len(saved)
\ No newline at end of file
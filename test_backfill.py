@@ -0,0 +1,65 @@
+"""回填的离线测试: 用 manage.py serve-recorded 的本地替身站点提供录制的往期页面
+
+运行: python -m pytest -q test_backfill.py
+"""
+import functools
+import http.server
+import os
+import shutil
+import threading
+from datetime import date
+import pytest
+from backfill import Backfill
+from fake_drive import FakeDriveClient
+from lottery_data_manager import RESULTS_ROOT, LotteryDataManager
+from manage import RecordedPageHandler
+
+RECORDED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "recorded")
+
+
+@pytest.fixture
+def recorded_site(tmp_path):
+    """2026-10-11 有开奖; 2026-10-12 的页面仍显示 10-11 的结果 (当天没有开奖); 2026-10-13 没有页面 (404)"""
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    shutil.copy(os.path.join(RECORDED_DIR, "2026-10-11.html"), pages / "2026-10-11.html")
+    shutil.copy(os.path.join(RECORDED_DIR, "2026-10-11.html"), pages / "2026-10-12.html")
+    handler = functools.partial(RecordedPageHandler, directory=str(pages))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def new_backfill(base_url, checkpoint_path):
+    data_manager = LotteryDataManager(FakeDriveClient())
+    return Backfill(data_manager, base_url=base_url, checkpoint_path=str(checkpoint_path), max_workers=2, rate=0)
+
+
+def test_backfill_checkpoints_no_draw_dates(recorded_site, tmp_path):
+    checkpoint_path = tmp_path / "checkpoint.json"
+    backfill = new_backfill(recorded_site, checkpoint_path)
+    errors = []
+    done = backfill.run(date(2026, 10, 11), date(2026, 10, 13), errors)
+    assert sorted(done) == ["2026-10-11", "2026-10-12"]
+    assert done["2026-10-12"] == []
+    assert len(done["2026-10-11"]) == 6
+    assert [date_str for date_str, _ in errors] == ["2026-10-13"]
+    assert backfill.stats["dates_done"] == 1
+    assert backfill.stats["dates_no_draw"] == 1
+    assert backfill.stats["dates_failed"] == 1
+    drive_client = backfill.data_manager.drive_client
+    assert len(drive_client.list_files(f"{RESULTS_ROOT}/2026-10-11")) == 6
+    assert drive_client.list_files(f"{RESULTS_ROOT}/2026-10-12") == []
+
+    # 重新运行时只重试失败的日期
+    rerun = new_backfill(recorded_site, checkpoint_path)
+    errors = []
+    assert rerun.run(date(2026, 10, 11), date(2026, 10, 13), errors) == {}
+    assert rerun.stats["skipped"] == 2
+    assert rerun.stats["requests"] == 1
+    assert [date_str for date_str, _ in errors] == ["2026-10-13"]
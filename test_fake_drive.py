@@ -0,0 +1,89 @@
+"""批量请求和缓存的离线测试: 在 FakeDriveClient 上比较批量/缓存路径与逐项路径的结果和 API 调用次数
+
+运行: python -m pytest -q test_fake_drive.py
+"""
+import pytest
+from benchmarks import BenchFixture
+from instrumentation import metrics
+from lottery_data_manager import RESULTS_ROOT
+from statement import build_statement
+from synthetic import results_page
+
+
+@pytest.fixture
+def fixture(tmp_path):
+    return BenchFixture(latency=0, days=4, tickets_per_day=5, expired_days=2, store_dir=str(tmp_path / "bet_store"))
+
+
+def round_trips(func):
+    """执行 func, 返回 (结果, 网络往返次数); 一个批量请求只算一次往返"""
+    with metrics.trace("test") as span:
+        result = func()
+    return result, span.call_count()
+
+
+def test_list_files_many_matches_list_files(fixture):
+    drive_client = fixture.drive_client
+    folder_paths = [fixture.storage_manager.manifest.day_path(date_str) for date_str in fixture.dates]
+    folder_paths.append(f"{RESULTS_ROOT}/no-such-date")
+    one_by_one, single_trips = round_trips(lambda: [drive_client.list_files(path) for path in folder_paths])
+    batched, batch_trips = round_trips(lambda: drive_client.list_files_many(folder_paths))
+    assert [item.error for item in batched] == [None] * len(folder_paths)
+    assert [item.result for item in batched] == one_by_one
+    assert batch_trips < single_trips
+
+
+def test_delete_folders_matches_delete_folder():
+    one_by_one = BenchFixture(latency=0, days=3, tickets_per_day=3, expired_days=0)
+    batched = BenchFixture(latency=0, days=3, tickets_per_day=3, expired_days=0)
+    paths = [one_by_one.storage_manager.manifest.day_path(date_str) for date_str in one_by_one.dates]
+    with one_by_one.drive_client.track_calls() as single_calls:
+        for path in paths:
+            assert one_by_one.drive_client.delete_folder(path)
+    folders = [(path, batched.drive_client.resolve_folder(path)) for path in paths]
+    with batched.drive_client.track_calls() as batch_calls:
+        results = batched.drive_client.delete_folders(folders)
+    assert [item.error for item in results] == [None] * len(paths)
+    assert batched.drive_client.file_count() == one_by_one.drive_client.file_count()
+    assert [batched.drive_client.resolve_folder(path) for path in paths] == [None] * len(paths)
+    assert sum(batch_calls.values()) < sum(single_calls.values())
+
+
+def test_load_receipts_between_matches_per_day_loads(fixture):
+    storage_manager = fixture.storage_manager
+    start, end = fixture.date_range()
+    with fixture.drive_client.track_calls() as single_calls:
+        per_day = [receipt for date_str in fixture.dates for receipt in storage_manager.load_receipts(date_str)]
+    with fixture.drive_client.track_calls() as manifest_calls:
+        by_manifest = storage_manager.load_receipts_between(start, end)
+    assert len(per_day) == len(fixture.dates) * 5
+    assert sorted(by_manifest) == sorted(per_day)
+    assert sum(manifest_calls.values()) < sum(single_calls.values())
+
+
+def test_unchanged_results_page_is_not_parsed_or_uploaded_again(fixture):
+    data_manager = fixture.data_manager
+    html_content = results_page(fixture.rng, fixture.dates[-1])
+    with fixture.drive_client.track_calls() as first_calls:
+        data_manager.parse_data(html_content)
+    first = data_manager.all_results
+    with fixture.drive_client.track_calls() as repeat_calls:
+        data_manager.parse_data(html_content)
+    assert data_manager.all_results == first
+    assert len(first) == 6
+    assert sum(first_calls.values()) > 0
+    assert sum(repeat_calls.values()) == 0
+
+
+def test_repeat_statement_uses_fewer_calls(fixture):
+    start, end = fixture.date_range()
+    with fixture.drive_client.track_calls() as first_calls:
+        first = build_statement(fixture.storage_manager, fixture.data_manager, start, end)
+    with fixture.drive_client.track_calls() as repeat_calls:
+        repeat = build_statement(fixture.storage_manager, fixture.data_manager, start, end)
+    assert repeat.text == first.text
+    assert repeat.receipt_count == first.receipt_count == len(fixture.dates) * 5
+    assert sum(repeat_calls.values()) < sum(first_calls.values())
+    # 直接逐张结算 (不使用本地投注存储) 的结单相同
+    fixture.storage_manager.bet_store = None
+    assert build_statement(fixture.storage_manager, fixture.data_manager, start, end).text == first.text
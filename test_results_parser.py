@@ -0,0 +1,57 @@
+"""lxml 快速解析与 BeautifulSoup 解析的一致性测试 (合成页面和保存的真实页面)
+
+运行: python -m pytest -q test_results_parser.py
+"""
+import os
+import random
+import pytest
+from lottery_data_manager import LotteryDataManager
+from results_parser import LxmlParser, SoupParser, lxml
+from synthetic import results_page
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SAVED_PAGES = [os.path.join(FIXTURES_DIR, "4dnow_results.html"),
+               os.path.join(FIXTURES_DIR, "recorded", "2026-10-11.html")]
+
+pytestmark = pytest.mark.skipif(lxml is None, reason="需要 lxml")
+
+
+def parse_blocks(html_content, parser):
+    data_manager = LotteryDataManager(None)
+    return [data_manager.parse_block(box, parser) for box in parser.boxes(html_content)]
+
+
+def assert_same_output(html_content):
+    soup_output = parse_blocks(html_content, SoupParser())
+    lxml_output = parse_blocks(html_content, LxmlParser())
+    assert lxml_output == soup_output
+    data_manager = LotteryDataManager(None)
+    assert data_manager.parse_page(html_content, LxmlParser()) == data_manager.parse_page(html_content, SoupParser())
+    return lxml_output
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_parsers_agree_on_synthetic_pages(seed):
+    rng = random.Random(seed)
+    date_str = f"2026-09-{seed + 1:02d}"
+    output = assert_same_output(results_page(rng, date_str, filler_links=rng.randint(0, 50)))
+    assert len(output) == 6
+    for _, result_data in output:
+        assert result_data["date"] == date_str
+        assert len(result_data["results"]["特别奖"]) == 10
+        assert len(result_data["results"]["安慰奖"]) == 10
+
+
+@pytest.mark.parametrize("path", SAVED_PAGES, ids=os.path.basename)
+def test_parsers_agree_on_saved_pages(path):
+    with open(path, encoding='utf-8') as f:
+        output = assert_same_output(f.read())
+    assert any(result_data for _, result_data in output)
+
+
+def test_block_hash_is_stable_per_parser():
+    html_content = results_page(random.Random(0), "2026-09-01")
+    for parser in (SoupParser(), LxmlParser()):
+        hashes = [parser.block_hash(box) for box in parser.boxes(html_content)]
+        assert hashes == [parser.block_hash(box) for box in parser.boxes(html_content)]
+        assert len(set(hashes)) == len(hashes)
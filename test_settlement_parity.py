@@ -0,0 +1,168 @@
+"""结算与原中奖计算器 (app.py 中的逐行循环) 的离线对照测试
+
+用 synthetic.draw_results 生成开奖结果, 按真实购票流程生成随机收条 (号码偏向中奖号码及其排列),
+比较每张收条的奖金和中奖明细。运行: python -m pytest -q test_settlement_parity.py
+"""
+import itertools
+import random
+import re
+from collections import Counter
+import pytest
+from receipt_ledger import decode_bets
+from settlement import ENGINES, check_parity, format_hit, parse_receipt, settle
+from synthetic import OPERATOR_DIGITS, bet_text, buy_tickets, draw_results
+from winning_index import build_indexes
+
+
+def original_calculator(receipt, all_results):
+    """原中奖计算器对一张收条的结算 (照搬 app.py 的循环), 返回 (收条总奖金, 中奖明细行)"""
+    op_code_map = {
+        "M": "magnum 4d", "P": "da ma cai 1+3d", "T": "sports toto 4d",
+        "S": "singapore 4d", "H": "grand dragon 4d", "E": "9 lotto 4d"
+    }
+    prize_payouts = {
+        "首奖": {"big": 2500, "small": 3500},
+        "二奖": {"big": 1000, "small": 2000},
+        "三奖": {"big": 500, "small": 1000},
+        "特别奖": {"big": 180, "small": 0},
+        "安慰奖": {"big": 60, "small": 0}
+    }
+    bets = []
+    current_ops = []
+    for line in receipt.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("*"):
+            current_ops = [op_code_map[code] for code in line[1:] if code in op_code_map]
+        elif "=" in line and not line.startswith("T :") and not line.startswith("P :") and not line.startswith("=="):
+            perm_bet = line.startswith("iB(")
+            box_bet = line.startswith("Box(")
+            if perm_bet:
+                number_match = re.match(r"iB\((\d{4})\)", line)
+            elif box_bet:
+                number_match = re.match(r"Box\((\d{4})\)", line)
+            else:
+                number_match = re.match(r"(\d{4})=", line)
+            number = number_match.group(1) if number_match else "0000"
+            big = small = straight = 0.0
+            for amount in re.findall(r"(\d+\.\d)B|(\d+\.\d)S|(\d+\.\d)A1", line):
+                if amount[0]:
+                    big = float(amount[0])
+                elif amount[1]:
+                    small = float(amount[1])
+                elif amount[2]:
+                    straight = float(amount[2])
+            bets.append((number, big, small, straight, perm_bet, box_bet, current_ops))
+    ticket_winnings = 0.0
+    lines = []
+    for number, big, small, straight, perm_bet, box_bet, operators in bets:
+        if perm_bet:
+            numbers_to_check = list(set(''.join(p) for p in itertools.permutations(number)))
+        elif box_bet:
+            numbers_to_check = list(set(''.join(sorted(p)) for p in itertools.permutations(number)))
+        else:
+            numbers_to_check = [number]
+        box_count = len(set(''.join(sorted(p)) for p in itertools.permutations(number))) if box_bet else 1
+        for op in operators:
+            if op not in all_results:
+                continue
+            results = all_results[op]["results"]
+            for bet_number in numbers_to_check:
+                for prize, winning_numbers in results.items():
+                    if isinstance(winning_numbers, str):
+                        winning_numbers = [winning_numbers]
+                    if bet_number not in winning_numbers:
+                        continue
+                    wins = []
+                    if perm_bet:
+                        if big > 0 and prize in prize_payouts and prize_payouts[prize]["big"] > 0:
+                            wins.append(("大万", big, big * prize_payouts[prize]["big"]))
+                        if small > 0 and prize in ["首奖", "二奖", "三奖"] and prize_payouts[prize]["small"] > 0:
+                            wins.append(("小万", small, small * prize_payouts[prize]["small"]))
+                    elif box_bet:
+                        if big > 0 and prize in prize_payouts and prize_payouts[prize]["big"] > 0:
+                            wins.append(("大万", big, (big * prize_payouts[prize]["big"]) / box_count))
+                    else:
+                        if big > 0 and prize in prize_payouts and prize_payouts[prize]["big"] > 0:
+                            wins.append(("大万", big, big * prize_payouts[prize]["big"]))
+                        if small > 0 and prize in ["首奖", "二奖", "三奖"] and prize_payouts[prize]["small"] > 0:
+                            wins.append(("小万", small, small * prize_payouts[prize]["small"]))
+                        if straight > 0 and prize == "首奖":
+                            wins.append(("直选", straight, straight * prize_payouts[prize]["big"]))
+                    for label, stake, win_amount in wins:
+                        ticket_winnings += win_amount
+                        lines.append(f"  {op} - {bet_number} 中 {prize} ({label}: {stake:.2f}) 奖金: {win_amount:.2f}\n")
+    return ticket_winnings, lines
+
+
+def winning_bet_text(rng, all_results, groups=4, bets_per_group=15):
+    """偏向中奖号码的购票输入: 中奖号码本身、打乱或排序后的数字, 混合直选/iBox/Box 和沿用金额的行"""
+    winners = [number for data in all_results.values() for value in data["results"].values()
+               for number in ([value] if isinstance(value, str) else value)]
+    lines = []
+    for _ in range(groups):
+        # 偶尔重复选择同一运营商 (重复计奖)
+        ops = "".join(rng.sample(OPERATOR_DIGITS, rng.randint(1, 3)))
+        lines.append("@" + ops + (ops[0] if rng.random() < 0.2 else ""))
+        for index in range(bets_per_group):
+            number = rng.choice(winners)
+            shape = rng.random()
+            if shape < 0.3:
+                number = "".join(rng.sample(number, 4))
+            elif shape < 0.5:
+                number = "".join(sorted(number))
+            prefix = rng.choice(["", "", "&", "&&"])
+            if index and rng.random() < 0.3:
+                lines.append(f"{prefix}{number}")
+            else:
+                lines.append(f"{prefix}{number}#{rng.randint(1, 3)}#{rng.choice(['', '1', '2'])}#{rng.choice(['', '', '1'])}")
+    return "\n".join(lines)
+
+
+def random_tickets(seed, count=20):
+    """按真实购票流程生成随机收条, 返回 (开奖结果, [(收条文本, 结构化投注)])"""
+    rng = random.Random(seed)
+    all_results = draw_results(rng, "2026-09-01")
+    texts = [bet_text(rng, 2, 10) if index % 4 == 0 else winning_bet_text(rng, all_results) for index in range(count)]
+    return all_results, [(receipt, decode_bets(details["bets"])) for receipt, _, details in buy_tickets(texts)]
+
+
+def assert_parity(result, receipt_index, receipt, all_results):
+    expected_total, expected_lines = original_calculator(receipt, all_results)
+    assert result.receipt_totals[receipt_index] == pytest.approx(expected_total)
+    # 原计算器遍历 set, iBox 的明细顺序不固定, 按行比较
+    assert Counter(format_hit(hit) for hit in result.receipt_hits(receipt_index)) == Counter(expected_lines)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("seed", range(10))
+def test_parity_with_original_calculator(engine, seed):
+    all_results, tickets = random_tickets(seed)
+    draw_indexes = build_indexes(all_results)
+    from_text = settle([(index, parse_receipt(receipt)[1]) for index, (receipt, _) in enumerate(tickets)],
+                       draw_indexes, engine)
+    from_ledger = settle([(index, bets) for index, (_, bets) in enumerate(tickets)], draw_indexes, engine)
+    assert from_text.total > 0
+    for receipt_index, (receipt, _) in enumerate(tickets):
+        assert_parity(from_text, receipt_index, receipt, all_results)
+        assert_parity(from_ledger, receipt_index, receipt, all_results)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_box_wins_only_on_sorted_number(engine):
+    all_results = draw_results(random.Random(0), "2026-09-01")
+    first = all_results["magnum 4d"]["results"]["首奖"]
+    ordered = "".join(sorted(first))
+    receipt = f"Ticket ID: TEST\n*M\nBox({first})=1.0B|1.0S\nBox({ordered})=1.0B\n"
+    result = settle([("test", parse_receipt(receipt)[1])], build_indexes(all_results), engine)
+    assert_parity(result, 0, receipt, all_results)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_engines_agree_on_totals_and_hit_order(seed):
+    if "numpy" not in ENGINES:
+        pytest.skip("需要 numpy")
+    all_results, tickets = random_tickets(seed)
+    receipts = [(index, bets) for index, (_, bets) in enumerate(tickets)]
+    assert check_parity(receipts, build_indexes(all_results)) == []
@@ -0,0 +1,283 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from local_storage import ID_PREFIX, is_local_id, local_id
+from storage_backend import StorageBackend
+
+SYNC_STATE_FILE = ".sync_pending.json"
+# 同步失败后的重试间隔 (秒), 每次失败翻倍, 不超过上限
+RETRY_BASE_SECONDS = 2.0
+RETRY_MAX_SECONDS = 300.0
+# 远程文件夹列表的有效期 (秒), 过期后重新列出, 其他实例写入远程的新文件也能看到
+DEFAULT_REMOTE_LISTING_TTL = 300.0
+
+OP_PUT = "put"
+OP_DELETE = "delete"
+
+
+class TieredStorageBackend(StorageBackend):
+    """本地优先的分层存储: 读写都走本地磁盘, 写入和删除由后台线程异步同步到远程 (Drive)
+
+    本地没有的文件 (例如切换到分层存储之前或由其他实例写入 Drive 的数据) 从远程读取并保存到本地;
+    每个文件夹的远程列表缓存 remote_listing_ttl 秒, 本进程的新文件都先写本地。
+    待同步的路径保存在本地根目录的 .sync_pending.json, 重启后继续同步
+    """
+
+    def __init__(self, local, remote, remote_listing_ttl=DEFAULT_REMOTE_LISTING_TTL):
+        super().__init__(remote.max_workers)
+        self.local = local
+        self.remote = remote
+        self.remote_listing_ttl = remote_listing_ttl
+        self.state_path = os.path.join(local.root, SYNC_STATE_FILE)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stop = False
+        self._thread = None
+        # 路径 -> (操作, 序号), 同一路径的新操作覆盖旧操作
+        self._pending = OrderedDict()
+        self._sequence = 0
+        # 文件夹路径 -> {文件名: 远程 ID}, 以及远程 ID -> (文件夹路径, 文件名)
+        self._remote_listings = {}
+        self._remote_names = {}
+        # 文件夹路径 -> 列出时间 (time.monotonic)
+        self._listed_at = {}
+        self.synced = 0
+        self.failures = 0
+        self.remote_reads = 0
+        self.last_error = None
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding='utf-8') as f:
+                for path, op in json.load(f):
+                    self._sequence += 1
+                    self._pending[path] = (op, self._sequence)
+
+    # 远程调用统计: 只有远程请求才算 API 调用
+    def track_calls(self):
+        return self.remote.track_calls()
+
+    def api_call_count(self):
+        return self.remote.api_call_count()
+
+    def cache_stats(self):
+        return self.remote.cache_stats()
+
+    @staticmethod
+    def _path(folder_id):
+        return folder_id[len(ID_PREFIX):]
+
+    def _remote_listing(self, folder_path):
+        """远程文件夹中的 {文件名: ID} (缓存 remote_listing_ttl 秒), 远程没有该文件夹或列出失败时为空"""
+        path = self.local.normalize_path(folder_path)
+        listing = self._remote_listings.get(path)
+        if listing is None or time.monotonic() - self._listed_at.get(path, 0.0) > self.remote_listing_ttl:
+            try:
+                files = self.remote.list_files(path)
+            except Exception as e:
+                print(f"列出远程文件夹失败 (只使用本地数据): {path}: {e}")
+                return {}
+            listing = dict(files)
+            with self._lock:
+                for name, file_id in files:
+                    self._remote_names[file_id] = (path, name)
+                self._remote_listings[path] = listing
+                self._listed_at[path] = time.monotonic()
+        return listing
+
+    def invalidate_remote_listings(self, folder_path=None):
+        """清除远程文件夹列表缓存 (folder_path 为 None 时全部清除), 下次访问时重新列出"""
+        with self._lock:
+            if folder_path is None:
+                self._remote_listings.clear()
+                self._listed_at.clear()
+                return
+            path = self.local.normalize_path(folder_path)
+            self._remote_listings.pop(path, None)
+            self._listed_at.pop(path, None)
+
+    def resolve_folder(self, folder_path, create=False):
+        folder_id = self.local.resolve_folder(folder_path, create)
+        if folder_id:
+            return folder_id
+        path = self.local.normalize_path(folder_path)
+        parent, _, name = path.rpartition('/')
+        if name and name in self._remote_listing(parent):
+            return local_id(path)
+        return None
+
+    def get_folder_id(self, folder_name, parent_id=None):
+        parent = self._path(parent_id) if parent_id else ""
+        return self.resolve_folder(f"{parent}/{folder_name}" if parent else folder_name)
+
+    def get_file_id(self, file_name, folder_id):
+        file_id = self.local.get_file_id(file_name, folder_id)
+        if file_id:
+            return file_id
+        return self._remote_listing(self._path(folder_id)).get(file_name)
+
+    def list_files(self, folder_path, immutable=False):
+        """本地文件加上只在远程存在的文件 (远程 ID), 同名时使用本地文件"""
+        files = self.local.list_files(folder_path)
+        names = set(name for name, _ in files)
+        remote_only = [(name, file_id) for name, file_id in self._remote_listing(folder_path).items()
+                       if name not in names]
+        return remote_only + files
+
+    def download_by_id(self, file_id, immutable=False):
+        if is_local_id(file_id):
+            return self.local.download_by_id(file_id, immutable)
+        content = self.remote.download_by_id(file_id, immutable)
+        self.remote_reads += 1
+        location = self._remote_names.get(file_id)
+        if location is not None:
+            # 保存到本地, 以后直接读本地; 这是远程已有的内容, 不需要同步回去
+            folder_path, name = location
+            self.local.upload_file(name, content, folder_path)
+        return content
+
+    def _same_content(self, file_id, data):
+        return is_local_id(file_id) and self.local._same_content(file_id, data)
+
+    def upload_file(self, file_name, file_content, folder_path):
+        file_id = self.local.upload_file(file_name, file_content, folder_path)
+        self._enqueue(self._path(file_id), OP_PUT)
+        return file_id
+
+    def update_file(self, file_id, file_content):
+        if not is_local_id(file_id):
+            # 只在远程存在的文件: 写到本地同名位置, 由后台同步覆盖远程
+            folder_path, name = self._remote_names[file_id]
+            return self.upload_file(name, file_content, folder_path)
+        self.local.update_file(file_id, file_content)
+        self._enqueue(self._path(file_id), OP_PUT)
+        return file_id
+
+    def delete_folder(self, folder_path):
+        path = self.local.normalize_path(folder_path)
+        deleted = self.local.delete_folder(path)
+        with self._lock:
+            for listed_path in [listed for listed in self._remote_listings if listed == path or listed.startswith(path + '/')]:
+                del self._remote_listings[listed_path]
+            parent, _, name = path.rpartition('/')
+            remote_deleted = self._remote_listings.get(parent, {}).pop(name, None) is not None
+        self._enqueue(path, OP_DELETE)
+        return deleted or remote_deleted
+
+    def compact_duplicates(self, folder_paths):
+        """本地没有重复文件, 直接清理远程"""
+        return self.remote.compact_duplicates(folder_paths)
+
+    def _save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump([[path, op] for path, (op, _) in self._pending.items()], f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def _enqueue(self, path, op):
+        with self._lock:
+            if op == OP_DELETE:
+                # 删除文件夹时, 其中尚未同步的写入不再需要
+                for pending_path in [pending for pending in self._pending if pending.startswith(path + '/')]:
+                    del self._pending[pending_path]
+            self._sequence += 1
+            self._pending.pop(path, None)
+            self._pending[path] = (op, self._sequence)
+            self._save_state()
+            self._wakeup.notify()
+
+    def _sync(self, path, op):
+        folder_path, _, name = path.rpartition('/')
+        if op == OP_DELETE:
+            folder_id = self.remote.resolve_folder(path)
+            if folder_id:
+                for item in self.remote.delete_folders([(path, folder_id)]):
+                    if item.error is not None:
+                        raise item.error
+            return
+        try:
+            content = self.local.download_by_id(local_id(path))
+        except FileNotFoundError:
+            return  # 已被之后的删除移除
+        self.remote.upsert_file(name, content, folder_path)
+
+    def sync_next(self):
+        """同步最早的一个待同步路径, 没有待同步项时返回 None, 否则返回是否成功"""
+        with self._lock:
+            if not self._pending:
+                return None
+            path, (op, sequence) = next(iter(self._pending.items()))
+        try:
+            self._sync(path, op)
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+                self.last_error = str(e)
+                # 放到队尾, 不阻塞其他路径
+                if self._pending.get(path, (None, None))[1] == sequence:
+                    self._pending.move_to_end(path)
+            print(f"同步到远程存储失败: {path}: {e}")
+            return False
+        with self._lock:
+            # 同步期间同一路径又有新操作时保留新操作
+            if self._pending.get(path, (None, None))[1] == sequence:
+                del self._pending[path]
+                self._save_state()
+            self.synced += 1
+            self.last_error = None
+        return True
+
+    def _run(self):
+        delay = RETRY_BASE_SECONDS
+        while True:
+            with self._lock:
+                while not self._pending and not self._stop:
+                    self._wakeup.wait()
+                if self._stop:
+                    return
+            if self.sync_next() is False:
+                with self._lock:
+                    self._wakeup.wait(delay)
+                    if self._stop:
+                        return
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+            else:
+                delay = RETRY_BASE_SECONDS
+
+    def start(self):
+        """启动后台同步线程 (守护线程, 重复调用无效)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="tiered-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """停止后台线程, 未同步的路径保留在状态文件中"""
+        with self._lock:
+            self._stop = True
+            self._wakeup.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.remote.stop()
+
+    def flush(self, timeout=30.0):
+        """等待全部同步完成 (没有后台线程时在当前线程同步), 返回是否已清空"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._thread is None:
+                if not self.sync_next():
+                    break
+            elif not self.sync_stats()["pending"]:
+                return True
+            else:
+                time.sleep(0.05)
+        return not self.sync_stats()["pending"]
+
+    def sync_stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "synced": self.synced,
+                "failures": self.failures,
+                "remote_reads": self.remote_reads,
+                "last_error": self.last_error,
+            }
\ No newline at end of file
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from permutation_table import CANONICAL_KEYS
+
+PRIZE_TIERS = ["首奖", "二奖", "三奖", "特别奖", "安慰奖"]
+TIER_BITS = {prize: 1 << i for i, prize in enumerate(PRIZE_TIERS)}
+# 位掩码 -> 对应的奖项 (按 PRIZE_TIERS 顺序), 预先算好 32 种组合
+MASK_PRIZES = tuple(tuple(prize for i, prize in enumerate(PRIZE_TIERS) if mask & (1 << i))
+                    for mask in range(1 << len(PRIZE_TIERS)))
+
+
+class WinningIndex:
+    """单个运营商单期开奖的查询索引: 10000 个号码 -> 中奖等级位掩码"""
+
+    __slots__ = ("operator", "date", "fingerprint", "masks", "derived", "_canonical")
+
+    def __init__(self, operator, date, results, fingerprint=None):
+        self.operator = operator
+        self.date = date
+        self.fingerprint = fingerprint
+        self.masks = bytearray(10000)
+        # 结算引擎按需在此缓存派生结构 (例如 numpy 数组)
+        self.derived = {}
+        self._canonical = None
+        for prize, numbers in results.items():
+            bit = TIER_BITS.get(prize)
+            if bit is None:
+                continue
+            if isinstance(numbers, str):
+                numbers = [numbers]
+            for number in numbers:
+                if len(number) == 4 and number.isdigit():
+                    self.masks[int(number)] |= bit
+
+    def prizes(self, number):
+        """号码中的所有奖项, O(1) 查询"""
+        return MASK_PRIZES[self.masks[int(number)]]
+
+    def canonical_matches(self, number):
+        """与号码数字组合相同 (规范键相同) 的中奖号码 [(号码, 奖项)], 用于 iBox/Box 对奖"""
+        if self._canonical is None:
+            canonical = {}
+            for winning_number, mask in enumerate(self.masks):
+                if mask:
+                    canonical.setdefault(CANONICAL_KEYS[winning_number], []).append(
+                        (f"{winning_number:04d}", MASK_PRIZES[mask]))
+            self._canonical = canonical
+        return self._canonical.get(CANONICAL_KEYS[int(number)], ())
+
+    def winning_numbers(self):
+        """所有中奖号码 (整数)"""
+        return [number for number, mask in enumerate(self.masks) if mask]
+
+
+def results_fingerprint(results):
+    return hashlib.md5(json.dumps(results, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class WinningIndexCache:
+    """按 (运营商, 日期) 缓存已编译的索引, 开奖内容变化时自动重新编译"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, operator, date, results):
+        fingerprint = results_fingerprint(results)
+        key = (operator, date)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None and index.fingerprint == fingerprint:
+                self._indexes.move_to_end(key)
+                self.hits += 1
+                return index
+            self.misses += 1
+        index = WinningIndex(operator, date, results, fingerprint)
+        with self._lock:
+            self._indexes[key] = index
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+        return index
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "indexes": len(self._indexes)}
+
+
+# 进程级共享, 不同收条和选项卡之间复用
+index_cache = WinningIndexCache()
+
+
+def build_indexes(all_results):
+    """把 load_results_by_date 的结果编译为 {运营商: WinningIndex}"""
+    return {operator: index_cache.get(operator, data.get("date"), data.get("results", {}))
+            for operator, data in all_results.items()}